@@ -0,0 +1,154 @@
+"""
+ADAPTIVE SAMPLING
+
+Angle grids that refine where Fresnel curves bend and stay coarse where they are flat.
+Function summary:
+	analytic Brewster and critical angles of an interface
+	AdaptiveAngles: interval bisection driven by the linear-interpolation error at midpoints
+	test cases against a dense uniform grid
+
+Sampling starts from a coarse uniform grid plus the Brewster angle atan(Re(nSub)/nInc) and, for
+Re(nSub) < nInc, the critical angle asin(Re(nSub)/nInc), where Rp has its minimum and the TIR
+kink sits (see testBrewster and testCritical in FresnelTest.py). Each pass evaluates the midpoints
+of the intervals still flagged, in one batched FresnelArray.FresnelAll call, and flags the halves
+of every interval whose midpoint misses the chord by more than the tolerance. Evaluated points
+are never discarded, so the curves on the returned grid are plot accurate: linear interpolation
+between neighbors is within about the tolerance of the exact curve.
+
+Test cases can be evaluated with following command:
+python3 AdaptiveSampling.py
+"""
+
+from math import pi
+
+import numpy as np
+
+import FresnelArray
+
+
+# curves whose chord error drives refinement; complex amplitudes are split into real and imaginary parts
+DEFAULT_QUANTITIES = ('Rs', 'Rp', 'Ts', 'Tp')
+
+
+def CharacteristicAngles(nInc, nSub, thetaMax=pi/2):
+	""" Brewster and (when it exists) critical angle in [0, thetaMax] [radians]; none for a non-finite index ratio (nInc = 0)"""
+	with np.errstate(all='ignore'):
+		nRatio = np.float64(complex(nSub).real)/np.float64(nInc)
+	angles = [np.arctan(nRatio)]
+	if 0.0 < nRatio < 1.0:
+		angles.append(np.arcsin(nRatio))
+	return sorted(angle for angle in angles if np.isfinite(angle) and 0.0 < angle < thetaMax)
+
+
+def _curves(coef, quantities):
+	""" (curves, points) real array of the quantities to be resolved"""
+	rows = []
+	for name in quantities:
+		values = getattr(coef, name)
+		rows += [values.real, values.imag] if np.iscomplexobj(values) else [values]
+	return np.array(rows)
+
+def _concatenate(parts):
+	""" FresnelCoefficients with the fields of several evaluations concatenated"""
+	return FresnelArray.FresnelCoefficients(*(np.concatenate(field) for field in zip(*parts)))
+
+def AdaptiveAngles(nInc, nSub, quantities=DEFAULT_QUANTITIES, tolerance=1e-3, initial=9, maxPoints=2000, thetaMax=pi/2, minWidth=1e-7, integral=False):
+	""" (angles, FresnelCoefficients at those angles) resolving the quantities to the given tolerance
+
+	With integral=False the tolerance bounds the chord error of every interval (plot accuracy);
+	with integral=True it bounds the chord error times the interval width, i.e. the local
+	trapezoid error, so intervals that contribute little to an integral are left coarse.
+	Refinement stops when every interval meets the tolerance, when maxPoints would be exceeded or
+	when intervals are narrower than minWidth (discontinuities such as 2 pi phase wraps).
+	"""
+	angles = np.union1d(np.linspace(0.0, thetaMax, initial), CharacteristicAngles(nInc, nSub, thetaMax))
+	with np.errstate(all='ignore'):
+		parts = [FresnelArray.FresnelAll(nInc, nSub, angles)]
+		curves = _curves(parts[0], quantities)
+	sampled = [angles]
+	# intervals still to be checked: end angles and curve values
+	left, right = angles[:-1], angles[1:]
+	leftValues, rightValues = curves[:, :-1], curves[:, 1:]
+	count = angles.size
+	while left.size and count + left.size <= maxPoints:
+		middle = 0.5*(left + right)
+		with np.errstate(all='ignore'):
+			coef = FresnelArray.FresnelAll(nInc, nSub, middle)
+			middleValues = _curves(coef, quantities)
+			error = np.abs(middleValues - 0.5*(leftValues + rightValues))
+			error = np.where(np.isnan(error), 0.0, error).max(axis=0)
+		sampled.append(middle)
+		parts.append(coef)
+		count += middle.size
+		if integral:
+			error *= right - left
+
+		refine = (error > tolerance) & (right - left > 2.0*minWidth)
+		left, middle, right = left[refine], middle[refine], right[refine]
+		leftValues, middleValues, rightValues = leftValues[:, refine], middleValues[:, refine], rightValues[:, refine]
+		left, right = np.concatenate((left, middle)), np.concatenate((middle, right))
+		leftValues, rightValues = np.concatenate((leftValues, middleValues), axis=1), np.concatenate((middleValues, rightValues), axis=1)
+
+	angles = np.concatenate(sampled)
+	order = np.argsort(angles, kind='stable')
+	coef = _concatenate(parts)
+	return angles[order], FresnelArray.FresnelCoefficients(*(values[order] for values in coef))
+
+
+
+
+
+# test cases
+def testAdaptiveSampling():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testCharacteristicAngles, testPlotAccuracy, testIntegralAccuracy, testPhaseWrap):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all ADAPTIVE SAMPLING TESTS passed? '+str(combinedTest))
+
+def interpolationError(angles, coef, nInc, nSub, quantities=DEFAULT_QUANTITIES):
+	"""helper function: largest error of linear interpolation against a dense uniform grid"""
+	dense = np.linspace(0.0, angles[-1], 100001)
+	with np.errstate(all='ignore'):
+		exact = FresnelArray.FresnelAll(nInc, nSub, dense)
+	return max(np.max(np.abs(np.interp(dense, angles, getattr(coef, name)) - getattr(exact, name))) for name in quantities)
+
+# Brewster and critical angles of testBrewster and testCritical (Fresnel.py) are sampled exactly
+def testCharacteristicAngles():
+	angles, coef = AdaptiveAngles(1.5, 1.0, tolerance=1e-2)
+	brewster, critical = np.arctan(1/1.5), np.arcsin(1/1.5)
+	return(
+		np.allclose(CharacteristicAngles(1.5, 1.0), [brewster, critical]) and \
+		np.allclose(CharacteristicAngles(1.0, 1.5), [np.arctan(1.5)]) and \
+		CharacteristicAngles(0.0, 1.5) == [] and CharacteristicAngles(0.0, 0.0) == [] and \
+		brewster in angles and critical in angles and abs(coef.Rp[angles == brewster][0]) < 1e-20 and \
+		np.all(np.diff(angles) > 0.0))
+
+# dielectric, metal and TIR curves to plot accuracy with far fewer points than a uniform grid
+def testPlotAccuracy():
+	ok = True
+	for nInc, nSub in ((1.0, 1.5), (1.0, complex(2.007, 3.781)), (1.5, 1.0), (1.0, complex(0.29006, 2.8628))):
+		angles, coef = AdaptiveAngles(nInc, nSub, tolerance=1e-3)
+		ok = ok and angles.size < 200 and interpolationError(angles, coef, nInc, nSub) < 2e-3
+	return ok
+
+# hemispherical average 2 int R sin cos dtheta by the trapezoid rule on the adaptive grid
+def testIntegralAccuracy():
+	def average(angles, R):
+		f = 2.0*R*np.sin(angles)*np.cos(angles)
+		return np.sum(0.5*(f[1:] + f[:-1])*np.diff(angles))
+	dense = np.linspace(0.0, pi/2, 200001)
+	exact = average(dense, 0.5*(FresnelArray.Rs(1.0, 1.5, dense) + FresnelArray.Rp(1.0, 1.5, dense)))
+	angles, coef = AdaptiveAngles(1.0, 1.5, tolerance=1e-6, integral=True)
+	return angles.size < 1000 and abs(average(angles, 0.5*(coef.Rs + coef.Rp)) - exact) < 1e-5
+
+# 2 pi jumps of the phase stop at minWidth instead of exhausting maxPoints
+def testPhaseWrap():
+	angles, coef = AdaptiveAngles(1.5, 1.0, ('RetardanceR',), tolerance=1e-2, minWidth=1e-4)
+	return angles.size < 500 and np.allclose(coef.RetardanceR, FresnelArray.Retardance(FresnelArray.rs(1.5, 1.0, angles), FresnelArray.rp(1.5, 1.0, angles)))
+
+
+if __name__ == '__main__':
+	testAdaptiveSampling()
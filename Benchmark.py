@@ -0,0 +1,291 @@
+"""
+BENCHMARK
+
+Reproducible timing of the Fresnel calculations.
+Function summary:
+	input generators for dielectric, metal and total internal reflection regimes (fixed seed)
+	timing of every public function of Fresnel.py (scalar, one call per point) and FresnelArray.py (batched)
+	analytic gradients of FresnelGradient.py and the float32 fast mode of FresnelFast.py (batched)
+	multi-core sweeps of Sweep.py (process and thread pools, one worker per core)
+	start-up: cold import and first-evaluation latency of each entry point, in fresh interpreters
+	warm-up, repetitions and percentile statistics per (case, regime, problem size)
+	machine-readable JSON report and comparison against a previous report
+
+Benchmarks run offline; inputs depend only on the seed, the regime and the problem size, so
+numbers are comparable across commits and build hosts. Scalar cases default to at most 10^4
+points per run (one Python call per point); batched cases cover 1 to 10^7 points.
+
+Examples:
+python3 Benchmark.py --output bench.json
+python3 Benchmark.py --max-size 100000 --compare bench.json
+python3 Benchmark.py --startup --output startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import Fresnel
+import FresnelArray
+import FresnelFast
+import FresnelGradient
+import Sweep
+
+
+REGIMES = ('dielectric', 'metal', 'tir')
+SEED = 2022
+
+
+def makeInputs(regime, size, seed=SEED):
+	""" (nInc, nSub, thetaInc) arrays of the given size; identical for identical arguments"""
+	rng = np.random.default_rng([seed, REGIMES.index(regime), size])
+	if regime == 'dielectric':
+		nInc = 1.0 + 0.5*rng.random(size)
+		nSub = nInc + 0.1 + 1.5*rng.random(size) + 0j
+		thetaInc = rng.random(size)*1.5
+	elif regime == 'metal':
+		nInc = 1.0 + 0.5*rng.random(size)
+		nSub = 2.0*rng.random(size) + 1j*(1.0 + 9.0*rng.random(size))
+		thetaInc = rng.random(size)*1.5
+	elif regime == 'tir':
+		nInc = 1.5 + 0.5*rng.random(size)
+		nSub = 1.0 + 0.4*rng.random(size) + 0j
+		thetaCritical = np.arcsin(nSub.real/nInc)
+		thetaInc = thetaCritical + (1.5 - thetaCritical)*rng.random(size)
+	else:
+		raise ValueError('unknown regime %r' % regime)
+	return nInc, nSub, thetaInc
+
+
+# benchmark cases: name -> (kind, setup), setup(nInc, nSub, thetaInc) returns a zero-argument callable
+def _scalarCase(name):
+	func = getattr(Fresnel, name)
+	def setup(nInc, nSub, thetaInc):
+		args = (nInc.tolist(), nSub.tolist(), thetaInc.tolist())
+		return lambda: list(map(func, *args))
+	return setup
+
+def _scalarPolarizationCase(name, inputName):
+	func = getattr(Fresnel, name)
+	inputFunc = getattr(Fresnel, inputName)
+	pairName = {'Rs': 'Rp', 'Ts': 'Tp', 'rs': 'rp'}[inputName]
+	def setup(nInc, nSub, thetaInc):
+		args = (nInc.tolist(), nSub.tolist(), thetaInc.tolist())
+		first = list(map(inputFunc, *args))
+		second = list(map(getattr(Fresnel, pairName), *args))
+		return lambda: list(map(func, first, second))
+	return setup
+
+def _arrayCase(name):
+	func = getattr(FresnelArray, name)
+	return lambda nInc, nSub, thetaInc: (lambda: func(nInc, nSub, thetaInc))
+
+def _arrayPolarizationCase(name, inputName):
+	func = getattr(FresnelArray, name)
+	pairName = {'Rs': 'Rp', 'Ts': 'Tp', 'rs': 'rp'}[inputName]
+	def setup(nInc, nSub, thetaInc):
+		first = getattr(FresnelArray, inputName)(nInc, nSub, thetaInc)
+		second = getattr(FresnelArray, pairName)(nInc, nSub, thetaInc)
+		return lambda: func(first, second)
+	return setup
+
+FUNCTIONS = ('SnellAngle', 'rs', 'rp', 'ts', 'tp', 'Rs', 'Rp', 'Ts', 'Tp')
+CASES = {}
+for _name in FUNCTIONS:
+	CASES['Fresnel.'+_name] = ('scalar', _scalarCase(_name))
+	CASES['FresnelArray.'+_name] = ('batched', _arrayCase(_name))
+CASES['Fresnel.Diattenuation'] = ('scalar', _scalarPolarizationCase('Diattenuation', 'Rs'))
+CASES['Fresnel.Retardance'] = ('scalar', _scalarPolarizationCase('Retardance', 'rs'))
+CASES['FresnelArray.Diattenuation'] = ('batched', _arrayPolarizationCase('Diattenuation', 'Rs'))
+CASES['FresnelArray.Retardance'] = ('batched', _arrayPolarizationCase('Retardance', 'rs'))
+CASES['FresnelArray.FresnelAll'] = ('batched', _arrayCase('FresnelAll'))
+CASES['FresnelGradient.FresnelAllGradient'] = ('batched', lambda nInc, nSub, thetaInc: (lambda: FresnelGradient.FresnelAllGradient(nInc, nSub, thetaInc)))
+CASES['FresnelFast.FresnelAllFast'] = ('batched', lambda nInc, nSub, thetaInc: (lambda: FresnelFast.FresnelAllFast(nInc, nSub, thetaInc)))
+
+def _sweepCase(backend):
+	def setup(nInc, nSub, thetaInc):
+		return lambda: Sweep.SweepPoints(nInc, nSub, thetaInc, ('Rs', 'Rp', 'Ts', 'Tp'), backend=backend)
+	return setup
+
+CASES['Sweep.SweepPoints[process]'] = ('parallel', _sweepCase('process'))
+CASES['Sweep.SweepPoints[thread]'] = ('parallel', _sweepCase('thread'))
+
+
+# start-up cases: name -> (imports, first evaluation), Python statements run in a fresh interpreter.
+# 'FresnelCalc+gui' adds the tkinter/matplotlib imports that FresnelCalc.main() defers, i.e. what
+# importing FresnelCalc cost while the interface was built at import time.
+STARTUP_CASES = {
+	'interpreter': ('pass', 'pass'),
+	'Fresnel': ('import Fresnel', 'Fresnel.Rs(1.0, 1.5, 0.5)'),
+	'FresnelArray': ('import FresnelArray', 'FresnelArray.FresnelAll(1.0, 1.5+0j, FresnelArray.np.linspace(0.0, 1.5, 91))'),
+	'FresnelCalc': ('import FresnelCalc',
+		'FresnelCalc.fresnelCache.evaluateAdaptive(1.0, 1.5+0j, quantities=FresnelCalc.SAMPLED_QUANTITIES, tolerance=FresnelCalc.SAMPLING_TOLERANCE)'),
+	'FresnelCalc+gui': ('import FresnelCalc, tkinter, matplotlib.figure, matplotlib.backends.backend_tkagg',
+		'FresnelCalc.fresnelCache.evaluateAdaptive(1.0, 1.5+0j, quantities=FresnelCalc.SAMPLED_QUANTITIES, tolerance=FresnelCalc.SAMPLING_TOLERANCE)'),
+}
+
+_STARTUP_SCRIPT = '''
+import sys, time
+tic = time.perf_counter()
+exec(sys.argv[1])
+toc = time.perf_counter()
+exec(sys.argv[2])
+print(toc - tic, time.perf_counter() - toc)
+'''
+
+def measureStartup(imports, first, repeat=7):
+	""" (import, first evaluation, whole process) times [s] of repeat fresh interpreters"""
+	importTimes, firstTimes, processTimes = [], [], []
+	for _ in range(repeat):
+		tic = time.perf_counter()
+		out = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT, imports, first], capture_output=True, text=True, check=True,
+			cwd=os.path.dirname(os.path.abspath(__file__)))
+		processTimes.append(time.perf_counter() - tic)
+		importTime, firstTime = map(float, out.stdout.split()[-2:])
+		importTimes.append(importTime)
+		firstTimes.append(firstTime)
+	return importTimes, firstTimes, processTimes
+
+def runStartup(cases=None, repeat=7, seed=SEED, log=None):
+	""" start-up report (dict) for the selected start-up cases; same layout as run()
+
+	Each case gives three entries, startup.import[name], startup.first[name] and startup.process[name]
+	(regime 'cold', size 1), so that reports compare with compare(). Cases whose imports are not
+	available on this machine are skipped.
+	"""
+	cases = list(STARTUP_CASES) if cases is None else cases
+	results = []
+	for name in cases:
+		try:
+			times = measureStartup(*STARTUP_CASES[name], repeat=repeat)
+		except subprocess.CalledProcessError as error:
+			if log:
+				log('%-30s skipped: %s' % (name, error.stderr.strip().splitlines()[-1] if error.stderr.strip() else error))
+			continue
+		for stage, stageTimes in zip(('import', 'first', 'process'), times):
+			results.append(dict(case='startup.%s[%s]' % (stage, name), kind='startup', regime='cold', size=1, **summarize(stageTimes, 1)))
+		if log:
+			log('%-30s import %8.1f ms  first evaluation %8.1f ms  process %8.1f ms' % ((name,) + tuple(1e3*float(np.median(t)) for t in times)))
+	return dict(environment=environment(seed), results=results)
+
+
+def measure(func, repeat=7, warmup=1, minTime=0.05):
+	""" per-call times [s] of func over repeat repetitions, after warmup untimed calls
+
+	Fast calls are looped within a repetition so that each one lasts at least minTime seconds.
+	"""
+	for _ in range(warmup):
+		func()
+	number = 1
+	while True:
+		tic = time.perf_counter()
+		for _ in range(number):
+			func()
+		elapsed = time.perf_counter() - tic
+		if elapsed >= minTime or number >= 1 << 20:
+			break
+		number *= 2 if elapsed == 0.0 else max(2, int(1.2*minTime/elapsed))
+	times = [elapsed/number]
+	for _ in range(repeat - 1):
+		tic = time.perf_counter()
+		for _ in range(number):
+			func()
+		times.append((time.perf_counter() - tic)/number)
+	return times
+
+def summarize(times, size):
+	""" statistics of per-call times for a problem of size points"""
+	times = np.asarray(times)
+	median = float(np.median(times))
+	return dict(
+		repeat=int(times.size),
+		min=float(times.min()), median=median, mean=float(times.mean()), max=float(times.max()),
+		p10=float(np.percentile(times, 10)), p90=float(np.percentile(times, 90)), p99=float(np.percentile(times, 99)),
+		pointsPerSecond=size/median if median > 0.0 else None,
+		nsPerPoint=1e9*median/size)
+
+
+def environment(seed):
+	""" metadata identifying the run"""
+	info = dict(
+		timestamp=time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+		python=platform.python_version(), implementation=platform.python_implementation(),
+		numpy=np.__version__, platform=platform.platform(), machine=platform.machine(),
+		seed=seed, cpus=os.cpu_count())
+	try:
+		info['commit'] = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=5,
+			cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+	except (OSError, subprocess.SubprocessError):
+		info['commit'] = None
+	return info
+
+def run(cases=None, regimes=REGIMES, sizes=None, scalarMaxSize=10**4, repeat=7, warmup=1, seed=SEED, log=None):
+	""" benchmark report (dict) for the selected cases, regimes and problem sizes"""
+	cases = sorted(CASES) if cases is None else cases
+	sizes = [10**p for p in range(8)] if sizes is None else sizes
+	results = []
+	for regime in regimes:
+		for size in sizes:
+			inputs = makeInputs(regime, size, seed)
+			for name in cases:
+				kind, setup = CASES[name]
+				if kind == 'scalar' and size > scalarMaxSize:
+					continue
+				with np.errstate(all='ignore'):
+					stats = summarize(measure(setup(*inputs), repeat, warmup), size)
+				results.append(dict(case=name, kind=kind, regime=regime, size=size, **stats))
+				if log:
+					log('%-30s %-10s %9d  %12.3e s  %10.1f ns/point' % (name, regime, size, stats['median'], stats['nsPerPoint']))
+	return dict(environment=environment(seed), results=results)
+
+def compare(report, baseline):
+	""" median time ratios (report / baseline) for the entries present in both reports"""
+	key = lambda r: (r['case'], r['regime'], r['size'])
+	previous = {key(r): r for r in baseline['results']}
+	return [dict(case=r['case'], regime=r['regime'], size=r['size'], ratio=r['median']/previous[key(r)]['median'])
+		for r in report['results'] if key(r) in previous and previous[key(r)]['median'] > 0.0]
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Benchmark the Fresnel calculations and write a JSON report.')
+	parser.add_argument('--cases', nargs='*', help='case names (default: all of %s)' % ', '.join(sorted(CASES)))
+	parser.add_argument('--regimes', nargs='*', default=list(REGIMES), choices=REGIMES)
+	parser.add_argument('--sizes', nargs='*', type=int, help='problem sizes (default: 1, 10, ..., 10^7)')
+	parser.add_argument('--max-size', type=int, default=10**7, help='largest default problem size')
+	parser.add_argument('--scalar-max-size', type=int, default=10**4, help='largest problem size for scalar cases')
+	parser.add_argument('--repeat', type=int, default=7)
+	parser.add_argument('--warmup', type=int, default=1)
+	parser.add_argument('--seed', type=int, default=SEED)
+	parser.add_argument('--output', help='JSON report path (default: stdout)')
+	parser.add_argument('--compare', help='previous JSON report; prints median time ratios')
+	parser.add_argument('--quiet', action='store_true')
+	parser.add_argument('--startup', nargs='*', choices=list(STARTUP_CASES), metavar='CASE',
+		help='time cold imports and first evaluations instead (default cases: all of %s)' % ', '.join(STARTUP_CASES))
+	args = parser.parse_args(argv)
+
+	sizes = args.sizes or [10**p for p in range(8) if 10**p <= args.max_size]
+	log = None if args.quiet else (lambda line: print(line, file=sys.stderr))
+	if args.startup is not None:
+		report = runStartup(args.startup or None, args.repeat, args.seed, log)
+	else:
+		report = run(args.cases, args.regimes, sizes, args.scalar_max_size, args.repeat, args.warmup, args.seed, log)
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(report, f, indent=1)
+	else:
+		json.dump(report, sys.stdout, indent=1)
+		print()
+	if args.compare:
+		with open(args.compare) as f:
+			for row in compare(report, json.load(f)):
+				print('%-30s %-10s %9d  x%.3f' % (row['case'], row['regime'], row['size'], row['ratio']), file=sys.stderr)
+
+
+if __name__ == '__main__':
+	main()
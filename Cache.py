@@ -0,0 +1,191 @@
+"""
+CACHE
+
+Bounded least-recently-used cache with hit/miss counters, shared by the modules that
+memoize expensive evaluations (material index lookups, Fresnel coefficient grids), and
+a memoized single-interface evaluator built on FresnelArray.FresnelAll.
+
+Cached values are returned as stored; callers that cache ndarrays should mark them
+read-only so that a caller cannot corrupt later hits.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+import FresnelArray
+
+
+_missing = object()
+
+
+class LRUCache:
+	""" least-recently-used cache holding at most maxsize entries"""
+
+	def __init__(self, maxsize=128):
+		if maxsize < 1:
+			raise ValueError('maxsize must be at least 1')
+		self.maxsize = maxsize
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self._data = OrderedDict()
+		self._lock = Lock()
+
+	def __len__(self):
+		return len(self._data)
+
+	def __contains__(self, key):
+		return key in self._data
+
+	def get(self, key, default=None):
+		""" cached value for key (marked most recently used), or default; counts a hit or a miss"""
+		with self._lock:
+			try:
+				value = self._data[key]
+			except KeyError:
+				self.misses += 1
+				return default
+			self._data.move_to_end(key)
+			self.hits += 1
+			return value
+
+	def put(self, key, value):
+		""" store value for key, evicting the least recently used entry when full"""
+		with self._lock:
+			self._data[key] = value
+			self._data.move_to_end(key)
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+				self.evictions += 1
+
+	def getOrCompute(self, key, compute):
+		""" cached value for key, calling compute() and storing its result on a miss"""
+		value = self.get(key, _missing)
+		if value is _missing:
+			value = compute()
+			self.put(key, value)
+		return value
+
+	def discard(self, predicate):
+		""" drop every entry whose key satisfies predicate(key)"""
+		with self._lock:
+			for key in [key for key in self._data if predicate(key)]:
+				del self._data[key]
+
+	def clear(self):
+		""" drop every entry and reset the counters"""
+		with self._lock:
+			self._data.clear()
+			self.hits = self.misses = self.evictions = 0
+
+	def stats(self):
+		""" hit/miss counters and occupancy"""
+		return dict(hits=self.hits, misses=self.misses, evictions=self.evictions, size=len(self._data), maxsize=self.maxsize)
+
+
+class FresnelCache:
+	""" memoized FresnelArray.FresnelAll keyed on the canonicalized (nInc, nSub, thetaInc) signature
+
+	Arguments are canonicalized before hashing (nInc and thetaInc as float64, nSub as complex128,
+	negative zeros folded), so 1, 1.0 and np.float64(1.0) share an entry and a repeated angle grid
+	is a lookup instead of a recompute. Cached FresnelCoefficients hold read-only arrays.
+	"""
+
+	def __init__(self, maxsize=32):
+		self.cache = LRUCache(maxsize)
+
+	@staticmethod
+	def canonical(x, dtype):
+		""" contiguous array of the given dtype with -0.0 folded into +0.0"""
+		return np.ascontiguousarray(np.asarray(x, dtype=dtype) + 0.0)
+
+	def key(self, nInc, nSub, thetaInc):
+		""" hashable signature of an evaluation"""
+		return tuple((x.shape, x.tobytes()) for x in (
+			self.canonical(nInc, float), self.canonical(nSub, complex), self.canonical(thetaInc, float)))
+
+	def evaluate(self, nInc, nSub, thetaInc):
+		""" FresnelArray.FresnelAll(nInc, nSub, thetaInc), served from the cache when the signature repeats"""
+		nInc = self.canonical(nInc, float)
+		nSub = self.canonical(nSub, complex)
+		thetaInc = self.canonical(thetaInc, float)
+		key = self.key(nInc, nSub, thetaInc)
+		def compute():
+			coef = FresnelArray.FresnelAll(nInc, nSub, thetaInc)
+			for values in coef:
+				values.flags.writeable = False
+			return coef
+		return self.cache.getOrCompute(key, compute)
+
+	def evaluateAdaptive(self, nInc, nSub, **options):
+		""" (angles, FresnelCoefficients) of AdaptiveSampling.AdaptiveAngles, served from the cache for a repeated (nInc, nSub, options)"""
+		import AdaptiveSampling
+		key = ('adaptive', float(nInc) + 0.0, complex(nSub) + 0.0, tuple(sorted(options.items())))
+		def compute():
+			angles, coef = AdaptiveSampling.AdaptiveAngles(nInc, nSub, **options)
+			for values in (angles,) + tuple(coef):
+				values.flags.writeable = False
+			return angles, coef
+		return self.cache.getOrCompute(key, compute)
+
+	def stats(self):
+		""" hit/miss counters and occupancy"""
+		return self.cache.stats()
+
+	def clear(self):
+		self.cache.clear()
+
+
+# shared evaluator for the GUI and service paths
+fresnelCache = FresnelCache()
+
+
+
+
+
+# test cases
+def testCache():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testLRUCache, testFresnelCache, testAdaptiveCache):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all CACHE TESTS passed? '+str(combinedTest))
+
+def testLRUCache():
+	cache = LRUCache(2)
+	cache.put('a', 1)
+	cache.put('b', 2)
+	cache.get('a')					# 'b' is now least recently used
+	cache.put('c', 3)
+	return(
+		'b' not in cache and cache.get('a') == 1 and cache.get('c') == 3 and cache.get('b') is None and \
+		cache.stats() == dict(hits=3, misses=1, evictions=1, size=2, maxsize=2))
+
+# equivalent signatures share an entry, results match the uncached evaluation
+def testFresnelCache():
+	evaluator = FresnelCache(maxsize=4)
+	angles = np.linspace(0, np.pi/2, 100)
+	first = evaluator.evaluate(1, complex(1.5, 0.01), angles)
+	second = evaluator.evaluate(np.float64(1.0), complex(1.5, 0.01), angles.copy())
+	other = evaluator.evaluate(1.0, complex(1.5, 0.02), angles)
+	expected = FresnelArray.FresnelAll(1.0, complex(1.5, 0.01), angles)
+	return(
+		first is second and other is not first and \
+		all(np.array_equal(a, b, equal_nan=True) for a, b in zip(first, expected)) and \
+		not first.Rs.flags.writeable and \
+		evaluator.key(-0.0, 1.5, 0.0) == evaluator.key(0.0, complex(1.5, 0.0), -0.0) and \
+		evaluator.stats()['hits'] == 1 and evaluator.stats()['misses'] == 2)
+
+def testAdaptiveCache():
+	evaluator = FresnelCache(maxsize=4)
+	angles, coef = evaluator.evaluateAdaptive(1, 1.5, tolerance=1e-3)
+	again = evaluator.evaluateAdaptive(1.0, complex(1.5, -0.0), tolerance=1e-3)
+	return again[1] is coef and not angles.flags.writeable and evaluator.stats()['hits'] == 1
+
+
+if __name__ == '__main__':
+	testCache()
@@ -0,0 +1,242 @@
+"""
+FRESNEL EQUATIONS (ARRAY)
+
+NumPy-vectorized counterparts of the functions in Fresnel.py.
+Function summary:
+	Fresnel amplitude equations (s and p polarized)
+	Fresnel Irradiance equations (s and p polarized)
+	Snell's law
+	retardance and diattenuation calculations
+	fused evaluation of every coefficient in one pass
+	test cases against the scalar implementation in Fresnel.py
+
+Same conventions as Fresnel.py: decreasing phase convention (n + i k), incident
+material real-valued, transmitted irradiance defined immediately after the interface,
+angles in radians.
+
+"nInc", "nSub" and "thetaInc" may be scalars or arrays of any broadcastable shape.
+Every function returns an ndarray of the broadcast shape holding the same values the
+scalar function in Fresnel.py returns element by element.
+
+Test cases can be evaluated with following command:
+python3 FresnelArray.py
+"""
+
+from collections import namedtuple
+import numpy as np
+
+
+def _csqrt(x):
+	""" principal complex square root (real negative arguments give +i, as cmath.sqrt does)"""
+	return np.sqrt(np.asarray(x, dtype=complex))
+
+def _cosSinSq(thetaInc):
+	""" cos(thetaInc) and sin(thetaInc)**2 """
+	thetaInc = np.asarray(thetaInc)
+	sinThetaInc = np.sin(thetaInc)
+	return np.cos(thetaInc), sinThetaInc*sinThetaInc
+
+
+def _absSq(x):
+	""" |x|**2 without the hypot of np.abs """
+	return x.real*x.real + x.imag*x.imag
+
+
+def SnellAngle(nInc, nSub, thetaInc):
+	""" Transmitted (substrate) angle according to Snell's Law. Complex-valued. [radians]"""
+	nInc = np.asarray(nInc)
+	return np.arcsin(np.asarray(nInc*np.sin(thetaInc)/nSub, dtype=complex))
+
+
+# Fresnel amplitude equations
+def rs(nInc, nSub, thetaInc):
+	""" electric field amplitude, s-polarized, reflected"""
+	nSq = np.asarray(nSub)/nInc
+	nSq = nSq*nSq
+	cosThetaInc, sinThetaIncSq = _cosSinSq(thetaInc)
+	sqrtTerm = _csqrt(nSq - sinThetaIncSq)
+	return (cosThetaInc - sqrtTerm)/(cosThetaInc + sqrtTerm)
+
+def rp(nInc, nSub, thetaInc):
+	""" electric field amplitude, p-polarized, reflected"""
+	nSq = np.asarray(nSub)/nInc
+	nSq = nSq*nSq
+	cosThetaInc, sinThetaIncSq = _cosSinSq(thetaInc)
+	sqrtTerm = _csqrt(nSq - sinThetaIncSq)
+	return (nSq*cosThetaInc - sqrtTerm)/(nSq*cosThetaInc + sqrtTerm)
+
+def ts(nInc, nSub, thetaInc):
+	""" electric field amplitude, s-polarized, transmitted"""
+	nSq = np.asarray(nSub)/nInc
+	nSq = nSq*nSq
+	cosThetaInc, sinThetaIncSq = _cosSinSq(thetaInc)
+	return 2.0*cosThetaInc / (cosThetaInc + _csqrt(nSq - sinThetaIncSq))
+
+def tp(nInc, nSub, thetaInc):
+	""" electric field amplitude, p-polarized, transmitted"""
+	nRatio = np.asarray(nSub)/nInc
+	nRatioSq = nRatio*nRatio
+	cosThetaInc, sinThetaIncSq = _cosSinSq(thetaInc)
+	return (2.0*nRatio*cosThetaInc) / (nRatioSq*cosThetaInc + _csqrt(nRatioSq - sinThetaIncSq))
+
+
+# Fresnel irradiance equations
+def Rs(nInc, nSub, thetaInc):
+	""" irradiance, s-polarized, reflected"""
+	rsVal = rs(nInc, nSub, thetaInc)
+	return np.abs(rsVal*rsVal)
+
+def Rp(nInc, nSub, thetaInc):
+	""" irradiance, p-polarized, reflected"""
+	rpVal = rp(nInc, nSub, thetaInc)
+	return np.abs(rpVal*rpVal)
+
+def Ts(nInc, nSub, thetaInc):
+	""" irradiance, s-polarized, transmitted (absorbing materials require careful consideration of scale factor for energy conservation)"""
+	thetaSub = SnellAngle(nInc, nSub, thetaInc)
+	tsVal = ts(nInc, nSub, thetaInc)
+	scale2 = np.asarray(nSub) * np.cos(thetaSub)
+	return np.abs(tsVal*tsVal) * scale2.real/(np.real(nInc)*np.cos(thetaInc))
+
+def Tp(nInc, nSub, thetaInc):
+	""" irradiance, p-polarized, transmitted (absorbing materials require careful consideration of scale factor for energy conservation)"""
+	thetaSub = SnellAngle(nInc, nSub, thetaInc)
+	cosThetaSub = np.cos(thetaSub)
+	tpVal = tp(nInc, nSub, thetaInc)
+	return np.abs(tpVal*tpVal) * (np.real(nSub)*cosThetaSub.real + np.imag(nSub)*cosThetaSub.imag) / (np.real(nInc) * np.cos(thetaInc))
+
+
+# polarization calculations
+def Diattenuation(irrad1, irrad2):
+	""" diattenuation """
+	irrad1 = np.asarray(irrad1)
+	return np.abs(irrad1-irrad2)/(irrad1+irrad2)
+
+def Retardance(Efield1, Efield2):
+	""" retardance [radians]"""
+	return np.angle(Efield1)-np.angle(Efield2)
+
+
+# fused evaluation
+FresnelCoefficients = namedtuple('FresnelCoefficients', (
+	'rs', 'rp', 'ts', 'tp',							# complex amplitudes
+	'Rs', 'Rp', 'Ts', 'Tp',							# irradiances
+	'DiattenuationR', 'DiattenuationT',				# Diattenuation(Rs, Rp), Diattenuation(Ts, Tp)
+	'RetardanceR', 'RetardanceT'))					# Retardance(rs, rp), Retardance(ts, tp) [radians]
+
+def FresnelAll(nInc, nSub, thetaInc):
+	""" every amplitude, irradiance, diattenuation and retardance in one pass (struct of arrays)
+
+	The index ratio, cos(thetaInc), sin(thetaInc)**2 and the square root shared by all four
+	amplitude equations are computed once; cos(thetaSub) = sqrt(1 - sin(thetaSub)**2) replaces
+	the arcsin/cos pair of SnellAngle in the transmitted irradiances.
+	"""
+	nSub = np.asarray(nSub)
+	nRatio = nSub/nInc
+	nSq = nRatio*nRatio
+	cosThetaInc, sinThetaIncSq = _cosSinSq(thetaInc)
+	sqrtTerm = _csqrt(nSq - sinThetaIncSq)
+
+	sDenom = 1.0/(cosThetaInc + sqrtTerm)
+	nSqCos = nSq*cosThetaInc
+	pDenom = 1.0/(nSqCos + sqrtTerm)
+	rsVal = (cosThetaInc - sqrtTerm)*sDenom
+	rpVal = (nSqCos - sqrtTerm)*pDenom
+	tsVal = 2.0*cosThetaInc*sDenom
+	tpVal = 2.0*nRatio*cosThetaInc*pDenom
+
+	RsVal = _absSq(rsVal)
+	RpVal = _absSq(rpVal)
+	cosThetaSub = _csqrt(1.0 - sinThetaIncSq/nSq)
+	incScale = np.real(nInc)*cosThetaInc
+	TsVal = _absSq(tsVal) * (nSub*cosThetaSub).real/incScale
+	TpVal = _absSq(tpVal) * (np.real(nSub)*cosThetaSub.real + np.imag(nSub)*cosThetaSub.imag)/incScale
+
+	return FresnelCoefficients(
+		rsVal, rpVal, tsVal, tpVal,
+		RsVal, RpVal, TsVal, TpVal,
+		Diattenuation(RsVal, RpVal), Diattenuation(TsVal, TpVal),
+		Retardance(rsVal, rpVal), Retardance(tsVal, tpVal))
+
+
+
+
+
+# test cases
+# every array function must reproduce the scalar function of the same name in Fresnel.py
+testPrecision = 1e-12
+def compareScalar(name, nInc, nSub, thetaInc):
+	"""helper function comparing an array function with its scalar counterpart element by element"""
+	import Fresnel
+	arrayVal = np.ravel(globals()[name](nInc, nSub, thetaInc))
+	nIncB, nSubB, thetaIncB = (x.ravel() for x in np.broadcast_arrays(nInc, nSub, thetaInc))
+	scalarVal = np.array([getattr(Fresnel, name)(a.item(), b.item(), c.item()) for a, b, c in zip(nIncB, nSubB, thetaIncB)])
+	return bool(np.all(np.abs(arrayVal - scalarVal) <= testPrecision*(1.0 + np.abs(scalarVal))))
+
+def testFresnelArray():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testAgainstScalar, testBroadcast, testPolarization, testFresnelAll):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all FRESNEL ARRAY TESTS passed? '+str(combinedTest))
+
+# random dielectric, metal and total internal reflection cases
+def testAgainstScalar():
+	rng = np.random.default_rng(2022)
+	nTrials = 200
+	thetaInc = rng.random(nTrials)*1.570796326
+	cases = (
+		(1.0 + rng.random(nTrials), 1.0 + rng.random(nTrials)),												# dielectric
+		(1.0 + rng.random(nTrials)*0.5, rng.random(nTrials)*2.0 + 1j*rng.random(nTrials)*10.0),			# metal
+		(1.5 + rng.random(nTrials), 1.0 + rng.random(nTrials)*0.4))											# TIR beyond the critical angle
+	names = ('SnellAngle', 'rs', 'rp', 'ts', 'tp', 'Rs', 'Rp', 'Ts', 'Tp')
+	return all(compareScalar(name, nInc, nSub, thetaInc) for nInc, nSub in cases for name in names)
+
+# angle x wavelength grid: (nAngle, 1) against (nWavelength,) indices
+def testBroadcast():
+	thetaInc = np.linspace(0, 1.5, 7)[:, None]
+	nSub = np.array([1.5, complex(0.29006, 2.8628), complex(2.007, 3.781)])
+	return(
+		Rs(1.0, nSub, thetaInc).shape == (7, 3) and \
+		Tp(1.0, nSub, thetaInc).shape == (7, 3) and \
+		compareScalar('Ts', 1.0, nSub, thetaInc) and \
+		compareScalar('rp', 1.0, nSub, thetaInc))
+
+def testPolarization():
+	import Fresnel
+	n1 = 1.0
+	n2 = complex(2.007, 3.781)
+	thetaInc = np.array([0.3, 1.0471976])
+	retard = Retardance(rp(n1, n2, thetaInc), rs(n1, n2, thetaInc))
+	diatten = Diattenuation(Rs(n1, n2, thetaInc), Rp(n1, n2, thetaInc))
+	return(
+		all(abs(retard[i] - Fresnel.Retardance(Fresnel.rp(n1, n2, t), Fresnel.rs(n1, n2, t))) < testPrecision for i, t in enumerate(thetaInc)) and \
+		all(abs(diatten[i] - Fresnel.Diattenuation(Fresnel.Rs(n1, n2, t), Fresnel.Rp(n1, n2, t))) < testPrecision for i, t in enumerate(thetaInc)))
+
+# fused kernel against the individual functions, including TIR and the metal test cases of Fresnel.py
+def testFresnelAll():
+	rng = np.random.default_rng(2023)
+	nTrials = 500
+	nInc = np.concatenate((1.0 + rng.random(nTrials), [1.0, 1.0, 1.72, 1.51]))
+	nSub = np.concatenate((rng.random(nTrials)*2.0 + 1j*rng.random(nTrials)*(rng.random(nTrials) < 0.5)*10.0, [complex(0.29006,2.8628), complex(2.007,3.781), 1.15, 1.0]))
+	thetaInc = np.concatenate((rng.random(nTrials)*1.570796326, [0.87266463, 1.0471976, 0.7, 0.95324066]))
+	with np.errstate(invalid='ignore'):
+		coef = FresnelAll(nInc, nSub, thetaInc)
+		expected = dict(
+			rs=rs(nInc, nSub, thetaInc), rp=rp(nInc, nSub, thetaInc), ts=ts(nInc, nSub, thetaInc), tp=tp(nInc, nSub, thetaInc),
+			Rs=Rs(nInc, nSub, thetaInc), Rp=Rp(nInc, nSub, thetaInc), Ts=Ts(nInc, nSub, thetaInc), Tp=Tp(nInc, nSub, thetaInc))
+		expected['DiattenuationR'] = Diattenuation(expected['Rs'], expected['Rp'])
+		expected['DiattenuationT'] = Diattenuation(expected['Ts'], expected['Tp'])
+	expected['RetardanceR'] = Retardance(expected['rs'], expected['rp'])
+	expected['RetardanceT'] = Retardance(expected['ts'], expected['tp'])
+	# under total internal reflection Ts + Tp is round-off (Fresnel.py) or exactly zero (fused), so DiattenuationT is not comparable
+	transmitted = expected['Ts'] + expected['Tp'] > 1e-9
+	expected['DiattenuationT'] = expected['DiattenuationT'][transmitted]
+	coef = coef._replace(DiattenuationT=coef.DiattenuationT[transmitted])
+	return all(np.allclose(getattr(coef, name), value, rtol=1e-9, atol=1e-9) for name, value in expected.items())
+
+
+if __name__ == '__main__':
+	testFresnelArray()
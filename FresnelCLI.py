@@ -0,0 +1,145 @@
+"""
+FRESNEL CLI
+
+Headless command-line evaluation of the Fresnel equations in bulk.
+Function summary:
+	input from a parameter file, stdin or an angle sweep given on the command line
+	output to a file or stdout, as CSV or packed binary records (see Stream.py)
+	test cases
+
+Parameter files hold one (nInc, nSub, thetaInc) triple per row: CSV with columns nInc, nSubReal,
+nSubImag, thetaInc [radians] (optional header line), or packed binary records of
+Stream.INPUT_DTYPE. The format follows the file extension (.csv/.txt for CSV) unless given with
+--input-format/--output-format; stdin and stdout default to CSV. Evaluation streams chunk by
+chunk, so files larger than memory are fine.
+
+Examples:
+python3 FresnelCLI.py params.csv -o results.csv --quantities Rs Rp RetardanceR
+cat params.csv | python3 FresnelCLI.py --include-inputs > results.csv
+python3 FresnelCLI.py --nInc 1.0 --nSub 2.007+3.781j --angles 0 1.5 151 --quantities Rs Rp
+
+Test cases can be evaluated with following command:
+python3 FresnelCLI.py --test
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+import FresnelArray
+import Stream
+
+
+def _isCsv(path, formatName):
+	if formatName:
+		return formatName == 'csv'
+	return path == '-' or path.lower().endswith(('.csv', '.txt'))
+
+def _inputChunks(args, stdin):
+	""" input chunks chosen by the arguments"""
+	if args.nSub is not None:
+		start, stop, count = args.angles
+		return Stream.iterArrayChunks(args.nInc, complex(args.nSub.replace(' ', '')), np.linspace(start, stop, int(count)), args.chunk_size)
+	if args.input == '-':
+		if _isCsv('-', args.input_format):
+			return Stream.iterCsvChunks(stdin, args.chunk_size)
+		return Stream.iterBinaryStream(stdin.buffer, args.chunk_size)
+	if _isCsv(args.input, args.input_format):
+		return Stream.iterCsvChunks(args.input, args.chunk_size)
+	return Stream.iterBinaryChunks(args.input, args.chunk_size)
+
+def main(argv=None, stdin=None, stdout=None):
+	""" run the command line; returns the number of rows written"""
+	stdin = stdin or sys.stdin
+	stdout = stdout or sys.stdout
+	parser = argparse.ArgumentParser(description='Evaluate Fresnel coefficients for (nInc, nSub, thetaInc) triples in bulk.')
+	parser.add_argument('input', nargs='?', default='-', help="parameter file (CSV or binary records); '-' reads stdin (default)")
+	parser.add_argument('-o', '--output', default='-', help="result file; '-' writes stdout (default)")
+	parser.add_argument('-q', '--quantities', nargs='+', default=['Rs', 'Rp', 'Ts', 'Tp'], choices=FresnelArray.FresnelCoefficients._fields, metavar='QUANTITY',
+		help='fields of FresnelArray.FresnelCoefficients (default: Rs Rp Ts Tp)')
+	parser.add_argument('--include-inputs', action='store_true', help='repeat nInc, nSub, thetaInc in the output')
+	parser.add_argument('--input-format', choices=('csv', 'binary'))
+	parser.add_argument('--output-format', choices=('csv', 'binary'))
+	parser.add_argument('--chunk-size', type=int, default=Stream.DEFAULT_CHUNK)
+	parser.add_argument('--nInc', type=float, default=1.0, help='incident index of an angle sweep (with --nSub)')
+	parser.add_argument('--nSub', help='substrate index of an angle sweep, e.g. 1.5 or 2.007+3.781j (replaces the input file)')
+	parser.add_argument('--angles', nargs=3, type=float, default=(0.0, np.pi/2, 91), metavar=('START', 'STOP', 'COUNT'),
+		help='sweep angles [radians] (default: 0 pi/2 91)')
+	parser.add_argument('--test', action='store_true', help='run the test cases and exit')
+	args = parser.parse_args(argv)
+	if args.test:
+		testFresnelCLI()
+		return 0
+
+	results = Stream.StreamEvaluate(_inputChunks(args, stdin), args.quantities, args.include_inputs)
+	try:		# chunks are read lazily, so malformed input surfaces while writing
+		if _isCsv(args.output, args.output_format):
+			return Stream.writeCsv(results, stdout if args.output == '-' else args.output)
+		return Stream.writeBinary(results, stdout.buffer if args.output == '-' else args.output)
+	except ValueError as error:
+		parser.error(str(error))
+
+
+
+
+
+# test cases
+def testFresnelCLI():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testFiles, testStdin, testMalformed, testSweep):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all FRESNEL CLI TESTS passed? '+str(combinedTest))
+
+def testFiles():
+	import os, tempfile
+	nInc, nSub, thetaInc = Stream.randomTriples(300)
+	with tempfile.TemporaryDirectory() as directory:
+		inputPath = os.path.join(directory, 'params.bin')
+		outputPath = os.path.join(directory, 'results.bin')
+		Stream.writeBinaryInputs(inputPath, nInc, nSub, thetaInc)
+		count = main([inputPath, '-o', outputPath, '-q', 'rs', 'Tp', '--chunk-size', '64'])
+		records = np.fromfile(outputPath, dtype=Stream.outputDtype(('rs', 'Tp')))
+	expected = FresnelArray.FresnelAll(nInc, nSub, thetaInc)
+	return count == 300 and np.array_equal(records['rs'], expected.rs) and np.array_equal(records['Tp'], expected.Tp)
+
+# CSV piped through stdin and stdout
+def testStdin():
+	import io
+	nInc, nSub, thetaInc = Stream.randomTriples(50)
+	text = io.StringIO()
+	text.write('nInc,nSubReal,nSubImag,thetaInc\n')
+	np.savetxt(text, np.column_stack((nInc, nSub.real, nSub.imag, thetaInc)), delimiter=',', fmt='%.17g')
+	out = io.StringIO()
+	count = main(['--include-inputs', '-q', 'Rp'], stdin=io.StringIO(text.getvalue()), stdout=out)
+	lines = out.getvalue().splitlines()
+	data = np.loadtxt(lines[1:], delimiter=',')
+	return(
+		count == 50 and lines[0] == 'nInc,nSubReal,nSubImag,thetaInc,Rp' and \
+		np.allclose(data[:, 4], FresnelArray.Rp(nInc, nSub, thetaInc), rtol=1e-15, atol=0.0))
+
+# malformed CSV input is a usage error (exit status 2), not a traceback
+def testMalformed():
+	import contextlib, io
+	errors = io.StringIO()
+	try:
+		with contextlib.redirect_stderr(errors):
+			main([], stdin=io.StringIO('nInc,nSubReal,nSubImag,thetaInc\n1.0,1.5,0.0,0.1\n1.0,abc,0.0,0.2\n'), stdout=io.StringIO())
+		status = 0
+	except SystemExit as exit:
+		status = exit.code
+	return status == 2 and 'error:' in errors.getvalue()
+
+def testSweep():
+	import io
+	out = io.StringIO()
+	count = main(['--nSub', '2.007+3.781j', '--angles', '0', '1.5', '16', '-q', 'Rs'], stdout=out)
+	values = np.loadtxt(out.getvalue().splitlines()[1:])
+	return count == 16 and np.allclose(values, FresnelArray.Rs(1.0, complex(2.007, 3.781), np.linspace(0.0, 1.5, 16)), rtol=1e-15, atol=0.0)
+
+
+if __name__ == '__main__':
+	main()
@@ -1,40 +1,11 @@
-import tkinter as tk
-from tkinter import ttk
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
+import os
+import queue
+import threading
 import numpy as np
-import Fresnel  # Asegúrate de que las funciones de Fresnel estén correctamente importadas
-
-root = tk.Tk()
-root.title("Fresnel Calculator")
-
-# Crear un contenedor para las etiquetas y campos de entrada
-frame_params = tk.Frame(root)
-frame_params.pack(pady=10)
-
-# Crear la etiqueta y el campo de entrada para nInc
-label_nInc = tk.Label(frame_params, text="Índice de refracción incidente (nInc):")
-label_nInc.grid(row=0, column=0, padx=5)
-entry_nInc = tk.Entry(frame_params)
-entry_nInc.grid(row=0, column=1, padx=5)
-entry_nInc.insert(0, "1")  # Valor por defecto
-
-# Crear la etiqueta y los campos de entrada para nSub (refracción compleja)
-label_nSub = tk.Label(frame_params, text="Índice de refracción sustrato (nSub) [Re, Im]:")
-label_nSub.grid(row=1, column=0, padx=5)
-entry_nSub_Re = tk.Entry(frame_params)
-entry_nSub_Re.grid(row=1, column=1, padx=5)
-entry_nSub_Re.insert(0, "1.5")  # Valor por defecto
-
-plus_label = tk.Label(frame_params, text="+")
-plus_label.grid(row=1, column=2, padx=5)
-entry_nSub_Im = tk.Entry(frame_params)
-entry_nSub_Im.grid(row=1, column=3, padx=5)
-entry_nSub_Im.insert(0, "0.01")  # Valor por defecto
-
-# Crear una etiqueta para el desplegable de operaciones
-label_operation = tk.Label(root, text="Seleccione la operación:")
-label_operation.pack(pady=10)
+import Instrumentation  # Perfilado opcional (FRESNEL_PROFILE), sin coste cuando está desactivado
+from Cache import fresnelCache  # Resultados memorizados por (nInc, nSub)
+
+# Importar este módulo no crea ventanas ni carga tkinter/matplotlib: la interfaz se construye en main()
 
 # Operaciones disponibles
 operations = [
@@ -54,160 +25,266 @@ operations = [
     "transmitted amplitude - Imag"
 ]
 
-# Crear desplegable
-combobox_operation = ttk.Combobox(root, values=operations, state="readonly")
-combobox_operation.pack(pady=10)
-combobox_operation.current(0)  # Seleccionar la primera opción por defecto
-
-# Variable para almacenar el canvas actual
-current_canvas = None
+# Curvas de cada operación a partir de los coeficientes calculados por FresnelArray.FresnelAll
+def operation_curves(operation, coef):
+    if operation == "reflected irradiance":
+        return [(coef.Rs, "Reflected Irradiance (s)", 'blue'), (coef.Rp, "Reflected Irradiance (p)", 'red')]
+    if operation == "transmitted irradiance":
+        return [(coef.Ts, "Transmitted Irradiance (s)", 'blue'), (coef.Tp, "Transmitted Irradiance (p)", 'red')]
+    if operation == "reflected diattenuation":
+        return [(coef.DiattenuationR, "Reflected Diattenuation", 'green')]
+    if operation == "transmitted diattenuation":
+        return [(coef.DiattenuationT, "Transmitted Diattenuation", 'purple')]
+    if operation == "reflected retardance":
+        return [(coef.RetardanceR, "Reflected Retardance", 'orange')]
+    if operation == "transmitted retardance":
+        return [(coef.RetardanceT, "Transmitted Retardance", 'purple')]
+
+    # Amplitudes: "reflected amplitude - Abs", "transmitted amplitude - Phase", ...
+    direction, part = operation.split(" amplitude - ")
+    amplitude_s, amplitude_p = (coef.rs, coef.rp) if direction == "reflected" else (coef.ts, coef.tp)
+    transform = {"Abs": np.abs, "Phase": np.angle, "Real": np.real, "Imag": np.imag}[part]
+    if direction == "reflected":
+        labels = (f"Reflected Amplitude (s) - {part}", f"Reflected Amplitude (p) - {part}")
+    else:
+        labels = (f"Transmitted Amplitude (s) - {part}", f"Transmitted Amplitude (p) - {part}")
+    return [(transform(amplitude_s), labels[0], 'blue'), (transform(amplitude_p), labels[1], 'red')]
+
+# Ángulos de 0 a 90 grados, muestreados de forma adaptativa: más puntos cerca de los ángulos de
+# Brewster y crítico, menos donde las curvas son planas (ver AdaptiveSampling.py)
+SAMPLED_QUANTITIES = ('rs', 'rp', 'ts', 'tp', 'Rs', 'Rp', 'Ts', 'Tp')
+SAMPLING_TOLERANCE = 2e-3
+
+def main():
+    # Dependencias de la interfaz, cargadas solo al abrirla
+    import tkinter as tk
+    from tkinter import ttk
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from matplotlib.figure import Figure
+
+    # Perfilado opcional: FRESNEL_PROFILE=prefijo guarda prefijo.json, prefijo.folded y prefijo.trace.json al cerrar
+    profile = os.environ.get('FRESNEL_PROFILE')
+    if profile:
+        Instrumentation.enable(trace=True)
+
+    root = tk.Tk()
+    root.title("Fresnel Calculator")
+
+    # Crear un contenedor para las etiquetas y campos de entrada
+    frame_params = tk.Frame(root)
+    frame_params.pack(pady=10)
+
+    # Crear la etiqueta y el campo de entrada para nInc
+    label_nInc = tk.Label(frame_params, text="Índice de refracción incidente (nInc):")
+    label_nInc.grid(row=0, column=0, padx=5)
+    entry_nInc = tk.Entry(frame_params)
+    entry_nInc.grid(row=0, column=1, padx=5)
+    entry_nInc.insert(0, "1")  # Valor por defecto
+
+    # Crear la etiqueta y los campos de entrada para nSub (refracción compleja)
+    label_nSub = tk.Label(frame_params, text="Índice de refracción sustrato (nSub) [Re, Im]:")
+    label_nSub.grid(row=1, column=0, padx=5)
+    entry_nSub_Re = tk.Entry(frame_params)
+    entry_nSub_Re.grid(row=1, column=1, padx=5)
+    entry_nSub_Re.insert(0, "1.5")  # Valor por defecto
+
+    plus_label = tk.Label(frame_params, text="+")
+    plus_label.grid(row=1, column=2, padx=5)
+    entry_nSub_Im = tk.Entry(frame_params)
+    entry_nSub_Im.grid(row=1, column=3, padx=5)
+    entry_nSub_Im.insert(0, "0.01")  # Valor por defecto
+
+    # Casilla para recalcular el gráfico mientras se escribe
+    live_update = tk.BooleanVar(value=True)
+    check_live = tk.Checkbutton(frame_params, text="Actualizar al escribir", variable=live_update)
+    check_live.grid(row=2, column=0, columnspan=4, pady=5)
+
+    # Crear una etiqueta para el desplegable de operaciones
+    label_operation = tk.Label(root, text="Seleccione la operación:")
+    label_operation.pack(pady=10)
+
+    # Crear desplegable
+    combobox_operation = ttk.Combobox(root, values=operations, state="readonly")
+    combobox_operation.pack(pady=10)
+    combobox_operation.current(0)  # Seleccionar la primera opción por defecto
+
+    # Cálculo en segundo plano: el hilo de trabajo toma la petición más reciente y deja el resultado
+    # en una cola que el bucle de Tk revisa con after(), así la interfaz nunca se bloquea
+    compute_requests = queue.Queue()
+    compute_results = queue.Queue()
+    generation = 0  # Número de la petición más reciente; los resultados antiguos se descartan
+
+    def compute_worker():
+        while True:
+            request = compute_requests.get()
+            while not compute_requests.empty():  # Saltar peticiones ya superadas
+                request = compute_requests.get_nowait()
+            request_generation, operation, nInc, nSub = request
+            try:
+                with Instrumentation.stage('FresnelCalc.compute') as stage, np.errstate(all='ignore'):
+                    angles, coef = fresnelCache.evaluateAdaptive(nInc, nSub, quantities=SAMPLED_QUANTITIES, tolerance=SAMPLING_TOLERANCE)
+                    curves = operation_curves(operation, coef)
+                    stage.batch = angles.size
+            except Exception:
+                # Entrada no evaluable: el hilo sigue vivo y el gráfico conserva las curvas anteriores
+                compute_results.put((request_generation, None, None, None))
+                continue
+            compute_results.put((request_generation, operation, angles, curves))
+
+    threading.Thread(target=compute_worker, daemon=True).start()
+
+    # Función para actualizar el gráfico basado en la operación seleccionada
+    def update_graph():
+        nonlocal generation
+        try:
+            nInc = float(entry_nInc.get())  # Índice de refracción incidente
+            nSub_Re = float(entry_nSub_Re.get())  # Parte real índice de refracción sustrato
+            nSub_Im = float(entry_nSub_Im.get())  # Parte imaginaria índice de refracción sustrato
+        except ValueError:
+            return  # Valor incompleto mientras se escribe
+        if not nInc > 0.0:
+            return  # Índice incidente no físico (p. ej. "0" mientras se escribe "0.5")
+        nSub = complex(nSub_Re, nSub_Im)  # Índice de refracción sustrato
+        generation += 1
+        compute_requests.put((generation, combobox_operation.get(), nInc, nSub))
+
+    # Revisar los resultados del hilo de trabajo (unas 60 veces por segundo)
+    def poll_results():
+        latest = None
+        while not compute_results.empty():
+            latest = compute_results.get_nowait()
+        if latest is not None and latest[0] == generation and latest[1] is not None:
+            draw_curves(*latest[1:])
+        root.after(16, poll_results)
+
+    # Recalcular mientras se escribe, con una pequeña espera para agrupar pulsaciones
+    pending_update = None
+    def on_entry_change(*args):
+        nonlocal pending_update
+        if not live_update.get():
+            return
+        if pending_update is not None:
+            root.after_cancel(pending_update)
+        pending_update = root.after(30, run_pending_update)
+
+    def run_pending_update():
+        nonlocal pending_update
+        pending_update = None
+        update_graph()
+
+    # Figura persistente: las líneas se actualizan en su lugar y se redibujan con blitting
+    fig = Figure(figsize=(6, 4))
+    ax = fig.add_subplot()
+    ax.set_xlabel('Ángulo de incidencia (radianes)')
+    ax.set_ylabel('Valor')
+    ax.set_xlim(0, np.pi/2)
+    lines = [ax.plot([], [], animated=True)[0] for _ in range(2)]
+    background = None  # Copia de la figura sin las líneas, para el blitting
+    shown_operation = None
+
+    def on_draw(event):
+        nonlocal background
+        background = canvas.copy_from_bbox(ax.bbox)
+        draw_lines()
+
+    def draw_lines():
+        for line in lines:
+            if line.get_visible():
+                ax.draw_artist(line)
+        canvas.blit(ax.bbox)
+
+    def draw_curves(operation, angles, curves):
+        with Instrumentation.stage('FresnelCalc.draw', batch=angles.size):
+            redraw_curves(operation, angles, curves)
+
+    def redraw_curves(operation, angles, curves):
+        nonlocal shown_operation
+        for index, line in enumerate(lines):
+            if index < len(curves):
+                values, label, color = curves[index]
+                line.set_data(angles, values)
+                line.set_label(label)
+                line.set_color(color)
+                line.set_visible(True)
+            else:
+                line.set_visible(False)
+
+        # Límites del eje y con un margen del 5%
+        values = np.concatenate([curve[0] for curve in curves])
+        values = values[np.isfinite(values)]
+        low, high = (values.min(), values.max()) if values.size else ax.get_ylim()
+        margin = 0.05*(high - low) if high > low else 0.05*max(abs(high), 1.0)
+        current_low, current_high = ax.get_ylim()
+        fits = current_low <= low and high <= current_high and (high - low) > 0.5*(current_high - current_low)
+
+        if background is not None and operation == shown_operation and fits:
+            # Solo cambian los datos: restaurar el fondo y redibujar las líneas
+            canvas.restore_region(background)
+            draw_lines()
+        else:
+            # Cambian los ejes, el título o la leyenda: dibujo completo (on_draw guarda el nuevo fondo)
+            ax.set_ylim(low - margin, high + margin)
+            ax.set_title(f'{operation.capitalize()} vs Incident Angle')
+            ax.legend(handles=[line for line in lines if line.get_visible()])
+            shown_operation = operation
+            canvas.draw()
+
+    # Función que se ejecuta al mover el mouse sobre el gráfico
+    def on_mouse_move(event):
+        if event.inaxes:  # Verifica si el mouse está dentro del área del gráfico
+            x, y = event.xdata, event.ydata
+            # Actualiza las coordenadas en la etiqueta
+            label_coords.config(text=f"Coordenadas: ({x:.2f}, {y:.2f})")
+            # Mueve la etiqueta cerca del puntero
+            label_coords.place(x=event.x + 10, y=root.winfo_height() - event.y + 10)  # Invertir solo el valor de y
+            label_coords.lift()  # Mover la etiqueta al frente
+
+    # Función que oculta el label cuando el mouse sale del gráfico
+    def on_mouse_leave(event):
+        label_coords.place_forget()  # Oculta el label cuando el mouse sale
+
+    # Crear una etiqueta para mostrar las coordenadas del mouse
+    label_coords = tk.Label(root, text="(0.00, 0.00)", font=("Helvetica", 8), bg="white", relief="solid", padx=5, pady=5)
+    label_coords.place_forget()  # Inicialmente, no mostrar
+
+    # Botón para actualizar el gráfico
+    button_update = tk.Button(root, text="Actualizar Gráfico", command=update_graph)
+    button_update.pack(pady=10)
+
+    # Mostrar la gráfica en el GUI (un solo canvas durante toda la sesión)
+    canvas = FigureCanvasTkAgg(fig, master=root)
+    canvas.get_tk_widget().pack(pady=20)
+    canvas.mpl_connect("draw_event", on_draw)
 
-# Función para actualizar el gráfico basado en la operación seleccionada
-def update_graph():
-    global current_canvas  # Declarar la variable global para usarla
+    # Conectar el evento de movimiento del mouse
+    canvas.mpl_connect("motion_notify_event", on_mouse_move)
+    canvas.mpl_connect("figure_leave_event", on_mouse_leave)
 
-    # Si ya existe un canvas, eliminarlo
-    if current_canvas:
-        current_canvas.get_tk_widget().destroy()
+    # Actualización automática al escribir o al cambiar la operación
+    entry_vars = []  # Guardar las variables: Tk las elimina si Python las libera
+    for entry in (entry_nInc, entry_nSub_Re, entry_nSub_Im):
+        entry_var = tk.StringVar(value=entry.get())
+        entry.config(textvariable=entry_var)
+        entry_var.trace_add("write", on_entry_change)
+        entry_vars.append(entry_var)
+    combobox_operation.bind("<<ComboboxSelected>>", lambda event: update_graph())
 
-    operation = combobox_operation.get()
-    nInc = float(entry_nInc.get())  # Índice de refracción incidente
-    nSub_Re = float(entry_nSub_Re.get())  # Parte real índice de refracción sustrato
-    nSub_Im = float(entry_nSub_Im.get())  # Parte imaginaria índice de refracción sustrato
-    nSub = complex(nSub_Re, nSub_Im)  # Índice de refracción sustrato
+    # Función para cerrar correctamente el script al cerrar la ventana
+    def on_close():
+        if profile:
+            Instrumentation.export(profile)
+        root.quit()  # Detiene el bucle de eventos
 
-    # Crear una figura de Matplotlib
-    fig, ax = plt.subplots(figsize=(6, 4))
+    # Asocia la función de cierre a la ventana
+    root.protocol("WM_DELETE_WINDOW", on_close)
 
-    # Rango de ángulos para graficar
-    angles = np.linspace(0, np.pi/2, 100)  # Ángulos de 0 a 90 grados
+    # Primer gráfico y revisión periódica de resultados
+    update_graph()
+    poll_results()
 
-    # Dependiendo de la operación seleccionada, calculamos y graficamos
-    if operation == "reflected irradiance":
-        # Calcular Rs (onda s) y Rp (onda p)
-        reflected_s = [Fresnel.Rs(nInc, nSub, angle) for angle in angles]
-        reflected_p = [Fresnel.Rp(nInc, nSub, angle) for angle in angles]
-
-        # Graficar las ondas s y p
-        ax.plot(angles, reflected_s, label="Reflected Irradiance (s)", color='blue')
-        ax.plot(angles, reflected_p, label="Reflected Irradiance (p)", color='red')
-
-    elif operation == "transmitted irradiance":
-        transmitted_s = [Fresnel.Ts(nInc, nSub, angle) for angle in angles]
-        transmitted_p = [Fresnel.Tp(nInc, nSub, angle) for angle in angles]
-        ax.plot(angles, transmitted_s, label="Transmitted Irradiance (s)", color='blue')
-        ax.plot(angles, transmitted_p, label="Transmitted Irradiance (p)", color='red')
-
-    elif operation == "reflected diattenuation":
-        reflected_Diattenuation = [Fresnel.Diattenuation(Fresnel.Rs(nInc, nSub, angle), Fresnel.Rp(nInc, nSub, angle)) for angle in angles]
-        ax.plot(angles, reflected_Diattenuation, label="Reflected Diattenuation", color='green')
-
-    elif operation == "transmitted diattenuation":
-        transmitted_Diattenuation = [Fresnel.Diattenuation(Fresnel.Ts(nInc, nSub, angle), Fresnel.Tp(nInc, nSub, angle)) for angle in angles]
-        ax.plot(angles, transmitted_Diattenuation, label="Transmitted Diattenuation", color='purple')
-
-    elif operation == "reflected retardance":
-        reflected_Retardance = [Fresnel.Retardance(Fresnel.rs(nInc, nSub, angle), Fresnel.rp(nInc, nSub, angle)) for angle in angles]
-        ax.plot(angles, reflected_Retardance, label="Reflected Retardance", color='orange')
-
-    elif operation == "transmitted retardance":
-        transmitted_Retardance_s = [Fresnel.Retardance(Fresnel.ts(nInc, nSub, angle), Fresnel.tp(nInc, nSub, angle)) for angle in angles]
-        transmitted_Retardance_p = [Fresnel.Retardance(Fresnel.tp(nInc, nSub, angle), Fresnel.tp(nInc, nSub, angle)) for angle in angles]
-        ax.plot(angles, transmitted_Retardance_s, label="Transmitted Retardance (s)", color='blue')
-        ax.plot(angles, transmitted_Retardance_p, label="Transmitted Retardance (p)", color='red')
-
-    elif operation == "reflected amplitude - Abs":
-        reflected_Amplitude_Abs_s = [abs(Fresnel.rs(nInc, nSub, angle)) for angle in angles]  # Onda s
-        reflected_Amplitude_Abs_p = [abs(Fresnel.rp(nInc, nSub, angle)) for angle in angles]  # Onda p
-        ax.plot(angles, reflected_Amplitude_Abs_s, label="Reflected Amplitude - Abs (s)", color='blue')
-        ax.plot(angles, reflected_Amplitude_Abs_p, label="Reflected Amplitude - Abs (p)", color='red')
-
-
-    elif operation == "transmitted amplitude - Abs":
-        transmitted_Amplitude_Abs_s = [abs(Fresnel.ts(nInc, nSub, angle)) for angle in angles]
-        transmitted_Amplitude_Abs_p = [abs(Fresnel.tp(nInc, nSub, angle)) for angle in angles]
-        ax.plot(angles, transmitted_Amplitude_Abs_s, label="Transmitted Amplitude (s) - Abs", color='blue')
-        ax.plot(angles, transmitted_Amplitude_Abs_p, label="Transmitted Amplitude (p) - Abs", color='red')
-
-    elif operation == "reflected amplitude - Phase":
-        reflected_Amplitude_Phase_s = [np.angle(Fresnel.rs(nInc, nSub, angle)) for angle in angles]
-        reflected_Amplitude_Phase_p = [np.angle(Fresnel.rp(nInc, nSub, angle)) for angle in angles]
-        ax.plot(angles, reflected_Amplitude_Phase_s, label="Reflected Amplitude (s) - Phase", color='blue')
-        ax.plot(angles, reflected_Amplitude_Phase_p, label="Reflected Amplitude (p) - Phase", color='red')
-
-    elif operation == "transmitted amplitude - Phase":
-        transmitted_Amplitude_Phase_s = [np.angle(Fresnel.ts(nInc, nSub, angle)) for angle in angles]
-        transmitted_Amplitude_Phase_p = [np.angle(Fresnel.tp(nInc, nSub, angle)) for angle in angles]
-        ax.plot(angles, transmitted_Amplitude_Phase_s, label="Transmitted Amplitude (s) - Phase", color='blue')
-        ax.plot(angles, transmitted_Amplitude_Phase_p, label="Transmitted Amplitude (p) - Phase", color='red')
-
-    elif operation == "reflected amplitude - Real":
-        reflected_Amplitude_Real_s = [Fresnel.rs(nInc, nSub, angle).real for angle in angles]
-        reflected_Amplitude_Real_p = [Fresnel.rp(nInc, nSub, angle).real for angle in angles]
-        ax.plot(angles, reflected_Amplitude_Real_s, label="Reflected Amplitude (s) - Real", color='blue')
-        ax.plot(angles, reflected_Amplitude_Real_p, label="Reflected Amplitude (p) - Real", color='red')
-
-    elif operation == "transmitted amplitude - Real":
-        transmitted_Amplitude_Real_s = [Fresnel.ts(nInc, nSub, angle).real for angle in angles]
-        transmitted_Amplitude_Real_p = [Fresnel.tp(nInc, nSub, angle).real for angle in angles]
-        ax.plot(angles, transmitted_Amplitude_Real_s, label="Transmitted Amplitude (s) - Real", color='blue')
-        ax.plot(angles, transmitted_Amplitude_Real_p, label="Transmitted Amplitude (p) - Real", color='red')
-
-    elif operation == "reflected amplitude - Imag":
-        reflected_Amplitude_Imag_s = [Fresnel.rs(nInc, nSub, angle).imag for angle in angles]
-        reflected_Amplitude_Imag_p = [Fresnel.rp(nInc, nSub, angle).imag for angle in angles]
-        ax.plot(angles, reflected_Amplitude_Imag_s, label="Reflected Amplitude (s) - Imag", color='blue')
-        ax.plot(angles, reflected_Amplitude_Imag_p, label="Reflected Amplitude (p) - Imag", color='red')
-
-    elif operation == "transmitted amplitude - Imag":
-        transmitted_Amplitude_Imag_s = [Fresnel.ts(nInc, nSub, angle).imag for angle in angles]
-        transmitted_Amplitude_Imag_p = [Fresnel.tp(nInc, nSub, angle).imag for angle in angles]
-        ax.plot(angles, transmitted_Amplitude_Imag_s, label="Transmitted Amplitude (s) - Imag", color='blue')
-        ax.plot(angles, transmitted_Amplitude_Imag_p, label="Transmitted Amplitude (p) - Imag", color='red')
-
-    # Configurar etiquetas y leyenda
-    ax.set_xlabel('Ángulo de incidencia (radianes)')
-    ax.set_ylabel('Valor')
-    ax.set_title(f'{operation.capitalize()} vs Incident Angle')
-    ax.legend()
+    # Ejecutar la interfaz gráfica
+    root.mainloop()
 
-    # Mostrar la gráfica en el GUI
-    current_canvas = FigureCanvasTkAgg(fig, master=root)
-    current_canvas.get_tk_widget().pack(pady=20)
-    current_canvas.draw()
 
-    # Conectar el evento de movimiento del mouse
-    current_canvas.mpl_connect("motion_notify_event", on_mouse_move)
-    current_canvas.mpl_connect("figure_leave_event", on_mouse_leave)
-
-# Función que se ejecuta al mover el mouse sobre el gráfico
-def on_mouse_move(event):
-    if event.inaxes:  # Verifica si el mouse está dentro del área del gráfico
-        x, y = event.xdata, event.ydata
-        # Actualiza las coordenadas en la etiqueta
-        label_coords.config(text=f"Coordenadas: ({x:.2f}, {y:.2f})")
-        # Mueve la etiqueta cerca del puntero
-        label_coords.place(x=event.x + 10, y=root.winfo_height() - event.y + 10)  # Invertir solo el valor de y
-        label_coords.lift()  # Mover la etiqueta al frente
-
-# Función que oculta el label cuando el mouse sale del gráfico
-def on_mouse_leave(event):
-    label_coords.place_forget()  # Oculta el label cuando el mouse sale
-
-# Crear una etiqueta para mostrar las coordenadas del mouse
-label_coords = tk.Label(root, text="(0.00, 0.00)", font=("Helvetica", 8), bg="white", relief="solid", padx=5, pady=5)
-label_coords.place_forget()  # Inicialmente, no mostrar
-
-# Botón para actualizar el gráfico
-button_update = tk.Button(root, text="Actualizar Gráfico", command=update_graph)
-button_update.pack(pady=10)
-
-# Función para cerrar correctamente el script al cerrar la ventana
-def on_close():
-    root.quit()  # Detiene el bucle de eventos
-
-# Asocia la función de cierre a la ventana
-root.protocol("WM_DELETE_WINDOW", on_close)
-
-# Ejecutar la interfaz gráfica
-root.mainloop()
+if __name__ == '__main__':
+    main()
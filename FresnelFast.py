@@ -0,0 +1,318 @@
+"""
+FRESNEL FAST
+
+Reduced-precision (float32) evaluation of the Fresnel coefficients for throughput-bound batch
+runs, and a randomized property harness quantifying the error of every evaluation mode.
+Function summary:
+	FresnelAllFast: every field of FresnelArray.FresnelCoefficients in float32/complex64 (or any real dtype)
+	regime input generators: dielectric, internal, total internal reflection, critical, grazing, normal,
+		low contrast, metal and weakly absorbing cases (fixed seed)
+	ValidateModes: max error of each mode and regime against an extended-precision reference,
+		energy conservation (R + T = 1) and reciprocity (Stokes relations)
+	test cases
+
+FresnelAllFast uses forms that are stable in single precision, with m = nSub/nInc,
+c = cos(thetaInc) and q = sqrt(m**2 - sin(thetaInc)**2) = sqrt((m - 1)(m + 1) + c**2):
+	rs = (1 - m**2)/(c + q)**2				no cancellation of c - q at low contrast
+	rp = (m**2 - 1)((m**2 + 1) c**2 - 1)/(m**2 c + q)**2
+	ts = 2c/(c + q),	tp = 2mc/(m**2 c + q)
+	Ts = 4c Re(q)/|c + q|**2,	Tp = 4c Re(conj(m)**2 q)/|m**2 c + q|**2
+(m - 1)(m + 1) keeps q accurate near the critical angle and at grazing incidence, where
+m**2 - sin(thetaInc)**2 cancels; c is computed as sin(pi/2 - thetaInc) so that it keeps its relative
+accuracy at grazing incidence; Ts and Tp need no transmitted angle and are exactly 0 under total
+internal reflection. m, m**2 - 1, c and q**2 are formed in the input precision and only then
+rounded to float32: q**2 still cancels within a few 1e-7 of the critical angle, where rounding m
+first would cost three digits. The rest runs on float32 real and imaginary parts, since numpy's
+complex64 sqrt is slower than its complex128 one. The kernel is bound by numpy temporaries: with
+float64 inputs it is 1.2-1.5x as fast as FresnelArray.FresnelAll (about 2x with float32 inputs,
+Benchmark.py case FresnelFast.FresnelAllFast) and returns half the bytes.
+
+Float32 holds about 7 significant digits. ERROR_BOUNDS lists the max absolute errors of the
+single-precision mode measured by ValidateModes (and asserted by the test cases): irradiances
+and amplitudes hold below 1e-6 away from the critical angle, including the metal cases, and a few
+units of 1e-6 within 1e-7..1e-2 rad of it. Retardance is ill-conditioned where an amplitude
+vanishes (rp at the Brewster angle, both amplitudes at low contrast, and rp of weak absorbers
+near their pseudo-Brewster angle, up to 5e-4 rad), so it should be taken from the double-precision
+functions there.
+
+Examples:
+coef = FresnelAllFast(nInc, nSub, thetaInc)		# float32 Rs, Rp, ..., complex64 rs, rp, ...
+python3 FresnelFast.py --report --size 100000 --output errors.json
+
+Test cases can be evaluated with following command:
+python3 FresnelFast.py
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+import FresnelArray
+from FresnelArray import FresnelCoefficients
+
+
+# pi/2 to extended precision, rounded to the working precision (float32, float64, longdouble)
+_HALF_PI = '1.57079632679489661923132169163975144'
+
+
+def _sqrtParts(x, y):
+	""" real and imaginary parts of the principal sqrt(x + iy) (real negative x gives +i, as cmath.sqrt does)"""
+	# a is the larger part, b = |y|/(2a) the smaller; they swap for x < 0 (blended, not branched:
+	# the sign of x is random in a batch and np.where mispredicts)
+	a = np.sqrt(0.5*(np.hypot(x, y) + np.abs(x)))
+	b = np.divide(0.5*np.abs(y), a, out=np.zeros_like(a), where=a > 0.0)
+	right = (x >= 0.0).astype(a.dtype)
+	difference = (a - b)*right
+	return b + difference, np.copysign(a - difference, y)
+
+def _complex(real, imag, dtype):
+	out = np.empty(np.broadcast_shapes(np.shape(real), np.shape(imag)), dtype=dtype)
+	out.real = real
+	out.imag = imag
+	return out
+
+def FresnelAllFast(nInc, nSub, thetaInc, dtype=np.float32):
+	""" every amplitude, irradiance, diattenuation and retardance in the real precision dtype
+
+	Amplitudes are of the matching complex type. Same conventions and broadcasting as
+	FresnelArray.FresnelAll; dtype=np.longdouble gives an extended-precision reference.
+	"""
+	real = np.dtype(dtype).type
+	nSub = np.asarray(nSub)
+	thetaInc = np.asarray(thetaInc)
+	# terms that cancel, in the input precision: m = nSub/nInc, m**2 - 1, cos(thetaInc), q**2
+	work = np.result_type(np.real(nInc), nSub.real, thetaInc, real).type
+	nInc = np.asarray(np.real(nInc)).astype(work)
+	mReal = nSub.real.astype(work)/nInc
+	mImag = nSub.imag.astype(work)/nInc
+	cosThetaInc = np.sin(work(_HALF_PI) - thetaInc.astype(work))
+	mSqOneReal = (mReal - 1.0)*(mReal + 1.0) - mImag*mImag
+	qSqReal = mSqOneReal + cosThetaInc*cosThetaInc
+	mReal, mImag, mSqOneReal, qSqReal, cosThetaInc = (x.astype(real, copy=False) for x in (mReal, mImag, mSqOneReal, qSqReal, cosThetaInc))
+
+	# everything else in the working precision, on real and imaginary parts
+	mSqOneImag = 2.0*mReal*mImag
+	qReal, qImag = _sqrtParts(qSqReal, mSqOneImag)
+	cosSq = cosThetaInc*cosThetaInc
+	sReal = cosThetaInc + qReal					# c + q
+	sNorm = 1.0/(sReal*sReal + qImag*qImag)
+	mSqReal = mSqOneReal + 1.0
+	pReal = mSqReal*cosThetaInc + qReal			# m**2 c + q
+	pImag = mSqOneImag*cosThetaInc + qImag
+	pNorm = 1.0/(pReal*pReal + pImag*pImag)
+	sConjSqReal = (sReal - qImag)*(sReal + qImag)*sNorm*sNorm		# conj(c + q)**2/|c + q|**4
+	sConjSqImag = -2.0*sReal*qImag*sNorm*sNorm
+	pConjSqReal = (pReal - pImag)*(pReal + pImag)*pNorm*pNorm
+	pConjSqImag = -2.0*pReal*pImag*pNorm*pNorm
+
+	rsReal = -(mSqOneReal*sConjSqReal - mSqOneImag*sConjSqImag)
+	rsImag = -(mSqOneReal*sConjSqImag + mSqOneImag*sConjSqReal)
+	kReal = (mSqReal + 1.0)*cosSq - 1.0			# (m**2 + 1) c**2 - 1
+	kImag = mSqOneImag*cosSq
+	numReal = mSqOneReal*kReal - mSqOneImag*kImag
+	numImag = mSqOneReal*kImag + mSqOneImag*kReal
+	rpReal = numReal*pConjSqReal - numImag*pConjSqImag
+	rpImag = numReal*pConjSqImag + numImag*pConjSqReal
+	twoCos = 2.0*cosThetaInc
+	tsReal = twoCos*sReal*sNorm
+	tsImag = -twoCos*qImag*sNorm
+	tpReal = twoCos*(mReal*pReal + mImag*pImag)*pNorm
+	tpImag = twoCos*(mImag*pReal - mReal*pImag)*pNorm
+
+	mSqOneNorm = mSqOneReal*mSqOneReal + mSqOneImag*mSqOneImag
+	RsVal = mSqOneNorm*sNorm*sNorm
+	RpVal = mSqOneNorm*(kReal*kReal + kImag*kImag)*pNorm*pNorm
+	TsVal = 2.0*twoCos*qReal*sNorm
+	TpVal = 2.0*twoCos*((mReal - mImag)*(mReal + mImag)*qReal + 2.0*mReal*mImag*qImag)*pNorm
+
+	amplitude = np.result_type(real, np.complex64)
+	return FresnelCoefficients(
+		_complex(rsReal, rsImag, amplitude), _complex(rpReal, rpImag, amplitude),
+		_complex(tsReal, tsImag, amplitude), _complex(tpReal, tpImag, amplitude),
+		RsVal, RpVal, TsVal, TpVal,
+		FresnelArray.Diattenuation(RsVal, RpVal), FresnelArray.Diattenuation(TsVal, TpVal),
+		np.arctan2(rsImag, rsReal) - np.arctan2(rpImag, rpReal), np.arctan2(tsImag, tsReal) - np.arctan2(tpImag, tpReal))
+
+
+# evaluation modes compared by the harness
+MODES = {
+	'double': FresnelArray.FresnelAll,
+	'stable double': lambda nInc, nSub, thetaInc: FresnelAllFast(nInc, nSub, thetaInc, np.float64),
+	'single': FresnelAllFast,
+}
+
+# max absolute errors of the single-precision mode over every regime (see ValidateModes)
+ERROR_BOUNDS = dict(amplitude=5e-6, irradiance=1e-5, diattenuation=1e-5, energy=1e-5, reciprocity=1e-5)
+
+GROUPS = dict(
+	amplitude=('rs', 'rp', 'ts', 'tp'), irradiance=('Rs', 'Rp', 'Ts', 'Tp'),
+	diattenuation=('DiattenuationR', 'DiattenuationT'), retardance=('RetardanceR', 'RetardanceT'))
+
+
+# regime inputs: (nInc, nSub, thetaInc) float64/complex128 arrays
+REGIMES = ('dielectric', 'internal', 'tir', 'critical', 'grazing', 'normal', 'lowContrast', 'metal', 'absorbing')
+# regimes with real indices below the critical angle, where reciprocity is checked
+RECIPROCAL_REGIMES = ('dielectric', 'internal', 'normal', 'lowContrast')
+SEED = 2022
+
+def regimeInputs(regime, size, seed=SEED):
+	""" random (nInc, nSub, thetaInc) of the regime; identical for identical arguments"""
+	rng = np.random.default_rng([seed, REGIMES.index(regime), size])
+	uniform = lambda low, high: low + (high - low)*rng.random(size)
+	logUniform = lambda low, high: 10.0**uniform(low, high)
+	nInc = uniform(1.0, 1.5)
+	if regime == 'dielectric':
+		return nInc, nInc + uniform(0.05, 2.0) + 0j, uniform(0.0, 0.999)*np.pi/2
+	if regime in ('internal', 'tir', 'critical'):
+		nInc = uniform(1.3, 2.0)
+		nSub = nInc*uniform(0.5, 0.95)
+		thetaCritical = np.arcsin(nSub/nInc)
+		if regime == 'internal':
+			thetaInc = uniform(0.0, 1.0)*(thetaCritical - 0.01)
+		elif regime == 'tir':
+			thetaInc = thetaCritical + 0.01 + uniform(0.0, 0.999)*(np.pi/2 - thetaCritical - 0.01)
+		else:
+			thetaInc = thetaCritical + np.where(rng.random(size) < 0.5, -1.0, 1.0)*logUniform(-7.0, -2.0)
+		return nInc, nSub + 0j, thetaInc
+	if regime == 'grazing':
+		nSub = np.where(rng.random(size) < 0.5, nInc + uniform(0.05, 2.0) + 0j, uniform(0.1, 3.0) + 1j*uniform(0.5, 10.0))
+		return nInc, nSub, np.pi/2 - logUniform(-7.0, -2.0)
+	if regime == 'normal':
+		return nInc, nInc + uniform(0.05, 2.0) + 0j, logUniform(-8.0, -2.0)
+	if regime == 'lowContrast':
+		return nInc, nInc*(1.0 + np.where(rng.random(size) < 0.5, -1.0, 1.0)*logUniform(-6.0, -2.0)) + 0j, uniform(0.0, 1.2)
+	if regime == 'metal':
+		return nInc, uniform(0.05, 3.0) + 1j*uniform(0.5, 10.0), uniform(0.0, 0.999)*np.pi/2
+	if regime == 'absorbing':
+		return nInc, uniform(1.2, 2.0) + 1j*logUniform(-6.0, -1.0), uniform(0.0, 0.999)*np.pi/2
+	raise ValueError('unknown regime %r' % regime)
+
+
+def _maxError(value, reference, angle=False):
+	""" max absolute difference; NaN in only one of the two counts as infinite"""
+	value = np.asarray(value).astype(complex if np.iscomplexobj(value) else float)
+	reference = np.asarray(reference).astype(value.dtype)
+	error = np.abs(value - reference)
+	if angle:
+		error = np.abs(np.angle(np.exp(1j*(value - reference))))
+	error = np.where(np.isnan(value) & np.isnan(reference), 0.0, error)
+	return float(np.max(np.where(np.isnan(error), np.inf, error), initial=0.0))
+
+def _reciprocity(evaluate, nInc, nSub, thetaInc, coef):
+	""" max deviation from the Stokes relations r21 = -r12, t12 t21 = 1 - r12**2 and T12 = T21"""
+	thetaSub = np.arcsin(nInc*np.sin(thetaInc)/nSub.real)
+	reverse = evaluate(nSub.real, nInc + 0j, thetaSub)
+	return max(
+		_maxError(reverse.rs, -coef.rs), _maxError(reverse.rp, -coef.rp),
+		_maxError(coef.ts*reverse.ts, 1.0 - coef.rs*coef.rs), _maxError(coef.tp*reverse.tp, 1.0 - coef.rp*coef.rp),
+		_maxError(reverse.Ts, coef.Ts), _maxError(reverse.Tp, coef.Tp))
+
+def ValidateModes(modes=tuple(MODES), regimes=REGIMES, size=10**5, seed=SEED):
+	""" {mode: {regime: {name: max absolute error}}} against the extended-precision reference
+
+	Names are the fields of FresnelCoefficients (retardances compared modulo 2 pi), the groups of
+	GROUPS (max over their fields), 'energy' (max |R + T - 1|, both polarizations) and, for the
+	RECIPROCAL_REGIMES, 'reciprocity'. The reference is FresnelAllFast in np.longdouble; on
+	platforms where that is plain double the errors of the double modes are not resolved.
+	"""
+	report = {mode: {} for mode in modes}
+	for regime in regimes:
+		nInc, nSub, thetaInc = regimeInputs(regime, size, seed)
+		with np.errstate(all='ignore'):
+			reference = FresnelAllFast(nInc, nSub, thetaInc, np.longdouble)
+			for mode in modes:
+				coef = MODES[mode](nInc, nSub, thetaInc)
+				errors = {name: _maxError(getattr(coef, name), getattr(reference, name), name.startswith('Retardance'))
+					for name in FresnelCoefficients._fields}
+				for group, names in GROUPS.items():
+					errors[group] = max(errors[name] for name in names)
+				errors['energy'] = max(_maxError(coef.Rs + coef.Ts, 1.0), _maxError(coef.Rp + coef.Tp, 1.0))
+				if regime in RECIPROCAL_REGIMES:
+					errors['reciprocity'] = _reciprocity(MODES[mode], nInc, nSub, thetaInc, coef)
+				report[mode][regime] = errors
+	return report
+
+def formatReport(report, names=('amplitude', 'irradiance', 'diattenuation', 'retardance', 'energy', 'reciprocity')):
+	""" text table of the grouped max errors per mode and regime"""
+	lines = ['%-14s %-12s' % ('mode', 'regime') + ''.join(' %13s' % name for name in names)]
+	for mode, regimes in report.items():
+		for regime, errors in regimes.items():
+			lines.append('%-14s %-12s' % (mode, regime) + ''.join(' %13.2e' % errors[name] if name in errors else ' %13s' % '-' for name in names))
+	return '\n'.join(lines)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Validate the Fresnel evaluation modes against an extended-precision reference.')
+	parser.add_argument('--report', action='store_true', help='print the max error table instead of running the test cases')
+	parser.add_argument('--modes', nargs='*', default=list(MODES), choices=list(MODES))
+	parser.add_argument('--regimes', nargs='*', default=list(REGIMES), choices=REGIMES)
+	parser.add_argument('--size', type=int, default=10**5, help='random points per regime')
+	parser.add_argument('--seed', type=int, default=SEED)
+	parser.add_argument('--output', help='JSON report path')
+	args = parser.parse_args(argv)
+	if not args.report:
+		testFresnelFast()
+		return
+	report = ValidateModes(args.modes, args.regimes, args.size, args.seed)
+	print(formatReport(report))
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(dict(size=args.size, seed=args.seed, referenceEpsilon=float(np.finfo(np.longdouble).eps), report=report), f, indent=1)
+
+
+# test cases
+def testFresnelFast():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testLiterature, testDouble, testSingleBounds, testSingleProperties, testTypes):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all FRESNEL FAST TESTS passed? '+str(combinedTest))
+
+# the cases of FresnelTest.py, in single precision
+def testLiterature():
+	with np.errstate(invalid='ignore'):		# the third case is totally reflected
+		coef = FresnelAllFast(
+			np.array([1.0, 1.72, 1.51, 1.0, 1.0]), np.array([1.5, 1.15, 1.0, complex(0.29006, 2.8628), complex(2.007, 3.781)]),
+			np.array([0.0, np.arctan(1.15/1.72), 0.84852090, 0.87266463, 1.0471976]))
+	return(
+		abs(coef.Rs[0] - 0.04) < 1e-6 and abs(coef.ts[0] - 0.8) < 1e-6 and \
+		abs(coef.Rp[1]) < 1e-6 and abs(coef.Tp[1] - 1.0) < 1e-6 and \
+		abs(coef.RetardanceR[2] - np.pi/4) < 1e-3 and \
+		abs(coef.Rs[3] - 0.92516) < 1e-3 and abs(coef.Rp[3] - 0.83233) < 1e-3 and \
+		abs(coef.rs[4] - complex(-0.882373, -0.183978)) < 1e-3 and abs(coef.rp[4] - complex(0.462133, 0.492465)) < 1e-3)
+
+# both double modes agree with the reference to near round-off, which also validates the reference formulas
+def testDouble():
+	report = ValidateModes(('double', 'stable double'), size=2000)
+	return all(
+		errors[group] < 1e-9 for regimes in report.values() for regime, errors in regimes.items()
+		for group in ('amplitude', 'irradiance', 'energy', 'reciprocity') if group in errors and not (regime == 'lowContrast' and group == 'reciprocity'))
+
+def testSingleBounds():
+	report = ValidateModes(('single',), size=20000)['single']
+	return all(errors[name] <= bound for errors in report.values() for name, bound in ERROR_BOUNDS.items() if name in errors)
+
+# energy conservation for the metal cases and unit reflectance under total internal reflection
+def testSingleProperties():
+	nInc, nSub, thetaInc = regimeInputs('tir', 5000)
+	with np.errstate(invalid='ignore'):		# DiattenuationT is 0/0 without transmission, as in FresnelArray
+		tir = FresnelAllFast(nInc, nSub, thetaInc)
+	nInc, nSub, thetaInc = regimeInputs('metal', 5000)
+	metal = FresnelAllFast(nInc, nSub, thetaInc)
+	return(
+		np.all(tir.Ts == 0.0) and np.all(tir.Tp == 0.0) and np.allclose(tir.Rs, 1.0, atol=5e-6) and np.allclose(tir.Rp, 1.0, atol=5e-6) and \
+		np.allclose(metal.Rs + metal.Ts, 1.0, atol=1e-6) and np.allclose(metal.Rp + metal.Tp, 1.0, atol=1e-6))
+
+def testTypes():
+	coef = FresnelAllFast(1.0, 1.5, np.linspace(0.0, 1.5, 7)[:, None]*np.ones(3))
+	wide = FresnelAllFast(1.0, 1.5, 0.5, np.float64)
+	return(
+		coef.rs.dtype == np.complex64 and coef.Rs.dtype == np.float32 and coef.RetardanceR.dtype == np.float32 and \
+		coef.Tp.shape == (7, 3) and wide.rs.dtype == np.complex128 and wide.Ts.dtype == np.float64)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,297 @@
+"""
+FRESNEL GRADIENT
+
+Analytic partial derivatives of the Fresnel coefficients, evaluated in the same pass as the
+coefficients of FresnelArray.FresnelAll.
+Function summary:
+	FresnelAllGradient: coefficients and their partials with respect to nInc, Re(nSub), Im(nSub) and thetaInc
+	test cases against central finite differences of FresnelArray.FresnelAll
+
+Same conventions as FresnelArray.py: decreasing phase convention (n + i k), nInc real-valued,
+angles in radians, any broadcastable shapes. With m = nSub/nInc and q = sqrt(m**2 - sin(thetaInc)**2),
+the amplitudes are analytic functions of m, so
+	d/d Re(nSub) = (1/nInc) d/dm,	d/d Im(nSub) = (i/nInc) d/dm,	d/d nInc = -(m/nInc) d/dm
+and one derivative per amplitude (dq/dm = m/q) gives all three. Irradiances, diattenuations and
+retardances follow by the chain rule (d|r|**2 = 2 Re(conj(r) dr), d phase(r) = Im(dr/r)).
+Partials of the complex amplitudes are complex, the others real.
+
+The partials share every intermediate of the forward pass: all twelve coefficients with all four
+partials cost about four forward evaluations (central differences: nine), and a subset such as
+Rs, Rp and RetardanceR in Re(nSub), Im(nSub) (Inverse.py) about one. They stay accurate where
+finite differences lose digits. They are infinite where the coefficients are
+not differentiable: at the critical angle (q = 0) and, for retardances, where an amplitude is
+zero (rp at the Brewster angle). For real nSub under total internal reflection q lies on the
+branch cut of the square root; partials in Im(nSub) are then those of the absorbing side, k -> 0+.
+
+Test cases can be evaluated with following command:
+python3 FresnelGradient.py
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from FresnelArray import FresnelCoefficients, _csqrt, _absSq
+
+
+PARAMETERS = ('nInc', 'nSubReal', 'nSubImag', 'thetaInc')
+FresnelPartials = namedtuple('FresnelPartials', PARAMETERS)		# each a FresnelCoefficients of partial derivatives
+
+# quantities each coefficient is computed from
+_DEPENDENCIES = dict(
+	Rs=('rs',), Rp=('rp',), Ts=('ts',), Tp=('tp',),
+	DiattenuationR=('Rs', 'Rp'), DiattenuationT=('Ts', 'Tp'),
+	RetardanceR=('rs', 'rp'), RetardanceT=('ts', 'tp'))
+
+
+def _required(quantities):
+	""" the quantities and everything they depend on, in FresnelCoefficients order"""
+	required = set()
+	pending = list(quantities)
+	while pending:
+		name = pending.pop()
+		if name not in FresnelCoefficients._fields:
+			raise ValueError('unknown quantity %r; choose from %s' % (name, FresnelCoefficients._fields))
+		if name not in required:
+			required.add(name)
+			pending.extend(_DEPENDENCIES.get(name, ()))
+	return [name for name in FresnelCoefficients._fields if name in required]
+
+def _diattenuation(x, y, dx, dy):
+	""" Diattenuation(x, y) and its derivative"""
+	total = x + y
+	return np.abs(x - y)/total, np.sign(x - y)*2.0*(y*dx - x*dy)/(total*total)
+
+def FresnelAllGradient(nInc, nSub, thetaInc, quantities=None, parameters=PARAMETERS):
+	""" (FresnelCoefficients, FresnelPartials): coefficients and their partial derivatives
+
+	partials.thetaInc.Rs is dRs/dthetaInc, partials.nSubImag.rp is drp/dk, and so on. Only the
+	given quantities (default: all) are returned, with the partials for the given parameters;
+	other fields are None.
+	"""
+	wanted = FresnelCoefficients._fields if quantities is None else tuple(quantities)
+	names = _required(wanted)
+	for parameter in parameters:
+		if parameter not in PARAMETERS:
+			raise ValueError('unknown parameter %r; choose from %s' % (parameter, PARAMETERS))
+	parameters = tuple(parameters)
+	nInc = np.asarray(nInc, dtype=float)
+	nSub = np.asarray(nSub, dtype=complex)
+	thetaInc = np.asarray(thetaInc, dtype=float)
+	m = nSub/nInc
+	mSq = m*m
+	cosThetaInc = np.cos(thetaInc)
+	sinThetaInc = np.sin(thetaInc)
+	sinThetaIncSq = sinThetaInc*sinThetaInc
+	q = _csqrt(mSq - sinThetaIncSq)
+	withTheta = 'thetaInc' in parameters
+	if withTheta:
+		thetaTerm = 2.0*sinThetaInc*(1.0 - mSq)/q			# common factor of the thetaInc derivatives
+	inverseInc = 1.0/nInc
+	values = {}
+	dm = {}			# amplitude derivatives with respect to m
+	dTheta = {}		# and to thetaInc
+	partials = {}
+
+	def complexPartials(dValue, dValueTheta):
+		# partials of an analytic function of m, from its m and thetaInc derivatives
+		chain = dict(nInc=-m*inverseInc, nSubReal=inverseInc, nSubImag=1j*inverseInc)
+		return {p: dValueTheta if p == 'thetaInc' else chain[p]*dValue for p in parameters}
+
+	def realPartials(scale, dValue, dValueTheta=None, imag=False):
+		# partials of scale*Re(f) (or scale*Im(f)) for f analytic in m, with df/dm = dValue;
+		# dValueTheta is a callable, evaluated only when the thetaInc partial is asked for
+		part = (lambda z: z.imag) if imag else (lambda z: z.real)
+		otherPart = (lambda z: z.real) if imag else (lambda z: -z.imag)
+		derivative = dict(
+			nInc=lambda: -scale*inverseInc*part(m*dValue), nSubReal=lambda: scale*inverseInc*part(dValue),
+			nSubImag=lambda: scale*inverseInc*otherPart(dValue), thetaInc=lambda: scale*part(dValueTheta()))
+		return {p: derivative[p]() for p in parameters}
+
+	if 'rs' in names or 'ts' in names:
+		sDenom = 1.0/(cosThetaInc + q)
+		sDenomSq = sDenom*sDenom
+		dm['rs'] = dm['ts'] = -2.0*cosThetaInc*(m/q)*sDenomSq		# ts = 1 + rs
+		if withTheta:
+			dTheta['rs'] = dTheta['ts'] = thetaTerm*sDenomSq
+		if 'rs' in names:
+			values['rs'] = (cosThetaInc - q)*sDenom
+		if 'ts' in names:
+			values['ts'] = 2.0*cosThetaInc*sDenom
+	if 'rp' in names or 'tp' in names:
+		mSqCos = mSq*cosThetaInc
+		pDenom = 1.0/(mSqCos + q)
+		pDenomSq = pDenom*pDenom
+		if 'rp' in names:
+			values['rp'] = (mSqCos - q)*pDenom
+			dm['rp'] = 2.0*m*cosThetaInc*(2.0*q - mSq/q)*pDenomSq
+			if withTheta:
+				dTheta['rp'] = mSq*thetaTerm*pDenomSq
+		if 'tp' in names:
+			values['tp'] = 2.0*m*cosThetaInc*pDenom
+			dm['tp'] = 2.0*cosThetaInc*(q - mSqCos - mSq/q)*pDenomSq
+			if withTheta:
+				dTheta['tp'] = m*thetaTerm*pDenomSq
+	for name in ('rs', 'rp', 'ts', 'tp'):
+		if name in wanted:
+			partials[name] = complexPartials(dm[name], dTheta.get(name))
+
+	# d|r|**2 = 2 Re(conj(r) dr)
+	for name, amplitude in (('Rs', 'rs'), ('Rp', 'rp')):
+		if name in names:
+			conjAmplitude = np.conj(values[amplitude])
+			values[name] = _absSq(values[amplitude])
+			partials[name] = realPartials(2.0, conjAmplitude*dm[amplitude], lambda: conjAmplitude*dTheta[amplitude])
+	if 'Ts' in names or 'Tp' in names:
+		# transmitted irradiance |t|**2 times Re(nSub cosThetaSub)/(nInc cosThetaInc) (s) or
+		# Re(conj(nSub) cosThetaSub)/(nInc cosThetaInc) (p), cosThetaSub = sqrt(1 - sin(thetaInc)**2/m**2);
+		# nSub appears outside m, so these factors take the partials one parameter at a time
+		cosThetaSub = _csqrt(1.0 - sinThetaIncSq/mSq)
+		dCos = complexPartials(sinThetaIncSq/(mSq*m*cosThetaSub), -sinThetaInc*cosThetaInc/(mSq*cosThetaSub) if withTheta else None)
+		incScale = inverseInc/cosThetaInc
+		dIncScale = dict(nInc=-incScale*inverseInc, nSubReal=0.0, nSubImag=0.0, thetaInc=incScale*sinThetaInc/cosThetaInc)
+		dSub = dict(nInc=0.0, nSubReal=1.0, nSubImag=1j, thetaInc=0.0)
+		for name, amplitude, sub, dSubOf in (('Ts', 'ts', nSub, dSub), ('Tp', 'tp', np.conj(nSub), {p: np.conj(d) for p, d in dSub.items()})):
+			if name in names:
+				conjAmplitude = np.conj(values[amplitude])
+				irradiance = _absSq(values[amplitude])
+				dIrradiance = realPartials(2.0, conjAmplitude*dm[amplitude], lambda: conjAmplitude*dTheta[amplitude])
+				factor = (sub*cosThetaSub).real*incScale
+				values[name] = irradiance*factor
+				partials[name] = {p: dIrradiance[p]*factor + irradiance*((dSubOf[p]*cosThetaSub + sub*dCos[p]).real*incScale + (sub*cosThetaSub).real*dIncScale[p])
+					for p in parameters}
+
+	for name, (first, second) in (('DiattenuationR', ('Rs', 'Rp')), ('DiattenuationT', ('Ts', 'Tp'))):
+		if name in names:
+			values[name] = _diattenuation(values[first], values[second], 0.0, 0.0)[0]
+			partials[name] = {p: _diattenuation(values[first], values[second], partials[first][p], partials[second][p])[1] for p in parameters}
+	# d phase(r) = Im(dr/r)
+	for name, (first, second) in (('RetardanceR', ('rs', 'rp')), ('RetardanceT', ('ts', 'tp'))):
+		if name in names:
+			values[name] = np.angle(values[first]) - np.angle(values[second])
+			partials[name] = realPartials(1.0, dm[first]/values[first] - dm[second]/values[second],
+				lambda: dTheta[first]/values[first] - dTheta[second]/values[second], imag=True)
+
+	shape = np.broadcast_shapes(nInc.shape, nSub.shape, thetaInc.shape)
+	expand = lambda x: np.broadcast_to(x, shape) if np.shape(x) != shape else x
+	coef = FresnelCoefficients(*(expand(values[name]) if name in wanted else None for name in FresnelCoefficients._fields))
+	return coef, FresnelPartials(*(
+		FresnelCoefficients(*(expand(partials[name][p]) if name in wanted else None for name in FresnelCoefficients._fields))
+		if p in parameters else None for p in PARAMETERS))
+
+
+
+
+
+# test cases
+testPrecision = 1e-6
+def testFresnelGradient():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testValues, testDielectric, testMetal, testTotalInternalReflection, testSubset, testBroadcast):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all FRESNEL GRADIENT TESTS passed? '+str(combinedTest))
+
+def finiteDifferences(nInc, nSub, thetaInc, h=1e-6):
+	""" central differences of every FresnelAll field in every parameter (FresnelPartials)"""
+	import FresnelArray
+	steps = dict(nInc=(h, 0.0, 0.0), nSubReal=(0.0, h, 0.0), nSubImag=(0.0, 1j*h, 0.0), thetaInc=(0.0, 0.0, h))
+	result = []
+	for parameter in PARAMETERS:
+		dInc, dSub, dTheta = steps[parameter]
+		plus = FresnelArray.FresnelAll(nInc + dInc, nSub + dSub, thetaInc + dTheta)
+		minus = FresnelArray.FresnelAll(nInc - dInc, nSub - dSub, thetaInc - dTheta)
+		differences = [(a - b)/(2.0*h) for a, b in zip(plus, minus)]
+		# retardances: difference of the wrapped phase change
+		for name in ('RetardanceR', 'RetardanceT'):
+			index = FresnelCoefficients._fields.index(name)
+			differences[index] = np.angle(np.exp(1j*(plus[index] - minus[index])))/(2.0*h)
+		result.append(FresnelCoefficients(*differences))
+	return FresnelPartials(*result)
+
+def compareGradient(nInc, nSub, thetaInc, names=FresnelCoefficients._fields, parameters=PARAMETERS):
+	"""helper function comparing analytic partials with central differences"""
+	with np.errstate(all='ignore'):
+		coef, partials = FresnelAllGradient(nInc, nSub, thetaInc)
+		expected = finiteDifferences(nInc, nSub, thetaInc)
+	for parameter in parameters:
+		for name in names:
+			analytic = getattr(getattr(partials, parameter), name)
+			numeric = getattr(getattr(expected, parameter), name)
+			if not np.all(np.abs(analytic - numeric) <= testPrecision*(1.0 + np.abs(numeric))):
+				return False
+	return True
+
+# the values are those of FresnelArray.FresnelAll
+def testValues():
+	import FresnelArray
+	rng = np.random.default_rng(2022)
+	nInc = 1.0 + rng.random(200)
+	nSub = 0.2 + 2.0*rng.random(200) + 1j*rng.random(200)*(rng.random(200) < 0.5)*5.0
+	thetaInc = rng.random(200)*1.5
+	with np.errstate(all='ignore'):
+		coef, partials = FresnelAllGradient(nInc, nSub, thetaInc)
+		expected = FresnelArray.FresnelAll(nInc, nSub, thetaInc)
+	return all(np.allclose(a, b, rtol=1e-12, atol=1e-12, equal_nan=True) for a, b in zip(coef, expected))
+
+def testDielectric():
+	rng = np.random.default_rng(1)
+	nInc = 1.0 + 0.5*rng.random(100)
+	nSub = nInc + 0.1 + 1.5*rng.random(100) + 0j
+	thetaInc = 0.05 + 1.4*rng.random(100)
+	# away from the Brewster angle, where rp = 0 and the reflected retardance jumps
+	keep = np.abs(thetaInc - np.arctan(nSub.real/nInc)) > 0.05
+	return compareGradient(nInc[keep], nSub[keep], thetaInc[keep])
+
+# metals and absorbing dielectrics, including the gold and nickel test cases of FresnelTest.py
+def testMetal():
+	rng = np.random.default_rng(2)
+	nInc = np.concatenate((1.0 + 0.5*rng.random(100), [1.0, 1.0]))
+	nSub = np.concatenate((0.1 + 2.0*rng.random(100) + 1j*(0.01 + 8.0*rng.random(100)), [complex(0.29006, 2.8628), complex(2.007, 3.781)]))
+	thetaInc = np.concatenate((0.05 + 1.4*rng.random(100), [0.87266463, 1.0471976]))
+	return compareGradient(nInc, nSub, thetaInc)
+
+# beyond the critical angle (but not at it): |rs| = |rp| = 1, no transmission, phase varies
+def testTotalInternalReflection():
+	rng = np.random.default_rng(3)
+	nInc = 1.5 + 0.5*rng.random(100)
+	nSub = 1.0 + 0.4*rng.random(100) + 0j
+	thetaCritical = np.arcsin(nSub.real/nInc)
+	thetaInc = thetaCritical + 0.02 + (1.45 - 0.02 - thetaCritical)*rng.random(100)
+	names = ('rs', 'rp', 'ts', 'tp', 'Rs', 'Rp', 'Ts', 'Tp', 'RetardanceR', 'RetardanceT')
+	# nSub sits on the branch cut in k: compare with one-sided (k >= 0) second-order differences
+	import FresnelArray
+	h = 1e-6
+	with np.errstate(all='ignore'):
+		coef, partials = FresnelAllGradient(nInc, nSub, thetaInc)
+		f0, f1, f2 = (FresnelArray.FresnelAll(nInc, nSub + 1j*step, thetaInc) for step in (0.0, h, 2.0*h))
+	oneSided = all(np.allclose(getattr(partials.nSubImag, name), (-3.0*getattr(f0, name) + 4.0*getattr(f1, name) - getattr(f2, name))/(2.0*h), rtol=1e-4, atol=1e-4)
+		for name in names)
+	return(
+		oneSided and \
+		compareGradient(nInc, nSub, thetaInc, names, ('nInc', 'nSubReal', 'thetaInc')) and \
+		np.allclose(partials.thetaInc.Rs, 0.0, atol=1e-12) and np.allclose(partials.nSubReal.Tp, 0.0, atol=1e-12) and \
+		np.all(partials.nSubImag.Rs < 0.0))
+
+# subsets of quantities and parameters
+def testSubset():
+	coef, partials = FresnelAllGradient(1.0, complex(2.007, 3.781), 1.0471976, quantities=('RetardanceR',), parameters=('nSubReal', 'nSubImag'))
+	full, fullPartials = FresnelAllGradient(1.0, complex(2.007, 3.781), 1.0471976)
+	return(
+		coef.Ts is None and coef.Rs is None and partials.nInc is None and partials.thetaInc is None and \
+		coef.RetardanceR == full.RetardanceR and partials.nSubImag.RetardanceR == fullPartials.nSubImag.RetardanceR and \
+		partials.nSubReal.rs is None and partials.nSubReal.RetardanceR == fullPartials.nSubReal.RetardanceR)
+
+def testBroadcast():
+	thetaInc = np.linspace(0.1, 1.4, 7)[:, None]
+	nSub = np.array([1.5, complex(0.29006, 2.8628), complex(2.007, 3.781)])
+	coef, partials = FresnelAllGradient(1.0, nSub, thetaInc)
+	return(
+		coef.Rs.shape == (7, 3) and partials.nInc.Tp.shape == (7, 3) and partials.nSubImag.rs.shape == (7, 3) and \
+		compareGradient(1.0, nSub, thetaInc, ('rs', 'Rs', 'Ts', 'Tp')))
+
+
+if __name__ == '__main__':
+	testFresnelGradient()
@@ -0,0 +1,456 @@
+"""
+FRESNEL SERVER
+
+Local HTTP/JSON service for Fresnel evaluation that coalesces concurrent requests into batches.
+Function summary:
+	Batcher: collects requests for a few milliseconds and evaluates them in one FresnelArray.FresnelAll call
+	FresnelServer: asyncio HTTP/1.1 server (keep-alive) with /evaluate, /stats and /health
+	LoadTest: loopback load generator reporting requests/sec and p50/p99 latency
+	test cases
+
+POST /evaluate takes a JSON object with the input columns of Stream.py
+	{"nInc": 1.0, "nSubReal": 2.007, "nSubImag": 3.781, "thetaInc": [0.0, 0.5, 1.0], "quantities": ["Rs", "rp"]}
+(numbers or equal-length lists, broadcast; quantities default to Rs, Rp, Ts, Tp) and answers with
+one list per output column, complex quantities split as in the CSV output of Stream.py:
+	{"Rs": [...], "rpReal": [...], "rpImag": [...]}
+GET /stats returns request, batch and point counters; GET /health returns {"status": "ok"}.
+
+A batch is evaluated when it holds maxBatch points or maxDelay seconds after its first request,
+in a worker thread, so the event loop keeps accepting requests meanwhile. Under load, many small
+requests share one vectorized evaluation instead of paying the NumPy call overhead each.
+
+Examples:
+python3 FresnelServer.py --port 8000
+python3 FresnelServer.py --load-test --concurrency 64 --requests 20000
+curl -d '{"nSubReal": 1.5, "thetaInc": 0.5}' http://127.0.0.1:8000/evaluate
+
+Test cases can be evaluated with following command:
+python3 FresnelServer.py --test
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+import FresnelArray
+
+
+DEFAULT_QUANTITIES = ('Rs', 'Rp', 'Ts', 'Tp')
+COMPLEX_QUANTITIES = ('rs', 'rp', 'ts', 'tp')
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+	431: 'Request Header Fields Too Large'}
+MAX_BODY = 1 << 24
+
+
+def _evaluate(nInc, nSub, thetaInc):
+	with np.errstate(all='ignore'):
+		return FresnelArray.FresnelAll(nInc, nSub, thetaInc)
+
+
+class Batcher:
+	""" coalesces evaluate() calls of concurrent coroutines into batched FresnelAll calls"""
+
+	def __init__(self, maxBatch=1 << 16, maxDelay=0.002):
+		self.maxBatch = maxBatch
+		self.maxDelay = maxDelay
+		self.requests = 0
+		self.batches = 0
+		self.points = 0
+		self._pending = []
+		self._size = 0
+		self._timer = None
+		self._tasks = set()		# strong references: the event loop keeps only weak ones to running tasks
+
+	async def evaluate(self, nInc, nSub, thetaInc):
+		""" FresnelCoefficients of 1-D input arrays, evaluated together with other pending requests"""
+		loop = asyncio.get_running_loop()
+		future = loop.create_future()
+		self._pending.append((nInc, nSub, thetaInc, future))
+		self._size += nInc.size
+		self.requests += 1
+		if self._size >= self.maxBatch:
+			self._flush()
+		elif self._timer is None:
+			self._timer = loop.call_later(self.maxDelay, self._flush)
+		return await future
+
+	def _flush(self):
+		if self._timer is not None:
+			self._timer.cancel()
+			self._timer = None
+		pending, self._pending, self._size = self._pending, [], 0
+		if pending:
+			task = asyncio.get_running_loop().create_task(self._run(pending))
+			self._tasks.add(task)
+			task.add_done_callback(self._tasks.discard)
+
+	async def _run(self, pending):
+		nInc, nSub, thetaInc = (np.concatenate(column) for column in list(zip(*pending))[:3])
+		self.batches += 1
+		self.points += nInc.size
+		try:
+			coef = await asyncio.get_running_loop().run_in_executor(None, _evaluate, nInc, nSub, thetaInc)
+		except Exception as error:
+			for *_, future in pending:
+				if not future.done():
+					future.set_exception(error)
+			return
+		start = 0
+		for requestInc, _, _, future in pending:
+			stop = start + requestInc.size
+			if not future.done():
+				future.set_result(FresnelArray.FresnelCoefficients(*(values[start:stop] for values in coef)))
+			start = stop
+
+	def stats(self):
+		return dict(requests=self.requests, batches=self.batches, points=self.points,
+			meanBatchRequests=self.requests/self.batches if self.batches else None,
+			meanBatchPoints=self.points/self.batches if self.batches else None)
+
+
+def parseRequest(payload):
+	""" (nInc, nSub, thetaInc, quantities) 1-D arrays and names of an /evaluate request body"""
+	if not isinstance(payload, dict):
+		raise ValueError('request body must be a JSON object')
+	quantities = payload.get('quantities', list(DEFAULT_QUANTITIES))
+	if isinstance(quantities, str):
+		quantities = [quantities]
+	if not isinstance(quantities, list) or not all(isinstance(name, str) for name in quantities):
+		raise ValueError('quantities must be a name or a list of names')
+	unknown = [name for name in quantities if name not in FresnelArray.FresnelCoefficients._fields]
+	if unknown:
+		raise ValueError('unknown quantities %s; choose from %s' % (unknown, FresnelArray.FresnelCoefficients._fields))
+	try:
+		columns = [np.asarray(payload.get(name, default), dtype=float) for name, default in
+			(('nInc', 1.0), ('nSubReal', None), ('nSubImag', 0.0), ('thetaInc', None))]
+	except (TypeError, ValueError):
+		raise ValueError('nInc, nSubReal, nSubImag and thetaInc must be numbers or lists of numbers')
+	if columns[1].shape == () and np.isnan(columns[1]) or columns[3].shape == () and np.isnan(columns[3]):
+		raise ValueError('nSubReal and thetaInc are required')
+	nInc, nSubReal, nSubImag, thetaInc = (np.ravel(x) for x in np.broadcast_arrays(*columns))
+	return nInc, nSubReal + 1j*nSubImag, thetaInc, list(quantities)
+
+def _jsonList(values):
+	""" list of a real array with NaN and infinities as None (null), which JSON cannot represent"""
+	finite = np.isfinite(values)
+	if finite.all():
+		return values.tolist()
+	return np.where(finite, values, None).tolist()
+
+def formatResponse(coef, quantities):
+	""" JSON-ready {column: list} of the requested quantities; non-finite values become null"""
+	response = {}
+	for name in quantities:
+		values = getattr(coef, name)
+		if name in COMPLEX_QUANTITIES:
+			response[name+'Real'] = _jsonList(values.real)
+			response[name+'Imag'] = _jsonList(values.imag)
+		else:
+			response[name] = _jsonList(values)
+	return response
+
+
+def _contentLength(headers):
+	""" body length of the request headers, None unless a non-negative decimal integer"""
+	value = headers.get('content-length', '0')
+	if not (value.isascii() and value.isdigit()):
+		return None
+	return int(value)
+
+
+async def _readHeaders(reader):
+	""" {lower-case name: value} of the request headers, None if a line exceeds the stream limit"""
+	headers = {}
+	while True:
+		try:
+			header = await reader.readline()
+		except ValueError:
+			return None
+		if header in (b'\r\n', b'\n', b''):
+			return headers
+		name, _, value = header.decode('latin-1').partition(':')
+		headers[name.strip().lower()] = value.strip()
+
+async def _respond(writer, status, payload, keepAlive):
+	data = json.dumps(payload, allow_nan=False).encode()
+	writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\nConnection: %s\r\n\r\n'
+		% (status, REASONS[status], len(data), 'keep-alive' if keepAlive else 'close')).encode('latin-1') + data)
+	await writer.drain()
+
+
+class FresnelServer:
+	""" asyncio HTTP/1.1 server; start() binds (port 0 picks a free port, see .port)"""
+
+	def __init__(self, host='127.0.0.1', port=8000, maxBatch=1 << 16, maxDelay=0.002):
+		self.host = host
+		self.port = port
+		self.batcher = Batcher(maxBatch, maxDelay)
+		self._server = None
+
+	async def start(self):
+		self._server = await asyncio.start_server(self._handle, self.host, self.port)
+		self.port = self._server.sockets[0].getsockname()[1]
+		return self
+
+	async def close(self):
+		if self._server is not None:
+			self._server.close()
+			await self._server.wait_closed()
+			self._server = None
+
+	async def serveForever(self):
+		if self._server is None:
+			await self.start()
+		async with self._server:
+			await self._server.serve_forever()
+
+	async def _route(self, method, path, body):
+		""" (status, payload) of one request"""
+		if path == '/evaluate':
+			if method != 'POST':
+				return 405, dict(error='use POST')
+			try:
+				nInc, nSub, thetaInc, quantities = parseRequest(json.loads(body or b'null'))
+			except ValueError as error:		# includes json.JSONDecodeError
+				return 400, dict(error=str(error))
+			coef = await self.batcher.evaluate(nInc, nSub, thetaInc)
+			return 200, formatResponse(coef, quantities)
+		if path == '/stats':
+			return 200, self.batcher.stats()
+		if path == '/health':
+			return 200, dict(status='ok')
+		return 404, dict(error='unknown path %s' % path)
+
+	async def _handle(self, reader, writer):
+		try:
+			while True:
+				try:
+					line = await reader.readline()
+				except ValueError:		# longer than the stream limit
+					await _respond(writer, 400, dict(error='request line too long'), False)
+					break
+				if not line.strip():
+					break
+				requestLine = line.decode('latin-1').split()
+				headers = await _readHeaders(reader)
+				length = None if headers is None else _contentLength(headers)
+				keepAlive = False
+				if headers is None:
+					status, payload = 431, dict(error='header line too long')
+				elif len(requestLine) != 3:
+					status, payload = 400, dict(error='malformed request line %r' % line.decode('latin-1').strip())
+				elif length is None:
+					status, payload = 400, dict(error='invalid Content-Length %r' % headers['content-length'])
+				elif length > MAX_BODY:
+					status, payload = 413, dict(error='request body larger than %d bytes' % MAX_BODY)
+				else:
+					method, target, version = requestLine
+					body = await reader.readexactly(length)
+					status, payload = await self._route(method, target.split('?')[0], body)
+					keepAlive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+				await _respond(writer, status, payload, keepAlive)
+				if not keepAlive:
+					break
+		except (ConnectionError, asyncio.IncompleteReadError):
+			pass
+		except asyncio.CancelledError:		# server shutting down with the connection idle
+			pass
+		finally:
+			writer.close()
+
+
+# client side: keep-alive requests over one connection
+async def request(reader, writer, method, path, payload=None):
+	""" (status, decoded JSON) of one request on an open connection"""
+	body = b'' if payload is None else json.dumps(payload).encode()
+	writer.write(('%s %s HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n'
+		% (method, path, len(body))).encode('latin-1') + body)
+	await writer.drain()
+	return await readResponse(reader)
+
+async def readResponse(reader):
+	""" (status, decoded JSON) of the next response on an open connection"""
+	status = int((await reader.readline()).split()[1])
+	length = 0
+	while True:
+		header = await reader.readline()
+		if header in (b'\r\n', b'\n', b''):
+			break
+		name, _, value = header.decode('latin-1').partition(':')
+		if name.strip().lower() == 'content-length':
+			length = int(value)
+	return status, json.loads(await reader.readexactly(length))
+
+
+async def LoadTest(host, port, concurrency=32, requests=2000, points=1, seed=2022):
+	""" {requests, seconds, requestsPerSecond, p50, p99 [s], errors} of concurrent keep-alive clients
+
+	Each of the concurrency clients sends its share of requests back to back; every request asks
+	for Rs, Rp, Ts, Tp at points random (nInc, nSub, thetaInc) triples.
+	"""
+	rng = np.random.default_rng(seed)
+	bodies = [dict(nInc=(1.0 + rng.random(points)).tolist(), nSubReal=(2.0*rng.random(points)).tolist(),
+		nSubImag=(5.0*rng.random(points)).tolist(), thetaInc=(1.5*rng.random(points)).tolist()) for _ in range(64)]
+	latencies = []
+	errors = 0
+
+	async def client(count):
+		nonlocal errors
+		reader, writer = await asyncio.open_connection(host, port)
+		try:
+			for i in range(count):
+				tic = time.perf_counter()
+				status, _ = await request(reader, writer, 'POST', '/evaluate', bodies[i % len(bodies)])
+				latencies.append(time.perf_counter() - tic)
+				errors += status != 200
+		finally:
+			writer.close()
+
+	shares = [requests//concurrency + (i < requests % concurrency) for i in range(concurrency)]
+	tic = time.perf_counter()
+	await asyncio.gather(*(client(count) for count in shares if count))
+	elapsed = time.perf_counter() - tic
+	return dict(requests=len(latencies), points=points, concurrency=concurrency, seconds=elapsed,
+		requestsPerSecond=len(latencies)/elapsed, p50=float(np.percentile(latencies, 50)), p99=float(np.percentile(latencies, 99)), errors=errors)
+
+async def LoopbackLoadTest(concurrency=32, requests=2000, points=1, maxBatch=1 << 16, maxDelay=0.002):
+	""" LoadTest against a server started in this process on a free loopback port, with its batch statistics"""
+	server = await FresnelServer('127.0.0.1', 0, maxBatch, maxDelay).start()
+	try:
+		report = await LoadTest('127.0.0.1', server.port, concurrency, requests, points)
+	finally:
+		await server.close()
+	report['server'] = server.batcher.stats()
+	return report
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Serve Fresnel evaluations over HTTP/JSON, or load test the service.')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8000)
+	parser.add_argument('--max-batch', type=int, default=1 << 16, help='points per batch before evaluating at once')
+	parser.add_argument('--max-delay', type=float, default=0.002, help='seconds a batch waits for more requests')
+	parser.add_argument('--load-test', action='store_true', help='run the loopback load test (against --url if given) and print a JSON report')
+	parser.add_argument('--url', help='host:port of a running server for --load-test')
+	parser.add_argument('--concurrency', type=int, default=32)
+	parser.add_argument('--requests', type=int, default=5000)
+	parser.add_argument('--points', type=int, default=1, help='triples per load test request')
+	parser.add_argument('--test', action='store_true', help='run the test cases and exit')
+	args = parser.parse_args(argv)
+	if args.test:
+		testFresnelServer()
+	elif args.load_test:
+		if args.url:
+			host, _, port = args.url.rpartition(':')
+			report = asyncio.run(LoadTest(host or '127.0.0.1', int(port), args.concurrency, args.requests, args.points))
+		else:
+			report = asyncio.run(LoopbackLoadTest(args.concurrency, args.requests, args.points, args.max_batch, args.max_delay))
+		print(json.dumps(report, indent=1))
+	else:
+		server = FresnelServer(args.host, args.port, args.max_batch, args.max_delay)
+		print('serving on http://%s:%d' % (args.host, args.port))
+		try:
+			asyncio.run(server.serveForever())
+		except KeyboardInterrupt:
+			pass
+
+
+
+
+
+# test cases
+def testFresnelServer():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testEvaluate, testNonFinite, testCoalescing, testErrors, testLoadTest):
+		if not asyncio.run(test()):
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all FRESNEL SERVER TESTS passed? '+str(combinedTest))
+
+async def testEvaluate():
+	server = await FresnelServer('127.0.0.1', 0).start()
+	try:
+		reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+		status, result = await request(reader, writer, 'POST', '/evaluate',
+			dict(nSubReal=2.007, nSubImag=3.781, thetaInc=[0.0, 1.0471976], quantities=['Rs', 'rp']))
+		health = await request(reader, writer, 'GET', '/health')		# same connection (keep-alive)
+		writer.close()
+	finally:
+		await server.close()
+	expected = FresnelArray.FresnelAll(1.0, complex(2.007, 3.781), np.array([0.0, 1.0471976]))
+	return(
+		status == 200 and sorted(result) == ['Rs', 'rpImag', 'rpReal'] and health == (200, dict(status='ok')) and \
+		np.allclose(result['Rs'], expected.Rs, rtol=1e-15, atol=0.0) and \
+		np.allclose(np.array(result['rpReal']) + 1j*np.array(result['rpImag']), expected.rp, rtol=1e-15, atol=0.0))
+
+# total internal reflection: DiattenuationT is 0/0, answered as null in valid JSON
+async def testNonFinite():
+	server = await FresnelServer('127.0.0.1', 0).start()
+	try:
+		reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+		status, result = await request(reader, writer, 'POST', '/evaluate',
+			dict(nInc=1.5, nSubReal=1.0, thetaInc=[0.1, 1.2], quantities=['Rs', 'DiattenuationT']))
+		writer.close()
+	finally:
+		await server.close()
+	return(
+		status == 200 and result['DiattenuationT'][1] is None and result['DiattenuationT'][0] is not None and \
+		json.dumps(formatResponse(_evaluate([1.5], [1.0], [1.2]), ['DiattenuationT']), allow_nan=False) == '{"DiattenuationT": [null]}')
+
+# concurrent requests share batches and each gets its own results back
+async def testCoalescing():
+	server = await FresnelServer('127.0.0.1', 0, maxDelay=0.02).start()
+	async def one(i):
+		reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+		status, result = await request(reader, writer, 'POST', '/evaluate', dict(nSubReal=1.0 + 0.01*i, thetaInc=[0.1, 0.2, 0.3], quantities=['Tp']))
+		writer.close()
+		return status == 200 and np.allclose(result['Tp'], FresnelArray.Tp(1.0, 1.0 + 0.01*i, np.array([0.1, 0.2, 0.3])), rtol=1e-15, atol=0.0)
+	try:
+		ok = all(await asyncio.gather(*(one(i) for i in range(50))))
+	finally:
+		await server.close()
+	stats = server.batcher.stats()
+	return ok and stats['requests'] == 50 and stats['points'] == 150 and stats['batches'] < 10
+
+async def testErrors():
+	server = await FresnelServer('127.0.0.1', 0).start()
+	try:
+		reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+		missing = await request(reader, writer, 'POST', '/evaluate', dict(nSubReal=1.5))
+		unknown = await request(reader, writer, 'POST', '/evaluate', dict(nSubReal=1.5, thetaInc=0.1, quantities=['Xs']))
+		notList = await request(reader, writer, 'POST', '/evaluate', dict(nSubReal=1.5, thetaInc=0.1, quantities=5))
+		mismatch = await request(reader, writer, 'POST', '/evaluate', dict(nSubReal=[1.5, 1.6], thetaInc=[0.1, 0.2, 0.3]))
+		notFound = await request(reader, writer, 'GET', '/nowhere')
+		method = await request(reader, writer, 'GET', '/evaluate')
+		writer.close()
+		malformed = []
+		for raw in (b'GARBAGE\r\n\r\n', b'POST /evaluate HTTP/1.1\r\nContent-Length: ten\r\n\r\n',
+				b'GET /' + b'x'*(1 << 17) + b' HTTP/1.1\r\n\r\n', b'GET /health HTTP/1.1\r\nX-Long: ' + b'x'*(1 << 17) + b'\r\n\r\n'):
+			reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+			writer.write(raw)
+			malformed.append(await readResponse(reader))
+			try:
+				malformed.append(await reader.read())		# b'': closed after the response
+			except ConnectionResetError:		# closed with the rest of an oversized request unread
+				malformed.append(b'')
+			writer.close()
+	finally:
+		await server.close()
+	return(
+		[r[0] for r in (missing, unknown, notList, mismatch, notFound, method)] == [400, 400, 400, 400, 404, 405] and \
+		[r[0] if isinstance(r, tuple) else r for r in malformed] == [400, b'', 400, b'', 400, b'', 431, b''] and \
+		all('error' in r[1] for r in malformed[::2]))
+
+async def testLoadTest():
+	report = await LoopbackLoadTest(concurrency=16, requests=400, points=4)
+	return(
+		report['requests'] == 400 and report['errors'] == 0 and report['requestsPerSecond'] > 0.0 and \
+		0.0 < report['p50'] <= report['p99'] and report['server']['batches'] < report['server']['requests'])
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,143 @@
+"""
+FRESNEL TESTS
+
+Test cases for the Fresnel equations of Fresnel.py, kept apart so that importing the core
+functions does not define them.
+Function summary:
+	test cases against known results and published literature
+
+Test cases can be evaluated with either of the following commands:
+python3 FresnelTest.py
+python3 Fresnel.py
+"""
+
+from math import pi, atan
+from cmath import asin
+
+from Fresnel import rs, rp, ts, tp, Rs, Rp, Ts, Tp, Diattenuation, Retardance
+
+
+# test cases
+testPrecision = 0.001	# some references have limited precision
+def CompareComplex(var1, var2):
+	"""helper function to compare two complex numbers"""
+	return(abs(var1.real-var2.real) < testPrecision and \
+		abs(var1.imag-var2.imag) < testPrecision
+	)
+
+def testFresnel():
+	""" compute all test results and display to screen """
+	if not testIdealGlassNormal():
+		print('testIdealGlassNormal: failed')
+	if not testBrewster():
+		print('testBrewster: failed')
+	if not testCritical():
+		print('testCritical: failed')
+	if not testFresnelRhomb():
+		print('testFresnelRhomb: failed')
+	if not testFresnelMetal1():
+		print('testFresnelMetal1: failed')
+	if not testFresnelMetal2():
+		print('testFresnelMetal2: failed')
+	combinedTest = \
+		testIdealGlassNormal() and \
+		testBrewster() and \
+		testCritical() and \
+		testFresnelRhomb() and \
+		testFresnelMetal1() and \
+		testFresnelMetal2()
+	print('all FRESNEL TESTS passed? '+str(combinedTest))
+        
+# ideal glass n = 1.5 at normal incidence
+# expected values for amplitude and irradiance known from theory
+# see "Principles of Optics", Born and Wolf, 6th ed. sec. 1.5.2., eqn. 22-23, p.41
+def testIdealGlassNormal():
+	return(
+		CompareComplex(ts(1,1.5,0), 0.8) and \
+		CompareComplex(tp(1,1.5,0), 0.8) and \
+		CompareComplex(rs(1,1.5,0), -0.2) and \
+		CompareComplex(rp(1,1.5,0), 0.2) and \
+		abs(Rs(1,1.5,0) - 0.04)<testPrecision and \
+		abs(Rp(1,1.5,0) - 0.04)<testPrecision and \
+		abs(Ts(1,1.5,0) - 0.96)<testPrecision and \
+		abs(Tp(1,1.5,0) - 0.96)<testPrecision and \
+		abs(Diattenuation(Rs(1,1.5,0), Rp(1,1.5,0)))<testPrecision and \
+		abs(Diattenuation(Ts(1,1.5,0), Tp(1,1.5,0)))<testPrecision and \
+		abs(Retardance(ts(1,1.5,0), tp(1,1.5,0)))<testPrecision and \
+		abs(Retardance(rs(1,1.5,0), rp(1,1.5,0))-pi)<testPrecision)
+
+# Brewster angle with semi-arbitrary (real-valued) refractive indices (high-to-low)
+# p-polarized reflection should be zero and transmitted irradiance 100%
+def testBrewster():
+	n1 = 1.72
+	n2 = 1.15
+	thetaB = atan(n2.real/n1)
+	return(
+		CompareComplex(rp(n1,n2,thetaB), 0) and \
+		abs(Rp(n1,n2,thetaB))<testPrecision and \
+		abs(Tp(n1,n2,thetaB) - 1)<testPrecision and \
+		abs(Diattenuation(Rs(n1,n2,thetaB), Rp(n1,n2,thetaB))-1)<testPrecision)
+
+# Critical angle with semi-arbitrary (real-valued) refractive indices (high-to-low)
+# both polarization irradiance should be 100% reflected and 0% transmitted
+def testCritical():
+	n1 = 1.72
+	n2 = 1.15
+	thetaC = asin(n2.real/n1)
+	return(
+		abs(Rs(n1,n2,thetaC) - 1)<testPrecision and \
+		abs(Rp(n1,n2,thetaC) - 1)<testPrecision and \
+		abs(Ts(n1,n2,thetaC))<testPrecision and \
+		abs(Tp(n1,n2,thetaC))<testPrecision and \
+		abs(Diattenuation(Rs(n1,n2,thetaC), Rp(n1,n2,thetaC)))<testPrecision)
+
+
+# angles where Fresnel rhomb gives 1/8-wave retardance
+# from text book: Born and Wolf, "Principles of Optics", 6th ed. section 1.5, below equation 63, p.50.
+def testFresnelRhomb():
+	n1 = 1.51
+	n2 = 1.0
+	theta1 = 0.84852090	# 48 degrees, 37 arc-min
+	theta2 = 0.95324066	# 54 degrees, 37 arc-min
+	return(
+		abs(Retardance(rs(n1,n2,theta1), rp(n1,n2,theta1)) - pi/4)<testPrecision and \
+		abs(Rs(n1,n2,theta1) + Ts(n1,n2,theta1) - 1.0)<testPrecision and \
+		abs(Rp(n1,n2,theta1) + Tp(n1,n2,theta1) - 1.0)<testPrecision and \
+		abs(Retardance(rs(n1,n2,theta2), rp(n1,n2,theta2)) - pi/4)<testPrecision and \
+		abs(Rs(n1,n2,theta2) + Ts(n1,n2,theta2) - 1.0)<testPrecision and \
+		abs(Rp(n1,n2,theta2) + Tp(n1,n2,theta2) - 1.0)<testPrecision)
+				
+
+# metal reflection: gold at 582 nm using data interpolated from https://RefractiveIndex.info
+# theory results from P. B. Johnson and R. W. Christy. "Optical constants of the noble metals", Phys. Rev. B 6, 4370-4379 (1972). https://doi.org/10.1103/PhysRevB.6.4370
+def testFresnelMetal1():
+	n1 = 1.0
+	n2 = complex(0.29006,2.8628)
+	thetaInc = 0.87266463	# 50 degrees
+	return(
+		abs(Rs(n1,n2,thetaInc) - 0.92516)<testPrecision and \
+		abs(Rp(n1,n2,thetaInc) - 0.83233)<testPrecision and \
+		abs(Rs(n1,n2,thetaInc) + Ts(n1,n2,thetaInc) - 1.0)<testPrecision and \
+		abs(Rp(n1,n2,thetaInc) + Tp(n1,n2,thetaInc) - 1.0)<testPrecision)
+
+# metal reflection: nickel at 632.8 nm
+# theory results from M. Chiu, J. Lee, and D. Su. "Complex refractive-index measurement based on Fresnel's equations and the uses of heterodyne interferometry," Appl.Opt. 38, 4047-4052 (1999). https://doi.org/10.1364/AO.38.004047
+def testFresnelMetal2():
+	n1 = 1.0
+	n2 = complex(2.007, 3.781)
+	thetaInc = 1.0471976	# 60 degrees
+	return(
+		CompareComplex(rs(n1,n2,thetaInc), complex(-0.882373, -0.183978)) and \
+		CompareComplex(rp(n1,n2,thetaInc), complex(0.462133, 0.492465)) and \
+		abs(Retardance(rp(n1,n2,thetaInc), rs(n1,n2,thetaInc)) - 3.7532)<testPrecision and \
+		abs(Rs(n1,n2,thetaInc) + Ts(n1,n2,thetaInc) - 1.0)<testPrecision and \
+		abs(Rp(n1,n2,thetaInc) + Tp(n1,n2,thetaInc) - 1.0)<testPrecision)
+
+
+
+
+
+
+# evaluate test cases
+if __name__ == '__main__':
+	testFresnel()
@@ -0,0 +1,392 @@
+"""
+INSTRUMENTATION
+
+Opt-in profiling of the Fresnel evaluation hot paths.
+Function summary:
+	enable/disable: wrap (and restore) module functions such as Fresnel.rs or FresnelArray.FresnelAll
+	stage: context manager timing a named stage of a caller (e.g. the compute and draw stages of FresnelCalc.py)
+	call counts, cumulative and percentile timings and batch sizes per function and per stage
+	export as JSON, as folded stacks (flamegraph.pl, speedscope) and as a Chrome trace (chrome://tracing, Perfetto)
+	test cases
+
+Disabled (the default), the instrumented modules hold their original functions, so evaluation
+costs nothing extra; stage() returns a shared do-nothing context. Enabled, every call of a target
+goes through a wrapper (about a microsecond) that records its wall time, its self time (without
+the instrumented calls it makes) under its call stack, and its batch size: the number of points
+of its broadcast array arguments (1 for Python scalars). Targets are module attributes, so calls
+made through the module (Fresnel.Rs calling rs, Cache.py calling FresnelArray.FresnelAll) are
+seen, while names bound earlier with "from Fresnel import rs" and calls inside worker processes
+(Sweep.py process backend) are not. Targets may be library functions imported into a module,
+e.g. Fresnel.sqrt is the cmath square root that rs, rp, ts and tp call.
+
+Percentiles come from a reservoir of at most RESERVOIR samples per name.
+
+Examples:
+import Instrumentation
+Instrumentation.enable(trace=True)
+... run a sweep ...
+Instrumentation.disable()
+print(Instrumentation.summary())
+Instrumentation.export('profile')	# profile.json, profile.folded, profile.trace.json
+
+FRESNEL_PROFILE=profile python3 FresnelCalc.py	# same files when the window closes
+
+Test cases can be evaluated with following command:
+python3 Instrumentation.py
+"""
+
+import functools
+import importlib
+import json
+import os
+import random
+import threading
+import time
+
+
+_FUNCTIONS = ('SnellAngle', 'rs', 'rp', 'ts', 'tp', 'Rs', 'Rp', 'Ts', 'Tp', 'Diattenuation', 'Retardance')
+DEFAULT_TARGETS = \
+	tuple('Fresnel.'+name for name in _FUNCTIONS + ('sqrt', 'asin')) + \
+	tuple('FresnelArray.'+name for name in _FUNCTIONS + ('FresnelAll', '_csqrt'))
+RESERVOIR = 4096
+PERCENTILES = (50, 90, 99)
+
+
+class Record:
+	""" timings of one function or stage"""
+	def __init__(self, kind):
+		self.kind = kind
+		self.count = 0
+		self.total = 0.0
+		self.self = 0.0
+		self.minimum = float('inf')
+		self.maximum = 0.0
+		self.points = 0
+		self.maxBatch = 0
+		self.samples = []	# reservoir of (time, batch size)
+
+	def add(self, elapsed, selfTime, batch, rng):
+		self.count += 1
+		self.total += elapsed
+		self.self += selfTime
+		self.minimum = min(self.minimum, elapsed)
+		self.maximum = max(self.maximum, elapsed)
+		self.points += batch
+		self.maxBatch = max(self.maxBatch, batch)
+		if len(self.samples) < RESERVOIR:
+			self.samples.append((elapsed, batch))
+		else:
+			index = rng.randrange(self.count)
+			if index < RESERVOIR:
+				self.samples[index] = (elapsed, batch)
+
+	def asDict(self):
+		times = sorted(sample[0] for sample in self.samples)
+		batches = sorted(sample[1] for sample in self.samples)
+		return dict(
+			kind=self.kind, count=self.count, total=self.total, self=self.self,
+			mean=self.total/self.count, min=self.minimum, max=self.maximum,
+			**{'p%d' % p: _percentile(times, p) for p in PERCENTILES},
+			batch=dict(points=self.points, mean=self.points/self.count, max=self.maxBatch,
+				**{'p%d' % p: _percentile(batches, p) for p in PERCENTILES}))
+
+def _percentile(ordered, p):
+	""" nearest-rank percentile of a sorted list"""
+	return ordered[max(0, -(-p*len(ordered)//100) - 1)]
+
+
+# state: original functions of the patched targets, records and stacks
+_lock = threading.Lock()
+_local = threading.local()
+_patched = {}	# 'Module.name' -> original
+_records = {}
+_folded = {}	# 'a;b;c' -> self time [s]
+_events = []
+_state = dict(enabled=False, trace=False, maxEvents=0, dropped=0, origin=0.0, rng=random.Random(0))
+
+
+def _frames():
+	try:
+		return _local.frames
+	except AttributeError:
+		_local.frames = []
+		return _local.frames
+
+def _begin(name):
+	_frames().append([name, time.perf_counter(), 0.0])
+
+def _end(kind, batch):
+	toc = time.perf_counter()
+	frames = _local.frames
+	name, tic, children = frames[-1]
+	elapsed = toc - tic
+	stack = ';'.join(frame[0] for frame in frames)
+	frames.pop()
+	if frames:
+		frames[-1][2] += elapsed
+	with _lock:
+		record = _records.get(name)
+		if record is None:
+			record = _records[name] = Record(kind)
+		record.add(elapsed, elapsed - children, batch, _state['rng'])
+		_folded[stack] = _folded.get(stack, 0.0) + elapsed - children
+		if _state['trace']:
+			if len(_events) < _state['maxEvents']:
+				_events.append(dict(name=name, cat=kind, ph='X', ts=1e6*(tic - _state['origin']), dur=1e6*elapsed,
+					pid=os.getpid(), tid=threading.get_ident(), args=dict(batch=batch)))
+			else:
+				_state['dropped'] += 1
+
+def _batchSize(args):
+	""" number of points of the broadcast argument shapes (1 for Python scalars)"""
+	shapes = [arg.shape for arg in args if hasattr(arg, 'shape')]
+	size = 1
+	for axis in range(1, max(map(len, shapes), default=0) + 1):
+		size *= max(shape[-axis] for shape in shapes if len(shape) >= axis)
+	return size
+
+def _wrap(name, func):
+	@functools.wraps(func)
+	def wrapper(*args, **kwargs):
+		_begin(name)
+		try:
+			return func(*args, **kwargs)
+		finally:
+			_end('function', _batchSize(args))
+	return wrapper
+
+
+def enable(targets=DEFAULT_TARGETS, trace=False, maxEvents=10**6):
+	""" wrap the target functions ('Module.name') and start recording; trace keeps up to maxEvents trace events"""
+	with _lock:
+		if not _state['enabled']:
+			_state.update(enabled=True, origin=time.perf_counter())
+		_state.update(trace=trace, maxEvents=maxEvents)
+	for target in targets:
+		if target in _patched:
+			continue
+		moduleName, name = target.rsplit('.', 1)
+		module = importlib.import_module(moduleName)
+		_patched[target] = getattr(module, name)
+		setattr(module, name, _wrap(target, _patched[target]))
+
+def disable():
+	""" restore the original functions and stop recording; the records are kept until reset()"""
+	for target, original in _patched.items():
+		moduleName, name = target.rsplit('.', 1)
+		setattr(importlib.import_module(moduleName), name, original)
+	_patched.clear()
+	_state['enabled'] = False
+
+def enabled():
+	return _state['enabled']
+
+def reset():
+	""" discard the records, stacks and trace events"""
+	with _lock:
+		_records.clear()
+		_folded.clear()
+		_events.clear()
+		_state.update(dropped=0, origin=time.perf_counter())
+
+
+class _Stage:
+	__slots__ = ('name', 'batch')
+	def __init__(self, name, batch):
+		self.name = name
+		self.batch = batch
+	def __enter__(self):
+		_begin(self.name)
+		return self
+	def __exit__(self, *exc):
+		_end('stage', self.batch)
+
+class _NullStage:
+	""" stand-in while disabled, shared by every thread; accepts and ignores a batch size, so it holds no state"""
+	__slots__ = ()
+	@property
+	def batch(self):
+		return 1
+	@batch.setter
+	def batch(self, value):
+		pass
+	def __enter__(self):
+		return self
+	def __exit__(self, *exc):
+		pass
+
+_NULL_STAGE = _NullStage()
+
+def stage(name, batch=1):
+	""" context manager timing the enclosed block as stage name; the batch size may also be set on the returned object"""
+	if not _state['enabled']:
+		return _NULL_STAGE
+	return _Stage(name, batch)
+
+
+# reports and exports
+def report():
+	""" records of every function and stage seen since the last reset (dict, JSON-serializable)"""
+	with _lock:
+		records = {name: record.asDict() for name, record in _records.items()}
+		dropped = _state['dropped']
+	return dict(records=records, droppedEvents=dropped)
+
+def summary():
+	""" text table of the records, by decreasing total time"""
+	rows = sorted(report()['records'].items(), key=lambda item: -item[1]['total'])
+	lines = ['%-26s %-8s %10s %12s %12s %11s %11s %11s %10s' % ('name', 'kind', 'count', 'total [s]', 'self [s]', 'p50 [us]', 'p99 [us]', 'max [us]', 'batch')]
+	for name, r in rows:
+		lines.append('%-26s %-8s %10d %12.6f %12.6f %11.2f %11.2f %11.2f %10.1f' % (
+			name, r['kind'], r['count'], r['total'], r['self'], 1e6*r['p50'], 1e6*r['p99'], 1e6*r['max'], r['batch']['mean']))
+	return '\n'.join(lines)
+
+def folded():
+	""" flame graph lines 'outer;inner self-microseconds'"""
+	with _lock:
+		return ['%s %d' % (stack, round(1e6*seconds)) for stack, seconds in sorted(_folded.items())]
+
+def chromeTrace():
+	""" Chrome trace event document (requires enable(trace=True))"""
+	with _lock:
+		return dict(traceEvents=list(_events), displayTimeUnit='ms')
+
+def writeJson(path):
+	with open(path, 'w') as f:
+		json.dump(report(), f, indent=1)
+
+def writeFolded(path):
+	with open(path, 'w') as f:
+		f.writelines(line+'\n' for line in folded())
+
+def writeChromeTrace(path):
+	with open(path, 'w') as f:
+		json.dump(chromeTrace(), f)
+
+def export(prefix):
+	""" write prefix.json, prefix.folded and prefix.trace.json"""
+	writeJson(prefix+'.json')
+	writeFolded(prefix+'.folded')
+	writeChromeTrace(prefix+'.trace.json')
+
+
+
+
+
+# test cases
+def testInstrumentation():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testRestore, testCounts, testBatchSizes, testStages, testExport, testThreads):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+		disable()
+		reset()
+	print('all INSTRUMENTATION TESTS passed? '+str(combinedTest))
+
+# disabled means the original functions and a do-nothing stage
+def testRestore():
+	import Fresnel, FresnelArray
+	originals = (Fresnel.rs, Fresnel.sqrt, FresnelArray.FresnelAll)
+	enable()
+	wrapped = (Fresnel.rs, Fresnel.sqrt, FresnelArray.FresnelAll)
+	disable()
+	return(
+		all(a is not b for a, b in zip(originals, wrapped)) and \
+		(Fresnel.rs, Fresnel.sqrt, FresnelArray.FresnelAll) == originals and \
+		stage('compute') is _NULL_STAGE and not enabled() and _nullStageBatch(1000) == 1)
+
+def _nullStageBatch(batch):
+	"""helper function reading back the batch size of the disabled stage after setting it"""
+	span = stage('compute')
+	span.batch = batch
+	return stage('compute').batch
+
+# nested calls are counted once each and appear on the stacks of their callers
+def testCounts():
+	import Fresnel
+	expected = [Fresnel.Ts(1.0, complex(1.5, 0.1), 0.01*i) for i in range(100)]
+	enable(('Fresnel.Ts', 'Fresnel.ts', 'Fresnel.SnellAngle', 'Fresnel.sqrt'))
+	values = [Fresnel.Ts(1.0, complex(1.5, 0.1), 0.01*i) for i in range(100)]
+	records = report()['records']
+	stacks = dict(line.rsplit(' ', 1) for line in folded())
+	return(
+		values == expected and \
+		all(records[name]['count'] == 100 for name in ('Fresnel.Ts', 'Fresnel.ts', 'Fresnel.SnellAngle', 'Fresnel.sqrt')) and \
+		records['Fresnel.Ts']['total'] >= records['Fresnel.ts']['total'] + records['Fresnel.SnellAngle']['total'] and \
+		set(stacks) == {'Fresnel.Ts', 'Fresnel.Ts;Fresnel.SnellAngle', 'Fresnel.Ts;Fresnel.ts', 'Fresnel.Ts;Fresnel.ts;Fresnel.sqrt'} and \
+		records['Fresnel.Ts']['batch']['max'] == 1)
+
+# batch size of array calls is the number of broadcast points
+def testBatchSizes():
+	import numpy as np
+	import FresnelArray
+	enable()
+	FresnelArray.FresnelAll(1.0, 1.5, np.linspace(0.0, 1.5, 1000))
+	FresnelArray.Rs(np.ones((20, 1)), 1.5, np.linspace(0.0, 1.5, 30))
+	records = report()['records']
+	return(
+		records['FresnelArray.FresnelAll']['batch']['max'] == 1000 and \
+		records['FresnelArray.Rs']['batch']['max'] == 600 and \
+		records['FresnelArray.FresnelAll']['count'] == 1)
+
+# stages nest around function calls; the trace spans nest accordingly
+def testStages():
+	import numpy as np
+	import FresnelArray
+	enable(('FresnelArray.FresnelAll',), trace=True)
+	with stage('compute') as span:
+		coef = FresnelArray.FresnelAll(1.0, 1.5, np.linspace(0.0, 1.5, 500))
+		span.batch = coef.Rs.size
+	with stage('draw'):
+		pass
+	records = report()['records']
+	events = {event['name']: event for event in chromeTrace()['traceEvents']}
+	outer, inner = events['compute'], events['FresnelArray.FresnelAll']
+	return(
+		records['compute']['kind'] == 'stage' and records['compute']['batch']['max'] == 500 and \
+		records['draw']['count'] == 1 and \
+		outer['ts'] <= inner['ts'] and inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur'] + 1e-3 and \
+		'compute;FresnelArray.FresnelAll' in dict(line.rsplit(' ', 1) for line in folded()))
+
+def testExport():
+	import tempfile
+	import Fresnel
+	enable(('Fresnel.Rs', 'Fresnel.rs'), trace=True, maxEvents=10)
+	for i in range(10):
+		Fresnel.Rs(1.0, 1.5, 0.1*i)
+	with tempfile.TemporaryDirectory() as directory:
+		prefix = os.path.join(directory, 'profile')
+		export(prefix)
+		with open(prefix+'.json') as f:
+			saved = json.load(f)
+		with open(prefix+'.trace.json') as f:
+			trace = json.load(f)
+		with open(prefix+'.folded') as f:
+			lines = f.read().splitlines()
+	return(
+		saved['records']['Fresnel.rs']['count'] == 10 and saved['droppedEvents'] == 10 and \
+		len(trace['traceEvents']) == 10 and \
+		[line.split(' ')[0] for line in lines] == ['Fresnel.Rs', 'Fresnel.Rs;Fresnel.rs'] and \
+		all(int(line.split(' ')[1]) >= 0 for line in lines))
+
+# each thread keeps its own stack; counts add up
+def testThreads():
+	import Fresnel
+	enable(('Fresnel.Rp', 'Fresnel.rp'))
+	def work():
+		for i in range(500):
+			Fresnel.Rp(1.0, 1.5, 0.001*i)
+	threads = [threading.Thread(target=work) for _ in range(4)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	records = report()['records']
+	stacks = dict(line.rsplit(' ', 1) for line in folded())
+	return records['Fresnel.Rp']['count'] == 2000 and records['Fresnel.rp']['count'] == 2000 and set(stacks) == {'Fresnel.Rp', 'Fresnel.Rp;Fresnel.rp'}
+
+
+if __name__ == '__main__':
+	testInstrumentation()
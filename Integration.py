@@ -0,0 +1,296 @@
+"""
+INTEGRATION
+
+Angle- and spectrum-integrated reflectance and transmittance by Gauss-Legendre quadrature.
+Function summary:
+	GaussLegendre: nodes and weights on [0, 1], computed once per order and reused
+	HemisphericalAverage: cosine-weighted average over incidence angles, with error estimate
+	Spectrum: source spectrum with precomputed quadrature nodes and weights in wavelength
+	SpectralAverage: spectrum-weighted average at a fixed angle or hemispherical
+	test cases against dense trapezoid sums
+
+Hemispherical averages are
+	<Q> = int_0^thetaMax Q(theta) 2 sin(theta) cos(theta) dtheta / sin(thetaMax)**2
+i.e. the fraction of a Lambertian (diffuse) irradiance reflected or transmitted. The angle range
+is split into panels at the Brewster and critical angles (see AdaptiveSampling.CharacteristicAngles);
+each panel uses the smoothstep map theta = a + (b - a)(3 s**2 - 2 s**3), which removes the square
+root behavior of the curves at the critical angle, so a few nodes per panel converge.
+
+Error estimates are the difference between the rule of the requested order and the rule of half
+that order (a conservative bound for the higher order result); the reported evaluation count
+includes both rules. Quantities are the real fields of FresnelArray.FresnelCoefficients plus
+the unpolarized averages R = (Rs + Rp)/2 and T = (Ts + Tp)/2.
+
+Indices are numbers, callables of wavelength [um] or Materials.Material instances.
+
+Test cases can be evaluated with following command:
+python3 Integration.py
+"""
+
+from collections import namedtuple
+from math import pi
+
+import numpy as np
+
+import FresnelArray
+from Cache import LRUCache
+
+
+Integral = namedtuple('Integral', ('value', 'error', 'evaluations'))
+DEFAULT_QUANTITIES = ('R', 'T')
+UNPOLARIZED = {'R': ('Rs', 'Rp'), 'T': ('Ts', 'Tp')}
+MAX_ORDER = 256
+_trapezoid = getattr(np, 'trapezoid', None) or np.trapz		# renamed in NumPy 2.0
+
+
+_ruleCache = LRUCache(64)
+
+def GaussLegendre(order):
+	""" (nodes, weights) of the Gauss-Legendre rule of the given order on [0, 1] (read-only, cached)"""
+	def compute():
+		nodes, weights = np.polynomial.legendre.leggauss(order)
+		nodes, weights = 0.5*(nodes + 1.0), 0.5*weights
+		nodes.flags.writeable = weights.flags.writeable = False
+		return nodes, weights
+	return _ruleCache.getOrCompute(('legendre', int(order)), compute)
+
+def _smoothstepRule(order):
+	""" (nodes, weights) on [0, 1] of the Gauss-Legendre rule mapped through 3 s**2 - 2 s**3"""
+	def compute():
+		s, w = GaussLegendre(order)
+		nodes, weights = s*s*(3.0 - 2.0*s), w*6.0*s*(1.0 - s)
+		nodes.flags.writeable = weights.flags.writeable = False
+		return nodes, weights
+	return _ruleCache.getOrCompute(('smoothstep', int(order)), compute)
+
+
+def _quantity(coef, name):
+	if name in UNPOLARIZED:
+		s, p = UNPOLARIZED[name]
+		return 0.5*(getattr(coef, s) + getattr(coef, p))
+	if name not in FresnelArray.FresnelCoefficients._fields or name in ('rs', 'rp', 'ts', 'tp'):
+		raise ValueError('unknown quantity %r; choose from R, T or a real field of FresnelArray.FresnelCoefficients' % name)
+	return getattr(coef, name)
+
+def _panelBounds(nInc, nSub, thetaMax):
+	""" (..., 4) panel boundaries 0 <= brewster <= critical <= thetaMax (collapsed where absent)"""
+	ratio = np.real(nSub)/nInc
+	brewster = np.arctan(ratio)
+	with np.errstate(invalid='ignore'):
+		critical = np.where((ratio > 0.0) & (ratio < 1.0), np.arcsin(np.clip(ratio, -1.0, 1.0)), thetaMax)
+	bounds = np.stack(np.broadcast_arrays(0.0, brewster, critical, thetaMax), axis=-1)
+	return np.sort(np.clip(bounds, 0.0, thetaMax), axis=-1)
+
+def _hemispherical(nInc, nSub, quantities, order, thetaMax):
+	""" {quantity: array} of the panel rule of one order"""
+	nodes, weights = _smoothstepRule(order)
+	bounds = _panelBounds(nInc, nSub, thetaMax)
+	width = np.diff(bounds, axis=-1)[..., None]							# (..., 3, 1)
+	thetaInc = bounds[..., :-1, None] + width*nodes						# (..., 3, order)
+	weight = width*weights*2.0*np.sin(thetaInc)*np.cos(thetaInc)/np.sin(thetaMax)**2
+	shape = thetaInc.shape[:-2] + (-1,)
+	with np.errstate(all='ignore'):
+		coef = FresnelArray.FresnelAll(np.asarray(nInc)[..., None], np.asarray(nSub)[..., None], thetaInc.reshape(shape))
+	weight = weight.reshape(shape)
+	return {name: np.sum(np.nan_to_num(_quantity(coef, name))*weight, axis=-1) for name in quantities}
+
+def HemisphericalAverage(nInc, nSub, quantities=DEFAULT_QUANTITIES, order=16, thetaMax=pi/2, tolerance=None):
+	""" {quantity: Integral} of cosine-weighted averages over incidence angles in [0, thetaMax]
+
+	nInc and nSub broadcast (arrays give arrays of averages). With a tolerance the order is
+	doubled until every error estimate meets it or MAX_ORDER is reached.
+	"""
+	nInc = np.asarray(nInc, dtype=float)
+	nSub = np.asarray(nSub, dtype=complex)
+	low = _hemispherical(nInc, nSub, quantities, max(order//2, 1), thetaMax)
+	evaluations = 3*max(order//2, 1)
+	while True:
+		high = _hemispherical(nInc, nSub, quantities, order, thetaMax)
+		evaluations += 3*order
+		error = {name: np.abs(high[name] - low[name]) for name in quantities}
+		if tolerance is None or order >= MAX_ORDER or all(np.all(e <= tolerance) for e in error.values()):
+			return {name: Integral(high[name], error[name], evaluations) for name in quantities}
+		low = high			# the doubled order reuses this rule for its estimate
+		order *= 2
+
+
+def _indexFunction(n):
+	""" wavelength [um] -> complex index for a number, callable or Materials.Material"""
+	if hasattr(n, 'index'):
+		return n.index
+	if callable(n):
+		return n
+	return lambda wavelength: np.full(np.shape(wavelength), n, dtype=complex)
+
+
+class Spectrum:
+	""" source spectrum on [wavelength[0], wavelength[-1]] [um] with precomputed quadrature
+
+	power is a callable of wavelength or an array tabulated at the given wavelengths (linearly
+	interpolated); None is a flat spectrum. The band is split into equal panels with Gauss-Legendre
+	nodes; the weights integrate power times the interpolating polynomial of the integrand on each
+	panel, so a spiky tabulated spectrum costs no more evaluations than a smooth one as long as the
+	integrand itself (R or T) is smooth in wavelength. Weights of the half order rule are kept for
+	the error estimate.
+	"""
+
+	def __init__(self, wavelength, power=None, order=12, panels=2, resolution=4096):
+		wavelength = np.asarray(wavelength, dtype=float)
+		if wavelength.size < 2 or np.any(np.diff(wavelength) <= 0.0):
+			raise ValueError('wavelength must be increasing with at least two entries')
+		self.band = (wavelength[0], wavelength[-1])
+		self.order = order
+		self.panels = panels
+		# fine grid for the weights: the table wavelengths plus a uniform grid
+		fine = np.union1d(wavelength, np.linspace(wavelength[0], wavelength[-1], resolution))
+		if power is None:
+			density = np.ones_like(fine)
+		elif callable(power):
+			density = np.asarray(power(fine), dtype=float)
+		else:
+			density = np.interp(fine, wavelength, np.asarray(power, dtype=float))
+		self.total = _trapezoid(density, fine)
+		if not self.total > 0.0:
+			raise ValueError('spectrum must have positive total power')
+		self.nodes, self.weights = self._rule(order, fine, density)
+		self.lowNodes, self.lowWeights = self._rule(max(order//2, 1), fine, density)
+
+	def _rule(self, order, fine, density):
+		""" nodes and weights int power(wl) L_j(wl) dwl for the Lagrange basis L_j of every panel"""
+		s, _ = GaussLegendre(order)
+		edges = np.linspace(self.band[0], self.band[1], self.panels + 1)
+		nodes, weights = [], []
+		for a, b in zip(edges[:-1], edges[1:]):
+			x = a + (b - a)*s
+			inside = (fine >= a) & (fine <= b)
+			grid, f = fine[inside], density[inside]
+			# barycentric Lagrange basis at the fine grid points
+			difference = grid[:, None] - x
+			barycentric = 1.0/np.prod(x[:, None] - x + np.eye(order), axis=1)
+			exact = difference == 0.0
+			difference[exact] = 1.0
+			basis = barycentric/difference
+			basis /= basis.sum(axis=1, keepdims=True)
+			rows = exact.any(axis=1)
+			basis[rows] = exact[rows]
+			nodes.append(x)
+			weights.append(_trapezoid(f[:, None]*basis, grid, axis=0))
+		nodes, weights = np.concatenate(nodes), np.concatenate(weights)
+		nodes.flags.writeable = weights.flags.writeable = False
+		return nodes, weights
+
+	@property
+	def evaluations(self):
+		return self.nodes.size + self.lowNodes.size
+
+	def average(self, values, lowValues):
+		""" Integral of the power-weighted average from integrand values at nodes and lowNodes (last axis)"""
+		high = np.sum(values*self.weights, axis=-1)/self.total
+		low = np.sum(lowValues*self.lowWeights, axis=-1)/self.total
+		return Integral(high, np.abs(high - low), self.evaluations)
+
+
+def SpectralAverage(nInc, nSub, spectrum, thetaInc=0.0, quantities=DEFAULT_QUANTITIES, order=16):
+	""" {quantity: Integral} of spectrum-weighted averages at incidence angle thetaInc
+
+	thetaInc may be 'hemispherical' for the spectral average of HemisphericalAverage (of the given
+	angular order); the reported errors and evaluations then combine both quadratures.
+	"""
+	nIncAt, nSubAt = _indexFunction(nInc), _indexFunction(nSub)
+	results = []
+	for wavelength in (spectrum.nodes, spectrum.lowNodes):
+		nIncValues = np.real(nIncAt(wavelength))
+		nSubValues = nSubAt(wavelength)
+		if isinstance(thetaInc, str):
+			if thetaInc != 'hemispherical':
+				raise ValueError("thetaInc must be an angle or 'hemispherical'")
+			results.append(HemisphericalAverage(nIncValues, nSubValues, quantities, order))
+		else:
+			with np.errstate(all='ignore'):
+				coef = FresnelArray.FresnelAll(nIncValues, nSubValues, thetaInc)
+			results.append({name: Integral(_quantity(coef, name), 0.0, 1) for name in quantities})
+	averages = {}
+	for name in quantities:
+		high, low = results[0][name], results[1][name]
+		integral = spectrum.average(high.value, low.value)
+		angular = np.sum(high.error*spectrum.weights)/spectrum.total
+		evaluations = high.evaluations*spectrum.nodes.size + low.evaluations*spectrum.lowNodes.size
+		averages[name] = Integral(integral.value, integral.error + angular, evaluations)
+	return averages
+
+
+
+
+
+# test cases
+testPrecision = 1e-8
+def testIntegration():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testGaussLegendre, testHemispherical, testHemisphericalBatch, testSpectral, testSpectralHemispherical):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all INTEGRATION TESTS passed? '+str(combinedTest))
+
+def denseHemispherical(nInc, nSub, name, points=400001):
+	"""helper function: trapezoid sum of the cosine-weighted average on a dense uniform grid"""
+	thetaInc = np.linspace(0.0, pi/2, points)
+	with np.errstate(all='ignore'):
+		values = _quantity(FresnelArray.FresnelAll(nInc, nSub, thetaInc), name)
+	return _trapezoid(values*2.0*np.sin(thetaInc)*np.cos(thetaInc), thetaInc)
+
+# exact for polynomials of degree 2 order - 1
+def testGaussLegendre():
+	nodes, weights = GaussLegendre(5)
+	return abs(np.sum(weights*nodes**9) - 0.1) < 1e-15 and GaussLegendre(5)[0] is nodes and not nodes.flags.writeable
+
+# dielectric, metal and total internal reflection: tens of evaluations for 1e-8 accuracy
+def testHemispherical():
+	ok = True
+	for nInc, nSub in ((1.0, 1.5), (1.0, complex(2.007, 3.781)), (1.5, 1.0), (1.0, complex(1.5, 0.01))):
+		result = HemisphericalAverage(nInc, nSub, ('R', 'Rp', 'T'))
+		ok = ok and all(
+			abs(result[name].value - denseHemispherical(nInc, nSub, name)) < testPrecision and \
+			result[name].error < 1e-6 and result[name].evaluations == 72 for name in result)
+	# diffuse reflectance of glass n = 1.5 is about 9.2 %; lossless interfaces conserve energy
+	glass = HemisphericalAverage(1.0, 1.5, tolerance=1e-12)
+	return ok and abs(glass['R'].value - 0.0918) < 1e-3 and abs(glass['R'].value + glass['T'].value - 1.0) < 1e-12
+
+def testHemisphericalBatch():
+	nSub = np.linspace(1.2, 2.5, 50) + 1j*np.linspace(0.0, 3.0, 50)
+	batch = HemisphericalAverage(1.0, nSub, ('Rs',))['Rs'].value
+	single = [HemisphericalAverage(1.0, n, ('Rs',))['Rs'].value for n in nSub]
+	return batch.shape == (50,) and np.allclose(batch, single, rtol=0.0, atol=1e-15)
+
+# fused silica (Materials.testSellmeier) under a spectrum with sharp lines, against a dense trapezoid sum
+def testSpectral():
+	import Materials
+	silica = Materials.SellmeierMaterial('SiO2', (0.6961663, 0.4079426, 0.8974794), (0.0684043**2, 0.1162414**2, 9.896161**2))
+	wavelength = np.linspace(0.4, 1.0, 601)
+	power = 1.0/wavelength**5/(np.exp(1.4388/(wavelength*0.58)) - 1.0)		# 5000 K black body
+	power[[100, 250, 400]] *= 20.0
+	spectrum = Spectrum(wavelength, power)
+	result = SpectralAverage(1.0, silica, spectrum, thetaInc=1.0, quantities=('Rs', 'T'))
+	fine = np.union1d(wavelength, np.linspace(0.4, 1.0, 4096))
+	density = np.interp(fine, wavelength, power)
+	coef = FresnelArray.FresnelAll(1.0, silica.index(fine), 1.0)
+	expectedRs = _trapezoid(density*coef.Rs, fine)/_trapezoid(density, fine)
+	expectedT = _trapezoid(density*0.5*(coef.Ts + coef.Tp), fine)/_trapezoid(density, fine)
+	constant = SpectralAverage(1.0, 1.5, spectrum, thetaInc=1.0, quantities=('Rs',))['Rs']
+	return(
+		abs(result['Rs'].value - expectedRs) < 1e-7 and abs(result['T'].value - expectedT) < 1e-7 and \
+		result['Rs'].evaluations == 36 and result['Rs'].error < 1e-6 and \
+		abs(constant.value - FresnelArray.Rs(1.0, 1.5, 1.0)) < 1e-13)
+
+def testSpectralHemispherical():
+	spectrum = Spectrum([0.5, 0.7], order=4, panels=1)
+	result = SpectralAverage(1.0, lambda wavelength: 1.45 + 0.01/wavelength**2, spectrum, 'hemispherical', ('R',))['R']
+	wavelength = np.linspace(0.5, 0.7, 401)
+	perWavelength = HemisphericalAverage(1.0, 1.45 + 0.01/wavelength**2, ('R',), order=32)['R'].value
+	expected = _trapezoid(perWavelength, wavelength)/0.2
+	return abs(result.value - expected) < 1e-8 and result.error < 1e-5 and result.evaluations == 72*4 + 72*2
+
+
+if __name__ == '__main__':
+	testIntegration()
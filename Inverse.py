@@ -0,0 +1,203 @@
+"""
+INVERSE
+
+Batched fit of the complex substrate index nSub = n + i k from measured reflectance and
+retardance, using the forward equations and analytic gradients of FresnelGradient.py.
+Function summary:
+	FitIndex: vectorized Levenberg-Marquardt over many measurements (pixels) at once
+	FitImage: coarse-to-fine fit of an image with warm starts from neighboring pixels
+	test cases against synthetic measurements and the nickel data of testFresnelMetal2 (FresnelTest.py)
+
+Measurements are given as a dict with any of the keys
+	Rs, Rp			reflected irradiance (s, p)
+	RetardanceR		Retardance(rs, rp) [radians], compared modulo 2 pi
+or any other real-valued field of FresnelArray.FresnelCoefficients (Ts, Tp, DiattenuationR, ...),
+each an array of the measurement shape; nInc and thetaInc broadcast against it.
+Each pixel is an independent 2-parameter least-squares problem (n, k); all pixels advance
+together, every iteration is a handful of array operations and a closed-form 2x2 solve.
+
+Decreasing phase convention assumed (n + i k), k >= 0; fits are constrained to n > 0, k >= 0.
+
+Test cases can be evaluated with following command:
+python3 Inverse.py
+"""
+
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import FresnelArray
+from FresnelGradient import FresnelAllGradient
+
+
+QUANTITIES = ('Rs', 'Rp', 'RetardanceR')
+MEASURABLE = tuple(name for name in FresnelArray.FresnelCoefficients._fields if name not in ('rs', 'rp', 'ts', 'tp'))
+FitResult = namedtuple('FitResult', ('nSub', 'cost', 'iterations', 'converged', 'stalled', 'fitsPerSecond'))
+
+
+def _wrap(angle):
+	""" angle folded into (-pi, pi]"""
+	return np.pi - np.mod(np.pi - angle, 2.0*np.pi)
+
+def _residualsAndJacobian(nInc, nSub, thetaInc, measured, weights):
+	""" residuals (..., M) and Jacobian (..., M, 2) with respect to (n, k)"""
+	for name in measured:
+		if name not in MEASURABLE:
+			raise ValueError('unknown measurement %r; choose from %s' % (name, MEASURABLE))
+	coef, partials = FresnelAllGradient(nInc, nSub, thetaInc, quantities=tuple(measured), parameters=('nSubReal', 'nSubImag'))
+	residuals = []
+	jacobian = []
+	for name in measured:
+		residual = getattr(coef, name) - measured[name]
+		residuals.append(_wrap(residual) if name.startswith('Retardance') else residual)
+		jacobian.append((getattr(partials.nSubReal, name), getattr(partials.nSubImag, name)))
+	w = np.array([weights.get(name, 1.0) for name in measured])
+	residuals = np.stack(np.broadcast_arrays(*residuals), axis=-1)*w
+	jacobian = np.stack([np.stack(np.broadcast_arrays(*column), axis=-1) for column in jacobian], axis=-2)*w[:, None]
+	return residuals, jacobian
+
+
+def FitIndex(measured, nInc, thetaInc, initial=complex(1.5, 1.0), weights=None, maxIterations=50, tolerance=1e-12):
+	""" least-squares nSub for every measurement (FitResult of arrays with the measurement shape)
+
+	"initial" is a scalar or an array of starting values; Levenberg-Marquardt damping is adapted
+	per pixel, so converged pixels stop moving while the others continue. "converged" marks pixels
+	that met the cost or relative-decrease tolerance; "stalled" marks pixels that stopped without
+	meeting it because no step of the maximum damping lowered the cost.
+	"""
+	tic = time.perf_counter()
+	weights = weights or {}
+	measured = {name: np.asarray(value, dtype=float) for name, value in measured.items()}
+	shape = np.broadcast_shapes(*(v.shape for v in measured.values()), np.shape(nInc), np.shape(thetaInc), np.shape(initial))
+	nSub = np.array(np.broadcast_to(np.asarray(initial, dtype=complex), shape))
+	damping = np.full(shape, 1e-3)
+	residuals, jacobian = _residualsAndJacobian(nInc, nSub, thetaInc, measured, weights)
+	cost = np.sum(residuals**2, axis=-1)
+	converged = np.zeros(shape, dtype=bool)
+	stalled = np.zeros(shape, dtype=bool)
+	iterations = 0
+	with np.errstate(all='ignore'):
+		for iterations in range(1, maxIterations + 1):
+			# normal equations (J^T J + damping diag(J^T J)) step = -J^T r, solved in closed form
+			A = np.einsum('...mi,...mj->...ij', jacobian, jacobian)
+			g = np.einsum('...mi,...m->...i', jacobian, residuals)
+			a00 = A[..., 0, 0]*(1.0 + damping) + 1e-30
+			a11 = A[..., 1, 1]*(1.0 + damping) + 1e-30
+			a01 = A[..., 0, 1]
+			det = a00*a11 - a01*a01
+			stepN = -(a11*g[..., 0] - a01*g[..., 1])/det
+			stepK = -(a00*g[..., 1] - a01*g[..., 0])/det
+			trial = np.abs(nSub.real + stepN) + 1j*np.abs(nSub.imag + stepK)
+			trialResiduals, trialJacobian = _residualsAndJacobian(nInc, trial, thetaInc, measured, weights)
+			trialCost = np.sum(trialResiduals**2, axis=-1)
+
+			better = (trialCost < cost) & ~converged & ~stalled
+			converged |= better & (cost - trialCost <= tolerance*(1e-12 + cost))
+			converged |= cost <= tolerance**2
+			nSub = np.where(better, trial, nSub)
+			cost = np.where(better, trialCost, cost)
+			residuals = np.where(better[..., None], trialResiduals, residuals)
+			jacobian = np.where(better[..., None, None], trialJacobian, jacobian)
+			damping = np.where(better, damping/3.0, np.minimum(damping*4.0, 1e12))
+			stalled |= (damping >= 1e12) & ~converged
+			if (converged | stalled).all():
+				break
+	elapsed = time.perf_counter() - tic
+	return FitResult(nSub, cost, iterations, converged, stalled, nSub.size/elapsed if elapsed > 0.0 else np.inf)
+
+
+STARTS = tuple(complex(n, k) for n in (0.3, 1.5, 3.0) for k in (0.05, 1.5, 5.0))
+
+def FitImage(measured, nInc, thetaInc, stride=4, starts=STARTS, weights=None, maxIterations=50, tolerance=1e-12):
+	""" nSub for a 2-D image of measurements, warm-started from neighboring pixels
+
+	Every stride-th pixel in both directions is fitted from each of the starting values and keeps
+	the best solution; all pixels are then fitted starting from the nearest of these coarse
+	solutions, which is usually within a few iterations of their own optimum.
+	"""
+	tic = time.perf_counter()
+	measured = {name: np.asarray(value, dtype=float) for name, value in measured.items()}
+	height, width = next(iter(measured.values())).shape
+	nInc = np.broadcast_to(nInc, (height, width))
+	thetaInc = np.broadcast_to(thetaInc, (height, width))
+
+	coarse = (slice(None, None, stride), slice(None, None, stride))
+	starts = np.asarray(starts, dtype=complex)
+	coarseMeasured = {name: value[coarse][..., None] for name, value in measured.items()}
+	trial = FitIndex(coarseMeasured, nInc[coarse][..., None], thetaInc[coarse][..., None], starts, weights, maxIterations, tolerance)
+	best = np.argmin(np.where(np.isnan(trial.cost), np.inf, trial.cost), axis=-1)
+	coarseIndex = np.take_along_axis(trial.nSub, best[..., None], axis=-1)[..., 0]
+
+	rows = np.minimum((np.arange(height) + stride//2)//stride, coarseIndex.shape[0] - 1)
+	columns = np.minimum((np.arange(width) + stride//2)//stride, coarseIndex.shape[1] - 1)
+	initial = coarseIndex[np.ix_(rows, columns)]
+	result = FitIndex(measured, nInc, thetaInc, initial, weights, maxIterations, tolerance)
+	elapsed = time.perf_counter() - tic
+	return result._replace(fitsPerSecond=height*width/elapsed if elapsed > 0.0 else np.inf)
+
+
+def Measure(nInc, nSub, thetaInc, quantities=QUANTITIES):
+	""" forward model: {quantity: array} of the measurements FitIndex accepts"""
+	coef = FresnelArray.FresnelAll(nInc, nSub, thetaInc)
+	return {name: getattr(coef, name) for name in quantities}
+
+
+
+
+
+# test cases
+testPrecision = 1e-6
+def testInverse():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testDerivatives, testNickel, testStalled, testRandomMetals, testImage):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all INVERSE TESTS passed? '+str(combinedTest))
+
+# analytic Jacobian against central differences of the residuals
+def testDerivatives():
+	nInc = 1.0
+	nSub = np.array([complex(2.007, 3.781), complex(0.29006, 2.8628), 1.5 + 0.01j])
+	thetaInc = 1.0471976
+	h = 1e-6
+	measured = Measure(nInc, nSub + 0.1, thetaInc, ('Rs', 'Rp', 'RetardanceR', 'Tp'))
+	residuals, jacobian = _residualsAndJacobian(nInc, nSub, thetaInc, measured, {})
+	differences = [(_residualsAndJacobian(nInc, nSub + step, thetaInc, measured, {})[0] - _residualsAndJacobian(nInc, nSub - step, thetaInc, measured, {})[0])/(2*h)
+		for step in (h, 1j*h)]
+	return(
+		np.allclose(residuals[:, 0], FresnelArray.Rs(nInc, nSub, thetaInc) - measured['Rs']) and \
+		np.allclose(jacobian[..., 0], differences[0], atol=1e-7) and np.allclose(jacobian[..., 1], differences[1], atol=1e-7))
+
+# nickel at 632.8 nm, 60 degrees (testFresnelMetal2 of FresnelTest.py): recover 2.007 + 3.781i
+def testNickel():
+	measured = Measure(1.0, complex(2.007, 3.781), 1.0471976)
+	result = FitIndex(measured, 1.0, 1.0471976)
+	return bool(result.converged) and not result.stalled and abs(result.nSub - complex(2.007, 3.781)) < testPrecision
+
+# reflectances above 1 have no solution: the fit stalls and is not reported as converged
+def testStalled():
+	result = FitIndex(dict(Rs=[1.5, 0.5], Rp=[1.5, 0.3]), 1.0, 1.0471976)
+	return list(result.converged) == [False, True] and list(result.stalled) == [True, False]
+
+def testRandomMetals():
+	rng = np.random.default_rng(2022)
+	nTrials = 2000
+	nSub = 0.2 + 2.0*rng.random(nTrials) + 1j*(1.0 + 5.0*rng.random(nTrials))
+	thetaInc = 0.9 + 0.3*rng.random(nTrials)
+	result = FitIndex(Measure(1.0, nSub, thetaInc), 1.0, thetaInc, initial=complex(1.0, 3.0))
+	return np.mean(np.abs(result.nSub - nSub) < testPrecision) > 0.99
+
+# smoothly varying image with a few outlying pixels; warm starts from the coarse grid
+def testImage():
+	y, x = np.mgrid[0:40, 0:50]
+	nSub = (0.3 + 0.02*x) + 1j*(2.5 + 0.03*y)
+	nSub[10, 10] = complex(1.8, 0.5)
+	result = FitImage(Measure(1.0, nSub, 1.0471976), 1.0, 1.0471976, stride=5)
+	return result.nSub.shape == (40, 50) and np.mean(np.abs(result.nSub - nSub) < testPrecision) > 0.99
+
+
+if __name__ == '__main__':
+	testInverse()
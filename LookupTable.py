@@ -0,0 +1,365 @@
+"""
+LOOKUP TABLE
+
+Precomputed piecewise Chebyshev interpolants of Fresnel irradiances for fast repeated queries
+with a fixed set of materials.
+Function summary:
+	LookupTable: one interface (nInc, nSub), fitted in cos(thetaInc) to a maximum error
+	SpectralTable: one LookupTable per wavelength of a grid, linear in wavelength between them
+	validation against the exact functions of Fresnel.py
+	save / load as .npz files
+	test cases
+
+A table covers cos(thetaInc) in [0, 1]. Without a critical angle the variable is v = cos(thetaInc);
+with one (Re(nSub) < nInc) each side of xc = cos(thetaCritical) is fitted in v = sqrt(|cos - xc|)
+(normalized to [0, 1]), in which the square root kink of the curves at the critical angle is
+smooth. Each side is bisected dyadically until a Chebyshev interpolant of the given degree meets
+the tolerance on a check grid four times denser than its nodes, for every quantity at once.
+Close to the critical angle the exact curves themselves carry rounding errors of about 1e-7
+(the angle only resolves cos - xc to machine precision), so tolerances below that may not be met.
+
+A query is O(1): one square root (with a critical angle), one bucket lookup in an array with an
+entry per finest-level segment and a polynomial of the given degree (Horner, in the power basis
+of the segment). Queries take cos(thetaInc), as renderers usually have it from a dot product;
+__call__ takes thetaInc and query() serves single angles without NumPy overhead.
+
+Quantities are Rs, Rp, Ts, Tp and DiattenuationR (the continuous real fields of
+FresnelArray.FresnelCoefficients).
+
+Test cases can be evaluated with following command:
+python3 LookupTable.py
+"""
+
+from math import sqrt
+
+import numpy as np
+
+import FresnelArray
+
+
+QUANTITIES = ('Rs', 'Rp', 'Ts', 'Tp', 'DiattenuationR')
+DEFAULT_QUANTITIES = ('Rs', 'Rp', 'Ts', 'Tp')
+FORMAT_VERSION = 1
+
+
+def _chebyshevNodes(degree):
+	""" first-kind Chebyshev points on [-1, 1] and the matrix mapping values there to coefficients"""
+	y = np.cos(np.pi*(np.arange(degree + 1) + 0.5)/(degree + 1))
+	return y, np.linalg.inv(np.polynomial.chebyshev.chebvander(y, degree))
+
+def _horner(terms, segment, y):
+	""" sum_k terms[k, :, segment] y**k for power-basis coefficients terms (degree+1, Q, S) -> (Q, N)"""
+	values = np.take(terms[-1], segment, axis=1)
+	for k in range(terms.shape[0] - 2, -1, -1):
+		values *= y
+		values += np.take(terms[k], segment, axis=1)
+	return values
+
+
+class LookupTable:
+	""" piecewise Chebyshev interpolant of irradiances of one interface over cos(thetaInc) in [0, 1]
+
+	LookupTable(nInc, nSub) fits the table; raises ValueError when the tolerance cannot be met
+	with segments of at least 2**-maxLevel of a side (increase degree or maxLevel).
+	"""
+
+	def __init__(self, nInc, nSub, quantities=DEFAULT_QUANTITIES, tolerance=1e-6, degree=6, maxLevel=12, _arrays=None):
+		if _arrays is not None:
+			self._setArrays(_arrays)
+			return
+		unknown = [name for name in quantities if name not in QUANTITIES]
+		if unknown:
+			raise ValueError('unknown quantities %s; choose from %s' % (unknown, QUANTITIES))
+		self.nInc = float(nInc)
+		self.nSub = complex(nSub)
+		self.quantities = tuple(quantities)
+		self.tolerance = float(tolerance)
+		self.degree = int(degree)
+		self.maxLevel = int(maxLevel)
+		ratio = self.nSub.real/self.nInc
+		if 0.0 < ratio < 1.0:
+			xc = np.sqrt(1.0 - ratio*ratio)
+			# side 0: cos < xc (total internal reflection), side 1: cos >= xc
+			self.origin, self.sign, self.span, self.power = np.array([xc, xc]), np.array([-1.0, 1.0]), np.sqrt([xc, 1.0 - xc]), 2
+		else:
+			self.origin, self.sign, self.span, self.power = np.zeros(1), np.ones(1), np.ones(1), 1
+		self._build()
+
+	# mapping between cos(thetaInc) and the normalized variable v of a side
+	def _cosine(self, side, v):
+		return self.origin[side] + self.sign[side]*(v*self.span[side])**self.power
+
+	def _variable(self, side, cosThetaInc):
+		t = np.sqrt(np.maximum(self.sign[side]*(cosThetaInc - self.origin[side]), 0.0)) if self.power == 2 else cosThetaInc
+		return np.clip(t/self.span[side], 0.0, 1.0)
+
+	def _exact(self, side, v):
+		""" (Q, ...) exact quantities at normalized variable v of the given side(s)"""
+		thetaInc = np.arccos(np.clip(self._cosine(side, v), 0.0, 1.0))
+		with np.errstate(all='ignore'):
+			coef = FresnelArray.FresnelAll(self.nInc, self.nSub, thetaInc)
+		return np.array([getattr(coef, name) for name in self.quantities])
+
+	def _build(self):
+		nodes, inverse = _chebyshevNodes(self.degree)
+		check = np.linspace(-1.0, 1.0, 4*(self.degree + 1) + 1)
+		checkBasis = np.polynomial.chebyshev.chebvander(check, self.degree)			# (C, degree+1)
+		startLevel = 2
+		sides = np.repeat(np.arange(self.origin.size), 1 << startLevel)
+		levels = np.full(sides.size, startLevel)
+		indices = np.tile(np.arange(1 << startLevel), self.origin.size)
+		accepted = []
+		self.maxError = 0.0
+		while sides.size:
+			width = 0.5**levels
+			left = indices*width
+			def exact(y):
+				v = left[:, None] + 0.5*(y + 1.0)*width[:, None]						# (S, points)
+				return np.moveaxis(self._exact(sides[:, None], v), 0, 1)				# (S, Q, points)
+			coefficients = exact(nodes) @ inverse.T										# (S, Q, degree+1)
+			error = np.abs(coefficients @ checkBasis.T - exact(check)).max(axis=(1, 2))
+			good = (error <= self.tolerance) | (levels >= self.maxLevel)
+			accepted.append((sides[good], levels[good], indices[good], coefficients[good], error[good]))
+			bad = ~good
+			sides = np.repeat(sides[bad], 2)
+			levels = np.repeat(levels[bad] + 1, 2)
+			indices = (np.repeat(indices[bad], 2)*2 + np.tile([0, 1], bad.sum()))
+		self.sides, self.levels, self.indices, self.coefficients, errors = (np.concatenate(parts) for parts in zip(*accepted))
+		self.maxError = float(errors.max())
+		if not self.maxError <= self.tolerance:
+			raise ValueError('maximum error %.3g exceeds the tolerance %.3g; increase degree or maxLevel' % (self.maxError, self.tolerance))
+		self._prepare()
+
+	def _prepare(self):
+		""" query structures: segment number of every finest-level bucket of every side, coefficients by term"""
+		size = 1 << self.maxLevel
+		self.buckets = np.empty((self.origin.size, size), dtype=np.intp)
+		shift = self.maxLevel - self.levels
+		for segment, (side, start, stop) in enumerate(zip(self.sides, self.indices << shift, (self.indices + 1) << shift)):
+			self.buckets[side, start:stop] = segment
+		# queries use the power basis in the local variable y = v*scale - offset in [-1, 1] (fewer operations than Clenshaw)
+		power = np.apply_along_axis(np.polynomial.chebyshev.cheb2poly, -1, self.coefficients)
+		self._terms = np.ascontiguousarray(np.transpose(power, (2, 1, 0)))
+		self._scale = 2.0*(1 << self.levels)
+		self._offset = 2.0*self.indices + 1.0
+		# plain Python copies for single-angle queries
+		self._sideLists = list(zip(self.origin.tolist(), self.sign.tolist(), self.span.tolist(), self.buckets.tolist()))
+		self._segmentLists = [(scale, offset, [row[::-1] for row in terms])
+			for scale, offset, terms in zip(self._scale.tolist(), self._offset.tolist(), power.tolist())]
+
+	@property
+	def segments(self):
+		return self.levels.size
+
+	def evaluate(self, cosThetaInc):
+		""" {quantity: array} at cos(thetaInc) in [0, 1] (any array shape)"""
+		cosThetaInc = np.asarray(cosThetaInc, dtype=float)
+		x = np.ravel(cosThetaInc)
+		side = (x >= self.origin[-1]).astype(np.intp) if self.origin.size == 2 else np.zeros(x.shape, dtype=np.intp)
+		v = self._variable(side, x)
+		size = 1 << self.maxLevel
+		segment = self.buckets[side, np.minimum((v*size).astype(np.intp), size - 1)]
+		y = v*self._scale[segment] - self._offset[segment]
+		values = _horner(self._terms, segment, y)
+		return {name: values[row].reshape(cosThetaInc.shape) for row, name in enumerate(self.quantities)}
+
+	def query(self, cosThetaInc):
+		""" tuple of the quantities at a single cos(thetaInc), without NumPy overhead"""
+		origin, sign, span, buckets = self._sideLists[-1] if cosThetaInc >= self._sideLists[-1][0] else self._sideLists[0]
+		v = sqrt(max(sign*(cosThetaInc - origin), 0.0))/span if self.power == 2 else cosThetaInc
+		v = min(max(v, 0.0), 1.0)
+		scale, offset, rows = self._segmentLists[buckets[min(int(v*len(buckets)), len(buckets) - 1)]]
+		y = v*scale - offset
+		values = []
+		for row in rows:
+			value = 0.0
+			for c in row:
+				value = value*y + c
+			values.append(value)
+		return tuple(values)
+
+	def __call__(self, thetaInc):
+		""" {quantity: array} at incidence angles thetaInc in [0, pi/2] [radians]"""
+		return self.evaluate(np.cos(thetaInc))
+
+	def validate(self, samples=10000, seed=2022):
+		""" {quantity: maximum absolute error} at random angles against the scalar functions of Fresnel.py"""
+		import Fresnel
+		rng = np.random.default_rng(seed)
+		thetaInc = np.concatenate((rng.random(samples)*np.pi/2, [0.0, np.pi/2]))
+		table = self(thetaInc)
+		errors = {}
+		for name in self.quantities:
+			if name == 'DiattenuationR':
+				exact = [Fresnel.Diattenuation(Fresnel.Rs(self.nInc, self.nSub, t), Fresnel.Rp(self.nInc, self.nSub, t)) for t in thetaInc]
+			else:
+				exact = [getattr(Fresnel, name)(self.nInc, self.nSub, t) for t in thetaInc]
+			errors[name] = float(np.max(np.abs(table[name] - np.real(exact))))
+		return errors
+
+	# serialization
+	def _getArrays(self):
+		return dict(
+			version=FORMAT_VERSION, nInc=self.nInc, nSub=self.nSub, quantities=np.array(self.quantities), tolerance=self.tolerance,
+			degree=self.degree, maxLevel=self.maxLevel, maxError=self.maxError, origin=self.origin, sign=self.sign, span=self.span,
+			power=self.power, sides=self.sides, levels=self.levels, indices=self.indices, coefficients=self.coefficients)
+
+	def _setArrays(self, arrays):
+		if int(arrays['version']) != FORMAT_VERSION:
+			raise ValueError('unsupported lookup table format %r' % arrays['version'])
+		self.nInc, self.nSub = float(arrays['nInc']), complex(arrays['nSub'])
+		self.quantities = tuple(str(name) for name in arrays['quantities'])
+		self.tolerance, self.maxError = float(arrays['tolerance']), float(arrays['maxError'])
+		self.degree, self.maxLevel, self.power = int(arrays['degree']), int(arrays['maxLevel']), int(arrays['power'])
+		self.origin, self.sign, self.span = arrays['origin'], arrays['sign'], arrays['span']
+		self.sides, self.levels, self.indices, self.coefficients = arrays['sides'], arrays['levels'], arrays['indices'], arrays['coefficients']
+		self._prepare()
+
+	def save(self, path):
+		""" write the table to an .npz file"""
+		np.savez(path, **self._getArrays())
+
+	@classmethod
+	def load(cls, path):
+		""" table written by save (no Fresnel evaluations)"""
+		with np.load(path) as arrays:
+			return cls(None, None, _arrays=dict(arrays))
+
+
+class SpectralTable:
+	""" LookupTable per wavelength of a grid [um]; queries interpolate linearly in wavelength
+
+	nSub (and nInc) are numbers, callables of wavelength or Materials.Material instances. The
+	tolerance holds at the grid wavelengths; in between, the error is that of linear interpolation
+	of the curves in wavelength, which the grid spacing controls.
+	"""
+
+	def __init__(self, nInc, nSub, wavelength, quantities=DEFAULT_QUANTITIES, tolerance=1e-6, degree=6, maxLevel=12, _tables=None):
+		self.wavelength = np.asarray(wavelength, dtype=float)
+		if _tables is not None:
+			self.tables = _tables
+			return
+		if self.wavelength.size < 2 or np.any(np.diff(self.wavelength) <= 0.0):
+			raise ValueError('wavelength must be increasing with at least two entries')
+		nIncValues, nSubValues = (self._indexAt(n) for n in (nInc, nSub))
+		self.tables = [LookupTable(np.real(a), b, quantities, tolerance, degree, maxLevel) for a, b in zip(nIncValues, nSubValues)]
+
+	def _indexAt(self, n):
+		if hasattr(n, 'index'):
+			return n.index(self.wavelength)
+		if callable(n):
+			return np.asarray(n(self.wavelength))
+		return np.full(self.wavelength.shape, n)
+
+	def evaluate(self, wavelength, cosThetaInc):
+		""" {quantity: array} at broadcast wavelength [um] (inside the grid) and cos(thetaInc)"""
+		wavelength, cosThetaInc = np.broadcast_arrays(np.asarray(wavelength, dtype=float), np.asarray(cosThetaInc, dtype=float))
+		if wavelength.size and (wavelength.min() < self.wavelength[0] or wavelength.max() > self.wavelength[-1]):
+			raise ValueError('table covers wavelengths %g-%g um' % (self.wavelength[0], self.wavelength[-1]))
+		interval = np.clip(np.searchsorted(self.wavelength, wavelength, side='right') - 1, 0, self.wavelength.size - 2)
+		fraction = (wavelength - self.wavelength[interval])/(self.wavelength[interval + 1] - self.wavelength[interval])
+		result = {name: np.empty(wavelength.shape) for name in self.tables[0].quantities}
+		for i in np.unique(interval):
+			where = interval == i
+			low, high = self.tables[i].evaluate(cosThetaInc[where]), self.tables[i + 1].evaluate(cosThetaInc[where])
+			for name in result:
+				result[name][where] = low[name] + fraction[where]*(high[name] - low[name])
+		return result
+
+	def __call__(self, wavelength, thetaInc):
+		return self.evaluate(wavelength, np.cos(thetaInc))
+
+	def save(self, path):
+		""" write all tables to one .npz file"""
+		arrays = dict(wavelength=self.wavelength)
+		for i, table in enumerate(self.tables):
+			arrays.update({'%d/%s' % (i, key): value for key, value in table._getArrays().items()})
+		np.savez(path, **arrays)
+
+	@classmethod
+	def load(cls, path):
+		with np.load(path) as arrays:
+			arrays = dict(arrays)
+		wavelength = arrays['wavelength']
+		tables = []
+		for i in range(wavelength.size):
+			prefix = '%d/' % i
+			tables.append(LookupTable(None, None, _arrays={key[len(prefix):]: value for key, value in arrays.items() if key.startswith(prefix)}))
+		return cls(None, None, wavelength, _tables=tables)
+
+
+
+
+
+# test cases
+def testLookupTable():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testTolerance, testCritical, testQueries, testSerialization, testSpectral):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all LOOKUP TABLE TESTS passed? '+str(combinedTest))
+
+# dielectric, metals (testFresnelMetal1/2 of Fresnel.py) and total internal reflection, validated against Fresnel.py
+def testTolerance():
+	ok = True
+	for nInc, nSub in ((1.0, 1.5), (1.0, complex(0.29006, 2.8628)), (1.0, complex(2.007, 3.781)), (1.5, 1.0), (1.72, 1.15)):
+		table = LookupTable(nInc, nSub, QUANTITIES, tolerance=1e-6)
+		ok = ok and table.segments < 100 and max(table.validate(2000).values()) <= 1e-6
+	return ok
+
+# the square root kink at the critical angle needs no refinement in the sqrt variable
+def testCritical():
+	table = LookupTable(1.5, 1.0, tolerance=1e-9, degree=12)
+	thetaCritical = np.arcsin(1.0/1.5)
+	values = table(np.array([thetaCritical - 1e-9, thetaCritical, thetaCritical + 1e-9]))
+	return table.segments <= 16 and np.allclose(values['Rs'][1:], 1.0, atol=1e-9) and values['Rs'][0] < 1.0
+
+def testQueries():
+	table = LookupTable(1.0, complex(2.007, 3.781))
+	cosThetaInc = np.random.default_rng(2022).random((30, 40))
+	values = table.evaluate(cosThetaInc)
+	exact = FresnelArray.FresnelAll(1.0, complex(2.007, 3.781), np.arccos(cosThetaInc))
+	single = [table.query(x) for x in cosThetaInc[0].tolist() + [0.0, 1.0]]
+	tir = LookupTable(1.5, 1.0)
+	return(
+		values['Tp'].shape == (30, 40) and np.allclose(values['Rp'], exact.Rp, rtol=0.0, atol=1e-6) and \
+		np.allclose([q[1] for q in single[:-2]], values['Rp'][0], rtol=0.0, atol=1e-14) and \
+		np.allclose(single[-1], [table.evaluate(1.0)[name] for name in table.quantities], rtol=0.0, atol=1e-14) and \
+		all(np.allclose(tir.query(x), [tir.evaluate(x)[name] for name in tir.quantities], rtol=0.0, atol=1e-14) for x in (0.0, 0.3, 0.7453559924999299, 0.9)))
+
+def testSerialization():
+	import os, tempfile
+	table = LookupTable(1.72, 1.15, ('Rs', 'DiattenuationR'))
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, 'table.npz')
+		table.save(path)
+		loaded = LookupTable.load(path)
+	angles = np.linspace(0.0, np.pi/2, 1001)
+	return(
+		loaded.quantities == ('Rs', 'DiattenuationR') and loaded.maxError == table.maxError and \
+		all(np.array_equal(loaded(angles)[name], table(angles)[name]) for name in table.quantities))
+
+# fused silica (Materials.testSellmeier): exact at grid wavelengths, close in between
+def testSpectral():
+	import os, tempfile
+	import Materials
+	silica = Materials.SellmeierMaterial('SiO2', (0.6961663, 0.4079426, 0.8974794), (0.0684043**2, 0.1162414**2, 9.896161**2))
+	table = SpectralTable(1.0, silica, np.linspace(0.4, 0.8, 21), ('Rs', 'Tp'))
+	thetaInc = np.linspace(0.0, 1.5, 7)
+	onGrid = table(0.5, thetaInc)
+	between = table(np.array([0.41, 0.55, 0.79])[:, None], thetaInc)
+	exactBetween = FresnelArray.FresnelAll(1.0, silica.index(np.array([0.41, 0.55, 0.79]))[:, None], thetaInc)
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, 'silica.npz')
+		table.save(path)
+		loaded = SpectralTable.load(path)
+	return(
+		np.allclose(onGrid['Rs'], FresnelArray.Rs(1.0, silica.index(0.5), thetaInc), rtol=0.0, atol=1e-6) and \
+		between['Tp'].shape == (3, 7) and np.allclose(between['Tp'], exactBetween.Tp, rtol=0.0, atol=1e-5) and \
+		np.array_equal(loaded(0.55, thetaInc)['Rs'], table(0.55, thetaInc)['Rs']))
+
+
+if __name__ == '__main__':
+	testLookupTable()
@@ -0,0 +1,411 @@
+"""
+MATERIALS
+
+Dispersive complex refractive index n(wavelength) + i k(wavelength) for use as "nSub" (or a
+thin-film layer index) in Fresnel.py, FresnelArray.py and ThinFilm.py.
+Function summary:
+	tabulated materials with pre-built piecewise-linear interpolation tables
+	Sellmeier, Cauchy and Drude-Lorentz dispersion models
+	loaders for n,k CSV files and RefractiveIndex.info YAML files
+	material database with an LRU cache of index lookups keyed by (material, wavelength grid)
+	test cases
+
+Decreasing phase convention assumed (n + i k, k >= 0 for absorbing materials).
+Wavelengths have units of micrometers, as on https://RefractiveIndex.info
+
+Lookups are vectorized: a grid of W wavelengths costs one binary search per point (O(log N) in the
+table length N) for tabulated data and one model evaluation per point for dispersion formulas.
+Tabulated data are not extrapolated; wavelengths outside the table raise ValueError.
+
+Test cases can be evaluated with following command:
+python3 Materials.py
+"""
+
+import abc
+import os
+import numpy as np
+
+from Cache import LRUCache
+
+
+# photon energy [eV] = HC_EV_UM / wavelength [um]
+HC_EV_UM = 1.23984198
+
+
+class Material(abc.ABC):
+	""" abstract base class: name, valid wavelength range [um] and vectorized complex index"""
+
+	def __init__(self, name, wavelengthRange=(0.0, np.inf)):
+		self.name = name
+		self.wavelengthRange = (float(wavelengthRange[0]), float(wavelengthRange[1]))
+
+	def __repr__(self):
+		return '%s(%r, %g-%g um)' % (type(self).__name__, self.name, *self.wavelengthRange)
+
+	def _checkRange(self, wavelength):
+		if wavelength.size and (wavelength.min() < self.wavelengthRange[0] or wavelength.max() > self.wavelengthRange[1]):
+			raise ValueError('%s is defined for wavelengths %g-%g um' % (self.name, *self.wavelengthRange))
+
+	def index(self, wavelength):
+		""" complex refractive index n + i k at wavelength [um] (any array shape)"""
+		wavelength = np.asarray(wavelength, dtype=float)
+		self._checkRange(wavelength)
+		return self._index(wavelength)
+
+	@abc.abstractmethod
+	def _index(self, wavelength):
+		""" complex index of a float array of wavelengths inside the valid range"""
+
+
+class ConstantMaterial(Material):
+	""" non-dispersive material"""
+
+	def __init__(self, name, n):
+		Material.__init__(self, name)
+		self.n = complex(n)
+
+	def _index(self, wavelength):
+		return np.full(wavelength.shape, self.n)
+
+
+class TabulatedMaterial(Material):
+	""" tabulated n, k linearly interpolated in wavelength
+
+	The table is sorted once and stored with the slope of every interval, so a lookup is a
+	searchsorted followed by one multiply-add per point.
+	"""
+
+	def __init__(self, name, wavelength, n, k=None):
+		wavelength = np.asarray(wavelength, dtype=float)
+		n = np.asarray(n, dtype=float) + 1j*(0.0 if k is None else np.asarray(k, dtype=float))
+		order = np.argsort(wavelength, kind='stable')
+		wavelength = wavelength[order]
+		n = np.broadcast_to(n, wavelength.shape)[order]
+		if wavelength.size < 2 or np.any(np.diff(wavelength) <= 0.0):
+			raise ValueError('%s: tabulated data need at least two distinct wavelengths' % name)
+		Material.__init__(self, name, (wavelength[0], wavelength[-1]))
+		self.wavelength = wavelength
+		self.n = n
+		self.slope = np.diff(n)/np.diff(wavelength)
+
+	def _index(self, wavelength):
+		interval = np.clip(np.searchsorted(self.wavelength, wavelength, side='right') - 1, 0, self.wavelength.size - 2)
+		return self.n[interval] + self.slope[interval]*(wavelength - self.wavelength[interval])
+
+
+class SellmeierMaterial(Material):
+	""" Sellmeier model: n**2 = A + sum(B*wl**2/(wl**2 - C))  [C in um**2]"""
+
+	def __init__(self, name, B, C, A=1.0, wavelengthRange=(0.0, np.inf)):
+		Material.__init__(self, name, wavelengthRange)
+		self.A = float(A)
+		self.B = np.asarray(B, dtype=float)
+		self.C = np.asarray(C, dtype=float)
+
+	def _index(self, wavelength):
+		wlSq = wavelength[..., None]**2
+		return np.sqrt(self.A + np.sum(self.B*wlSq/(wlSq - self.C), axis=-1) + 0j)
+
+
+class CauchyMaterial(Material):
+	""" Cauchy model: n = sum(coefficients[i] * wl**powers[i])  (default powers 0, -2, -4, ...)"""
+
+	def __init__(self, name, coefficients, powers=None, wavelengthRange=(0.0, np.inf)):
+		Material.__init__(self, name, wavelengthRange)
+		self.coefficients = np.asarray(coefficients, dtype=float)
+		self.powers = -2.0*np.arange(self.coefficients.size) if powers is None else np.asarray(powers, dtype=float)
+
+	def _index(self, wavelength):
+		return np.sum(self.coefficients*wavelength[..., None]**self.powers, axis=-1) + 0j
+
+
+class DrudeLorentzMaterial(Material):
+	""" Drude-Lorentz model of the permittivity, energies in eV:
+	eps = epsInf - wp**2/(w*(w + i gamma)) + sum(f * w0**2/(w0**2 - w**2 - i g*w))
+	"""
+
+	def __init__(self, name, epsInf, plasmaEnergy, damping, oscillators=(), wavelengthRange=(0.0, np.inf)):
+		Material.__init__(self, name, wavelengthRange)
+		self.epsInf = float(epsInf)
+		self.plasmaEnergy = float(plasmaEnergy)
+		self.damping = float(damping)
+		self.oscillators = np.asarray(oscillators, dtype=float).reshape(-1, 3)		# rows of (strength, energy, damping)
+
+	def _index(self, wavelength):
+		w = HC_EV_UM/wavelength
+		eps = self.epsInf - self.plasmaEnergy**2/(w*(w + 1j*self.damping))
+		if self.oscillators.size:
+			f, w0, g = self.oscillators.T
+			wCol = w[..., None]
+			eps = eps + np.sum(f*w0**2/(w0**2 - wCol**2 - 1j*g*wCol), axis=-1)
+		return np.sqrt(eps)		# principal root: k >= 0 for eps in the upper half plane
+
+
+class CompositeMaterial(Material):
+	""" sum of the indices of several materials, e.g. a formula for n plus a tabulated k"""
+
+	def __init__(self, name, parts):
+		low = max(part.wavelengthRange[0] for part in parts)
+		high = min(part.wavelengthRange[1] for part in parts)
+		Material.__init__(self, name, (low, high))
+		self.parts = tuple(parts)
+
+	def _index(self, wavelength):
+		return sum(part._index(wavelength) for part in self.parts)
+
+
+# loaders
+def loadCsv(path, name=None):
+	""" tabulated material from a CSV (or whitespace separated) file with columns wavelength [um], n and optionally k"""
+	rows = []
+	with open(path) as f:
+		for line in f:
+			fields = line.replace(',', ' ').split()
+			if not fields or line.lstrip().startswith('#'):
+				continue
+			try:
+				rows.append([float(x) for x in fields])
+			except ValueError:
+				if rows:
+					raise
+				continue		# header line
+	data = np.array(rows)
+	if data.ndim != 2 or data.shape[1] not in (2, 3):
+		raise ValueError('%s: expected columns wavelength, n[, k]' % path)
+	name = name or os.path.splitext(os.path.basename(path))[0]
+	return TabulatedMaterial(name, data[:, 0], data[:, 1], data[:, 2] if data.shape[1] == 3 else None)
+
+
+def _parseRefractiveIndexYaml(text):
+	""" DATA entries of a RefractiveIndex.info file as a list of dicts (subset of YAML used by the database)"""
+	entries = []
+	blockKey = None
+	blockIndent = None
+	inData = False
+	for line in text.splitlines():
+		stripped = line.strip()
+		indent = len(line) - len(line.lstrip())
+		if blockKey is not None:
+			if stripped and (blockIndent is None or indent >= blockIndent):
+				blockIndent = indent
+				entries[-1][blockKey] += stripped + '\n'
+				continue
+			if not stripped:
+				continue
+			blockKey = None
+		if not stripped or stripped.startswith('#'):
+			continue
+		if indent == 0:
+			inData = stripped.startswith('DATA:')
+			continue
+		if not inData:
+			continue
+		if stripped.startswith('- '):
+			entries.append({})
+			stripped = stripped[2:].strip()
+		key, _, value = stripped.partition(':')
+		value = value.strip().strip('"\'')
+		if value in ('|', '>'):
+			blockKey, blockIndent = key.strip(), None
+			entries[-1][blockKey] = ''
+		else:
+			entries[-1][key.strip()] = value
+	return entries
+
+def _formulaMaterial(name, kind, coefficients, wavelengthRange):
+	""" RefractiveIndex.info dispersion formulas 1 (Sellmeier), 2 (Sellmeier-2) and 5 (Cauchy)"""
+	c = np.asarray(coefficients, dtype=float)
+	if kind == 'formula 1':
+		return SellmeierMaterial(name, c[1::2], c[2::2]**2, 1.0 + c[0], wavelengthRange)
+	if kind == 'formula 2':
+		return SellmeierMaterial(name, c[1::2], c[2::2], 1.0 + c[0], wavelengthRange)
+	if kind == 'formula 5':
+		return CauchyMaterial(name, np.concatenate(([c[0]], c[1::2])), np.concatenate(([0.0], c[2::2])), wavelengthRange)
+	raise ValueError('%s: unsupported RefractiveIndex.info data type %r' % (name, kind))
+
+def loadRefractiveIndexYaml(path, name=None):
+	""" material from a RefractiveIndex.info database file (tabulated n / k / nk, formulas 1, 2 and 5)"""
+	with open(path) as f:
+		entries = _parseRefractiveIndexYaml(f.read())
+	if not entries:
+		raise ValueError('%s: no DATA entries' % path)
+	name = name or os.path.splitext(os.path.basename(path))[0]
+	parts = []
+	for entry in entries:
+		kind = entry.get('type', '')
+		if kind.startswith('tabulated'):
+			data = np.array([[float(x) for x in row.split()] for row in entry['data'].splitlines() if row.strip()])
+			if kind == 'tabulated nk':
+				parts.append(TabulatedMaterial(name, data[:, 0], data[:, 1], data[:, 2]))
+			elif kind == 'tabulated n':
+				parts.append(TabulatedMaterial(name, data[:, 0], data[:, 1]))
+			elif kind == 'tabulated k':
+				parts.append(TabulatedMaterial(name, data[:, 0], 0.0*data[:, 1], data[:, 1]))
+			else:
+				raise ValueError('%s: unsupported RefractiveIndex.info data type %r' % (path, kind))
+		else:
+			wavelengthRange = [float(x) for x in entry.get('wavelength_range', '0 inf').split()]
+			parts.append(_formulaMaterial(name, kind, entry['coefficients'].split(), wavelengthRange))
+	return parts[0] if len(parts) == 1 else CompositeMaterial(name, parts)
+
+def loadMaterial(path, name=None):
+	""" material from a .csv/.txt or RefractiveIndex.info .yml/.yaml file"""
+	if os.path.splitext(path)[1].lower() in ('.yml', '.yaml'):
+		return loadRefractiveIndexYaml(path, name)
+	return loadCsv(path, name)
+
+
+class MaterialDatabase:
+	""" named materials with memoized index lookups
+
+	index(name, wavelength) results are cached in a bounded LRU keyed by the material and the
+	bytes of the wavelength grid, so repeated sweeps over the same grid neither re-parse nor
+	re-interpolate. Cached arrays are read-only.
+	"""
+
+	def __init__(self, maxCacheSize=64):
+		self.materials = {}
+		self.cache = LRUCache(maxCacheSize)
+
+	def __contains__(self, name):
+		return name in self.materials
+
+	def __getitem__(self, name):
+		return self.materials[name]
+
+	def names(self):
+		return sorted(self.materials)
+
+	def add(self, material):
+		""" register (or replace) a material under its name"""
+		self.materials[material.name] = material
+		self.cache.discard(lambda key: key[0] == material.name)
+		return material
+
+	def load(self, path, name=None):
+		""" register a material read from file (see loadMaterial)"""
+		return self.add(loadMaterial(path, name))
+
+	def loadDirectory(self, directory):
+		""" register every .csv/.txt/.yml/.yaml file of a directory, named after the file"""
+		for fileName in sorted(os.listdir(directory)):
+			if os.path.splitext(fileName)[1].lower() in ('.csv', '.txt', '.yml', '.yaml'):
+				self.load(os.path.join(directory, fileName))
+
+	def index(self, name, wavelength):
+		""" complex refractive index of a registered material at wavelength [um] (memoized)"""
+		wavelength = np.ascontiguousarray(wavelength, dtype=float)
+		key = (name, wavelength.shape, wavelength.tobytes())
+		def compute():
+			n = self.materials[name].index(wavelength)
+			n.flags.writeable = False
+			return n
+		return self.cache.getOrCompute(key, compute)
+
+
+# shared default database
+database = MaterialDatabase()
+
+
+
+
+
+# test cases
+testPrecision = 0.001
+def testMaterials():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testSellmeier, testDrude, testTabulated, testCsv, testRefractiveIndexYaml, testDatabaseCache):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all MATERIALS TESTS passed? '+str(combinedTest))
+
+# fused silica, I. H. Malitson, "Interspecimen comparison of the refractive index of fused silica", J. Opt. Soc. Am. 55, 1205-1208 (1965)
+# n = 1.4585 at the helium d-line (587.6 nm)
+def testSellmeier():
+	silica = SellmeierMaterial('SiO2', (0.6961663, 0.4079426, 0.8974794), (0.0684043**2, 0.1162414**2, 9.896161**2))
+	return abs(silica.index(0.5876) - 1.4585) < testPrecision and silica.index(np.ones((3, 4))).shape == (3, 4)
+
+# free-electron metal: absorbing (k > 0) below the plasma frequency, eps -> epsInf - wp**2/w**2 without damping
+def testDrude():
+	metal = DrudeLorentzMaterial('drude', 1.0, 9.0, 0.0)
+	lorentz = DrudeLorentzMaterial('lorentz', 1.0, 9.0, 0.07, [(1.0, 3.0, 0.5)])
+	n = metal.index(np.array([0.5, 1.0]))
+	eps = 1.0 - 9.0**2/(HC_EV_UM/0.5)**2
+	return abs(n[0]**2 - eps) < testPrecision and np.all(n.imag > 0.0) and np.all(lorentz.index(np.array([0.3, 0.5, 1.0])).imag > 0.0)
+
+# gold at 582 nm as in testFresnelMetal1 of Fresnel.py, interpolated between two synthetic table entries bracketing it
+def testTabulated():
+	import Fresnel
+	gold = TabulatedMaterial('Au', [0.6, 0.564], [0.2, 0.38012], [2.9804, 2.7452])
+	n2 = gold.index(0.582)
+	nodes = gold.index(gold.wavelength)
+	outOfRange = False
+	try:
+		gold.index(0.7)
+	except ValueError:
+		outOfRange = True
+	return(
+		abs(n2 - complex(0.29006, 2.8628)) < testPrecision and \
+		np.allclose(nodes, gold.n) and outOfRange and \
+		abs(Fresnel.Rs(1.0, complex(n2), 0.87266463) - 0.92516) < testPrecision)
+
+def testCsv():
+	import tempfile
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, 'Au.csv')
+		with open(path, 'w') as f:
+			f.write('wl,n,k\n0.564,0.38012,2.7452\n0.6,0.2,2.9804\n')
+		gold = loadMaterial(path)
+	return gold.name == 'Au' and abs(gold.index(0.582) - complex(0.29006, 2.8628)) < testPrecision
+
+def testRefractiveIndexYaml():
+	import tempfile
+	tabulated = '''# comment
+REFERENCES: "test"
+DATA:
+  - type: tabulated nk
+    data: |
+        0.564 0.38012 2.7452
+        0.600 0.2 2.9804
+SPECS:
+    temperature: 20
+'''
+	formula = '''DATA:
+  - type: formula 1
+    wavelength_range: 0.21 6.7
+    coefficients: 0 0.6961663 0.0684043 0.4079426 0.1162414 0.8974794 9.896161
+  - type: tabulated k
+    data: |
+        0.21 0.001
+        6.7 0.001
+'''
+	with tempfile.TemporaryDirectory() as directory:
+		for fileName, text in (('Au.yml', tabulated), ('SiO2.yml', formula)):
+			with open(os.path.join(directory, fileName), 'w') as f:
+				f.write(text)
+		db = MaterialDatabase()
+		db.loadDirectory(directory)
+	return(
+		db.names() == ['Au', 'SiO2'] and \
+		abs(db.index('Au', 0.582) - complex(0.29006, 2.8628)) < testPrecision and \
+		abs(db.index('SiO2', 0.5876) - complex(1.4585, 0.001)) < testPrecision)
+
+# repeated grids are served from the cache, replacing a material invalidates its entries
+def testDatabaseCache():
+	db = MaterialDatabase(maxCacheSize=2)
+	db.add(CauchyMaterial('BK7-ish', (1.5046, 0.0042)))
+	wavelength = np.linspace(0.4, 0.8, 1000)
+	first = db.index('BK7-ish', wavelength)
+	second = db.index('BK7-ish', wavelength.copy())
+	db.add(ConstantMaterial('BK7-ish', 1.5))
+	third = db.index('BK7-ish', wavelength)
+	return(
+		first is second and not first.flags.writeable and \
+		np.all(third == 1.5) and \
+		db.cache.hits == 1 and db.cache.misses == 2)
+
+
+if __name__ == '__main__':
+	testMaterials()
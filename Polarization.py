@@ -0,0 +1,247 @@
+"""
+POLARIZATION
+
+Batched Jones and Mueller matrices of Fresnel interfaces and propagation of polarization states.
+Function summary:
+	Jones matrices diag(s, p) of reflection and transmission
+	Mueller matrices from Jones matrices, with a closed form for diagonal (interface) matrices
+	rotation of the s, p basis between successive planes of incidence
+	composition of chains of interfaces and propagation of Jones and Stokes vectors
+	diattenuation and retardance of matrices (the summaries of Fresnel.py)
+	test cases, including the double reflection of the Fresnel rhomb
+
+Basis and conventions: Jones vectors are (Es, Ep); Stokes vectors are
+	S = (|Es|**2 + |Ep|**2, |Es|**2 - |Ep|**2, 2 Re(Es Ep*), -2 Im(Es Ep*))
+and a Mueller matrix is M = A (J kron J*) A^-1 for the matching matrix A. Coefficients follow
+Fresnel.py (decreasing phase convention, n + i k), so a Jones matrix has phase(J[0,0]) -
+phase(J[1,1]) = Retardance(s, p).
+
+Matrices are arrays of shape (..., 2, 2) or (..., 4, 4) and vectors (..., 2) or (..., 4); the
+leading axes broadcast, so a bundle of N rays through a chain of interfaces is a few batched
+matmul calls. Rotation angles are measured from the s direction of the current plane of
+incidence to that of the next one.
+
+Test cases can be evaluated with following command:
+python3 Polarization.py
+"""
+
+from functools import reduce
+
+import numpy as np
+
+import FresnelArray
+
+
+# Stokes vector = A vec(E E*), vec(E E*) = (Es Es*, Es Ep*, Ep Es*, Ep Ep*)
+_A = np.array([[1, 0, 0, 1], [1, 0, 0, -1], [0, 1, 1, 0], [0, 1j, -1j, 0]])
+_Ainv = np.linalg.inv(_A)
+
+
+# Jones matrices
+def JonesMatrix(s, p):
+	""" diagonal Jones matrix diag(s, p) (..., 2, 2) of s and p coefficients"""
+	s, p = np.broadcast_arrays(np.asarray(s, dtype=complex), np.asarray(p, dtype=complex))
+	jones = np.zeros(s.shape + (2, 2), dtype=complex)
+	jones[..., 0, 0] = s
+	jones[..., 1, 1] = p
+	return jones
+
+def _transmissionScale(t, T):
+	""" sqrt(T/|t|**2): amplitude factor turning a transmission coefficient into an irradiance amplitude"""
+	tSq = FresnelArray._absSq(t)
+	return np.sqrt(np.divide(T, tSq, out=np.zeros(np.shape(tSq)), where=tSq > 0.0))
+
+def _transmission(nInc, nSub, thetaInc, irradiance):
+	with np.errstate(all='ignore'):
+		coef = FresnelArray.FresnelAll(nInc, nSub, thetaInc)
+	if irradiance:
+		return coef.ts*_transmissionScale(coef.ts, coef.Ts), coef.tp*_transmissionScale(coef.tp, coef.Tp)
+	return coef.ts, coef.tp
+
+def ReflectionJones(nInc, nSub, thetaInc):
+	""" Jones matrix diag(rs, rp) of reflection"""
+	with np.errstate(all='ignore'):
+		return JonesMatrix(FresnelArray.rs(nInc, nSub, thetaInc), FresnelArray.rp(nInc, nSub, thetaInc))
+
+def TransmissionJones(nInc, nSub, thetaInc, irradiance=False):
+	""" Jones matrix diag(ts, tp) of transmission
+
+	With irradiance=True the coefficients are scaled to sqrt(Ts)/|ts| ts and sqrt(Tp)/|tp| tp, so
+	|J E|**2 is the transmitted irradiance (as Ts, Tp: per unit incident irradiance).
+	"""
+	return JonesMatrix(*_transmission(nInc, nSub, thetaInc, irradiance))
+
+
+# Mueller matrices
+def Mueller(jones):
+	""" Mueller matrix (..., 4, 4) of any Jones matrix (..., 2, 2)"""
+	jones = np.asarray(jones, dtype=complex)
+	kron = np.einsum('...ij,...kl->...ikjl', jones, np.conj(jones)).reshape(jones.shape[:-2] + (4, 4))
+	return (_A @ kron @ _Ainv).real
+
+def DiagonalMueller(s, p):
+	""" Mueller matrix of diag(s, p) in closed form (same as Mueller(JonesMatrix(s, p)))"""
+	s, p = np.broadcast_arrays(np.asarray(s, dtype=complex), np.asarray(p, dtype=complex))
+	sSq, pSq = FresnelArray._absSq(s), FresnelArray._absSq(p)
+	c = s*np.conj(p)
+	mueller = np.zeros(s.shape + (4, 4))
+	mueller[..., 0, 0] = mueller[..., 1, 1] = 0.5*(sSq + pSq)
+	mueller[..., 0, 1] = mueller[..., 1, 0] = 0.5*(sSq - pSq)
+	mueller[..., 2, 2] = mueller[..., 3, 3] = c.real
+	mueller[..., 2, 3] = c.imag
+	mueller[..., 3, 2] = -c.imag
+	return mueller
+
+def ReflectionMueller(nInc, nSub, thetaInc):
+	""" Mueller matrix of reflection"""
+	with np.errstate(all='ignore'):
+		return DiagonalMueller(FresnelArray.rs(nInc, nSub, thetaInc), FresnelArray.rp(nInc, nSub, thetaInc))
+
+def TransmissionMueller(nInc, nSub, thetaInc, irradiance=False):
+	""" Mueller matrix of transmission (irradiance=True: M[0,0] of unpolarized light is (Ts + Tp)/2)"""
+	return DiagonalMueller(*_transmission(nInc, nSub, thetaInc, irradiance))
+
+
+# rotations and composition
+def JonesRotation(angle):
+	""" Jones matrix (..., 2, 2) taking (Es, Ep) to the basis rotated by angle [radians]"""
+	c, s = np.cos(angle), np.sin(angle)
+	return np.stack((np.stack((c, s), axis=-1), np.stack((-s, c), axis=-1)), axis=-2) + 0j
+
+def MuellerRotation(angle):
+	""" Mueller matrix (..., 4, 4) taking Stokes vectors to the basis rotated by angle [radians]"""
+	c, s = np.cos(2.0*np.asarray(angle, dtype=float)), np.sin(2.0*np.asarray(angle, dtype=float))
+	rotation = np.zeros(np.shape(c) + (4, 4))
+	rotation[..., 0, 0] = rotation[..., 3, 3] = 1.0
+	rotation[..., 1, 1] = rotation[..., 2, 2] = c
+	rotation[..., 1, 2] = s
+	rotation[..., 2, 1] = -s
+	return rotation
+
+def Rotated(matrix, angle):
+	""" Jones or Mueller matrix of an element whose s direction is rotated by angle from the current basis"""
+	matrix = np.asarray(matrix)
+	rotation = JonesRotation if matrix.shape[-1] == 2 else MuellerRotation
+	return rotation(-np.asarray(angle)) @ matrix @ rotation(angle)
+
+def Chain(*matrices):
+	""" product of Jones or Mueller matrices in propagation order (first element first)"""
+	return reduce(lambda total, matrix: np.matmul(matrix, total), matrices)
+
+def Propagate(matrix, vectors):
+	""" Jones or Stokes vectors (..., 2) or (..., 4) after the matrix (broadcast over leading axes)"""
+	return np.matmul(matrix, np.asarray(vectors)[..., None])[..., 0]
+
+
+# polarization states and summaries
+def Stokes(jonesVector):
+	""" Stokes vector (..., 4) of Jones vectors (..., 2)"""
+	es, ep = np.moveaxis(np.asarray(jonesVector, dtype=complex), -1, 0)
+	c = es*np.conj(ep)
+	sSq, pSq = FresnelArray._absSq(es), FresnelArray._absSq(ep)
+	return np.stack((sSq + pSq, sSq - pSq, 2.0*c.real, -2.0*c.imag), axis=-1)
+
+def LinearStokes(angle, intensity=1.0):
+	""" Stokes vector of linear polarization at angle [radians] from the s direction"""
+	angle = np.asarray(angle, dtype=float)
+	intensity = np.broadcast_to(intensity, angle.shape)
+	return np.stack((intensity, intensity*np.cos(2.0*angle), intensity*np.sin(2.0*angle), np.zeros(angle.shape)), axis=-1)
+
+def MuellerDiattenuation(mueller):
+	""" diattenuation of Mueller matrices (Fresnel.Diattenuation(Rs, Rp) for an interface)"""
+	mueller = np.asarray(mueller)
+	return np.sqrt(np.sum(mueller[..., 0, 1:]**2, axis=-1))/mueller[..., 0, 0]
+
+def JonesRetardance(jones):
+	""" retardance phase(J[0,0]) - phase(J[1,1]) of diagonal Jones matrices [radians] (Fresnel.Retardance)"""
+	jones = np.asarray(jones)
+	return np.angle(jones[..., 0, 0]) - np.angle(jones[..., 1, 1])
+
+
+
+
+
+# test cases
+testPrecision = 1e-12
+def testPolarization():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testMueller, testSummaries, testTransmission, testRotation, testFresnelRhomb, testRayBundle):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all POLARIZATION TESTS passed? '+str(combinedTest))
+
+# closed form against A (J kron J*) A^-1 and Stokes vectors of propagated Jones vectors
+def testMueller():
+	rng = np.random.default_rng(2022)
+	s = rng.normal(size=50) + 1j*rng.normal(size=50)
+	p = rng.normal(size=50) + 1j*rng.normal(size=50)
+	jones = JonesMatrix(s, p) @ JonesRotation(rng.random(50))
+	field = rng.normal(size=(50, 2)) + 1j*rng.normal(size=(50, 2))
+	return(
+		np.allclose(DiagonalMueller(s, p), Mueller(JonesMatrix(s, p)), atol=testPrecision) and \
+		np.allclose(Stokes(Propagate(jones, field)), Propagate(Mueller(jones), Stokes(field)), atol=testPrecision))
+
+# an interface reproduces Fresnel.py: unpolarized reflectance, diattenuation and retardance
+def testSummaries():
+	import Fresnel
+	nSub = complex(2.007, 3.781)
+	thetaInc = 1.0471976
+	jones = ReflectionJones(1.0, nSub, thetaInc)
+	mueller = ReflectionMueller(1.0, nSub, thetaInc)
+	unpolarized = Propagate(mueller, [1.0, 0.0, 0.0, 0.0])
+	Rs, Rp = Fresnel.Rs(1.0, nSub, thetaInc), Fresnel.Rp(1.0, nSub, thetaInc)
+	return(
+		abs(unpolarized[0] - 0.5*(Rs + Rp)) < testPrecision and \
+		abs(MuellerDiattenuation(mueller) - Fresnel.Diattenuation(Rs, Rp)) < testPrecision and \
+		abs(JonesRetardance(jones) - Fresnel.Retardance(Fresnel.rs(1.0, nSub, thetaInc), Fresnel.rp(1.0, nSub, thetaInc))) < testPrecision)
+
+# irradiance-normalized transmission conserves energy with reflection for lossless media
+def testTransmission():
+	thetaInc = np.linspace(0.0, 1.5, 31)
+	stokes = LinearStokes(np.linspace(0.0, np.pi, 31))
+	reflected = Propagate(ReflectionMueller(1.0, 1.5, thetaInc), stokes)
+	transmitted = Propagate(TransmissionMueller(1.0, 1.5, thetaInc, irradiance=True), stokes)
+	amplitude = TransmissionJones(1.0, 1.5, thetaInc)
+	return(
+		np.allclose(reflected[:, 0] + transmitted[:, 0], 1.0, atol=testPrecision) and \
+		np.allclose(amplitude[:, 0, 0], FresnelArray.ts(1.0, 1.5, thetaInc), atol=testPrecision))
+
+# a rotated element equals the element acting on rotated coordinates; rotating a linear state
+def testRotation():
+	angle = 0.3
+	element = ReflectionMueller(1.0, 1.5, 1.2)
+	return(
+		np.allclose(Rotated(element, angle), MuellerRotation(-angle) @ element @ MuellerRotation(angle), atol=testPrecision) and \
+		np.allclose(Propagate(MuellerRotation(angle), LinearStokes(0.5)), LinearStokes(0.5 - angle), atol=testPrecision) and \
+		np.allclose(Mueller(Rotated(ReflectionJones(1.0, 1.5, 1.2), angle)), Rotated(element, angle), atol=testPrecision))
+
+# two total internal reflections at n = 1.51 (testFresnelRhomb of Fresnel.py), 1/8 wave each:
+# linear polarization at 45 degrees leaves circularly polarized
+def testFresnelRhomb():
+	reflection = ReflectionJones(1.51, 1.0, 0.84852090)
+	rhomb = Chain(reflection, reflection)
+	stokes = Propagate(Chain(ReflectionMueller(1.51, 1.0, 0.84852090), ReflectionMueller(1.51, 1.0, 0.84852090)), LinearStokes(np.pi/4))
+	return(
+		abs(np.mod(JonesRetardance(rhomb), 2*np.pi) - np.pi/2) < 0.001 and \
+		abs(stokes[0] - 1.0) < testPrecision and abs(abs(stokes[3]) - 1.0) < 1e-5 and abs(stokes[2]) < 0.001)
+
+# 10^5 rays with individual angles through a rotated two-interface chain, against a per-ray loop
+def testRayBundle():
+	rng = np.random.default_rng(2023)
+	nRays = 100000
+	theta1, theta2 = rng.random(nRays)*1.5, rng.random(nRays)*1.5
+	rotation = rng.random(nRays)*np.pi
+	stokes = LinearStokes(rng.random(nRays)*np.pi)
+	chain = Chain(ReflectionMueller(1.0, complex(0.29006, 2.8628), theta1), MuellerRotation(rotation), TransmissionMueller(1.0, 1.5, theta2, irradiance=True))
+	out = Propagate(chain, stokes)
+	check = []
+	for i in (0, 17, nRays - 1):
+		single = Chain(ReflectionMueller(1.0, complex(0.29006, 2.8628), theta1[i]), MuellerRotation(rotation[i]), TransmissionMueller(1.0, 1.5, theta2[i], irradiance=True))
+		check.append(np.allclose(Propagate(single, stokes[i]), out[i], atol=testPrecision))
+	return out.shape == (nRays, 4) and all(check) and np.all(out[:, 0] + 1e-12 >= np.sqrt(np.sum(out[:, 1:]**2, axis=-1)))
+
+
+if __name__ == '__main__':
+	testPolarization()
@@ -0,0 +1,263 @@
+"""
+RESULT STORE
+
+Columnar on-disk store for Fresnel sweep inputs and outputs, reopened by memory mapping.
+Function summary:
+	ResultStore: create, append, reopen and slice a store
+	StoreSweep: stream a sweep into a new store
+	test cases
+
+Layout of a store directory:
+	index.json		format version, row count, column names/dtypes/files and free-form metadata
+	<column>.raw	one raw little-endian block per column (float64 or complex128), no header
+
+Standard columns are the inputs nInc, nSub, thetaInc, wavelength (optional) and the fields of
+FresnelArray.FresnelCoefficients; any other name may be added with an explicit dtype.
+Reopening a store maps every column with np.memmap, so no data is read until it is sliced and
+a slice reads only the pages it touches. The row count in index.json is updated by flush() and
+close(), so rows appended after the last flush of an interrupted writer are ignored on reopen.
+
+Test cases can be evaluated with following command:
+python3 ResultStore.py
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+FORMAT_VERSION = 1
+INDEX_FILE = 'index.json'
+COMPLEX_COLUMNS = ('nSub', 'rs', 'rp', 'ts', 'tp')
+
+
+def columnDtype(name):
+	""" default dtype of a standard column"""
+	return np.dtype('<c16' if name in COMPLEX_COLUMNS else '<f8')
+
+
+class ResultStore:
+	""" columnar store of equal-length 1-D columns backed by raw files in a directory
+
+	ResultStore(path) opens an existing store read-only (mode='r') or for appending (mode='a');
+	ResultStore.create(path, columns) makes a new one.
+	"""
+
+	def __init__(self, path, mode='r'):
+		if mode not in ('r', 'a'):
+			raise ValueError("mode must be 'r' or 'a'")
+		self.path = path
+		self.mode = mode
+		with open(os.path.join(path, INDEX_FILE)) as f:
+			index = json.load(f)
+		if index.get('format') != FORMAT_VERSION:
+			raise ValueError('%s: unsupported store format %r' % (path, index.get('format')))
+		self.length = index['length']
+		self.metadata = index.get('metadata', {})
+		self.dtypes = {name: np.dtype(spec['dtype']) for name, spec in index['columns'].items()}
+		self._files = {}
+		self._maps = {}
+		if mode == 'a':
+			for name in self.dtypes:
+				f = open(self._columnPath(name), 'r+b')
+				f.truncate(self.length*self.dtypes[name].itemsize)		# drop rows written after the last flush
+				f.seek(0, os.SEEK_END)
+				self._files[name] = f
+
+	@classmethod
+	def create(cls, path, columns, metadata=None):
+		""" new empty store; columns is a list of standard column names or a dict {name: dtype}"""
+		if not isinstance(columns, dict):
+			columns = {name: columnDtype(name) for name in columns}
+		os.makedirs(path, exist_ok=True)
+		if os.path.exists(os.path.join(path, INDEX_FILE)):
+			raise FileExistsError('%s already holds a result store' % path)
+		for name in columns:
+			open(os.path.join(path, name+'.raw'), 'wb').close()
+		cls._writeIndex(path, 0, {name: np.dtype(dtype) for name, dtype in columns.items()}, metadata or {})
+		return cls(path, 'a')
+
+	@staticmethod
+	def _writeIndex(path, length, dtypes, metadata):
+		index = dict(format=FORMAT_VERSION, length=length, metadata=metadata,
+			columns={name: dict(dtype=dtype.str, file=name+'.raw') for name, dtype in dtypes.items()})
+		temporary = os.path.join(path, INDEX_FILE+'.tmp')
+		with open(temporary, 'w') as f:
+			json.dump(index, f, indent=1)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(temporary, os.path.join(path, INDEX_FILE))
+
+	def _columnPath(self, name):
+		return os.path.join(self.path, name+'.raw')
+
+	def __len__(self):
+		return self.length
+
+	def __contains__(self, name):
+		return name in self.dtypes
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	@property
+	def columns(self):
+		return list(self.dtypes)
+
+	def append(self, chunk):
+		""" append equal-length arrays {column: values} for every column of the store"""
+		if self.mode != 'a':
+			raise ValueError('store is opened read-only')
+		missing = set(self.dtypes) - set(chunk)
+		if missing:
+			raise ValueError('missing columns %s' % sorted(missing))
+		lengths = {np.size(chunk[name]) for name in self.dtypes}
+		if len(lengths) != 1:
+			raise ValueError('columns of a chunk must have equal lengths')
+		# convert every column before writing any, so a failing column leaves the files untouched
+		arrays = {}
+		for name, dtype in self.dtypes.items():
+			if np.iscomplexobj(chunk[name]) and dtype.kind != 'c':
+				raise ValueError('complex values for the real column %s' % name)
+			arrays[name] = np.ascontiguousarray(chunk[name], dtype=dtype).ravel()
+		for name, values in arrays.items():
+			values.tofile(self._files[name])
+		self.length += lengths.pop()
+		self._maps.clear()
+
+	def flush(self):
+		""" make appended rows durable and visible to readers: column files are synced before the index counts their rows"""
+		for f in self._files.values():
+			f.flush()
+			os.fsync(f.fileno())
+		self._writeIndex(self.path, self.length, self.dtypes, self.metadata)
+
+	def close(self):
+		if self.mode == 'a' and self._files:
+			self.flush()
+			for f in self._files.values():
+				f.close()
+			self._files = {}
+		self._maps.clear()
+
+	def __getitem__(self, name):
+		""" memory-mapped column (read-only, zero-copy)"""
+		if name not in self._maps:
+			if name not in self.dtypes:
+				raise KeyError(name)
+			if self.length == 0:
+				self._maps[name] = np.empty(0, dtype=self.dtypes[name])
+			else:
+				if self._files:
+					self._files[name].flush()
+				self._maps[name] = np.memmap(self._columnPath(name), dtype=self.dtypes[name], mode='r', shape=(self.length,))
+		return self._maps[name]
+
+	def read(self, start=None, stop=None, columns=None):
+		""" {column: slice} for rows [start, stop) (views into the mapped files)"""
+		return {name: self[name][start:stop] for name in (columns or self.columns)}
+
+
+def StoreSweep(path, chunks, quantities=('Rs', 'Rp', 'Ts', 'Tp'), metadata=None, flushEvery=16):
+	""" evaluate (nInc, nSub, thetaInc) chunks (see Stream.py) into a new store with input and result columns"""
+	import Stream
+	with ResultStore.create(path, ['nInc', 'nSub', 'thetaInc'] + list(quantities), metadata) as store:
+		for count, result in enumerate(Stream.StreamEvaluate(chunks, quantities, includeInputs=True), 1):
+			store.append(result)
+			if count % flushEvery == 0:
+				store.flush()
+	return ResultStore(path)
+
+
+
+
+
+# test cases
+def testResultStore():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testRoundTrip, testRejectedChunk, testInterruptedWriter, testStoreSweep):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all RESULT STORE TESTS passed? '+str(combinedTest))
+
+def testRoundTrip():
+	import tempfile
+	wavelength = np.linspace(0.4, 0.8, 1000)
+	nSub = 1.5 + 0.01j*wavelength
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, 'store')
+		with ResultStore.create(path, ['wavelength', 'nSub', 'Rs'], metadata=dict(nInc=1.0)) as store:
+			store.append(dict(wavelength=wavelength[:400], nSub=nSub[:400], Rs=wavelength[:400]**2))
+			store.append(dict(wavelength=wavelength[400:], nSub=nSub[400:], Rs=wavelength[400:]**2))
+		store = ResultStore(path)
+		part = store.read(100, 110, ['nSub'])
+		ok = (
+			len(store) == 1000 and store.metadata == dict(nInc=1.0) and \
+			isinstance(store['Rs'], np.memmap) and \
+			np.array_equal(store['wavelength'], wavelength) and \
+			np.array_equal(part['nSub'], nSub[100:110]) and list(part) == ['nSub'])
+		store.close()
+		with ResultStore(path, 'a') as store:
+			store.append(dict(wavelength=[1.0], nSub=[2.0], Rs=[3.0]))
+		ok = ok and len(ResultStore(path)) == 1001 and ResultStore(path)['nSub'][-1] == 2.0
+	return ok
+
+# rows appended after the last flush are not visible and are discarded by the next writer
+# a chunk that fails to convert leaves every column file and the row count unchanged
+def testRejectedChunk():
+	import tempfile
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, 'store')
+		rejected = 0
+		with ResultStore.create(path, dict(nSub='<c16', Rs='<f8', label='<f8')) as store:
+			store.append(dict(nSub=[1.5], Rs=[0.04], label=[1.0]))
+			for chunk in (dict(nSub=[1.6], Rs=[0.05], label=['abc']), dict(nSub=[1.6], Rs=[0.05+0.1j], label=[2.0])):
+				try:
+					store.append(chunk)
+				except ValueError:
+					rejected += 1
+			store.append(dict(nSub=[1.7], Rs=[0.06], label=[3.0]))
+		store = ResultStore(path)
+		return(
+			rejected == 2 and len(store) == 2 and \
+			all(os.path.getsize(store._columnPath(name)) == 2*store.dtypes[name].itemsize for name in store.columns) and \
+			np.array_equal(store['nSub'], [1.5, 1.7]) and np.array_equal(store['label'], [1.0, 3.0]))
+
+def testInterruptedWriter():
+	import tempfile
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, 'store')
+		store = ResultStore.create(path, ['Rs'])
+		store.append(dict(Rs=np.ones(10)))
+		store.flush()
+		store.append(dict(Rs=np.zeros(5)))
+		for f in store._files.values():
+			f.flush()					# data on disk, index not updated
+		visible = len(ResultStore(path))
+		with ResultStore(path, 'a') as writer:
+			writer.append(dict(Rs=np.full(2, 7.0)))
+		reopened = ResultStore(path)
+		return visible == 10 and np.array_equal(reopened['Rs'], np.r_[np.ones(10), 7.0, 7.0])
+
+def testStoreSweep():
+	import tempfile
+	import FresnelArray, Stream
+	thetaInc = np.linspace(0.0, 1.5, 5000)
+	with tempfile.TemporaryDirectory() as directory:
+		store = StoreSweep(os.path.join(directory, 'sweep'), Stream.iterArrayChunks(1.0, complex(2.007, 3.781), thetaInc, 512), ('rs', 'Tp'), flushEvery=3)
+		expected = FresnelArray.FresnelAll(1.0, complex(2.007, 3.781), thetaInc)
+		return(
+			store.columns == ['nInc', 'nSub', 'thetaInc', 'rs', 'Tp'] and \
+			np.array_equal(store['thetaInc'], thetaInc) and \
+			np.allclose(store['rs'], expected.rs, rtol=1e-12, atol=1e-12) and \
+			np.allclose(store['Tp'][1000:1010], expected.Tp[1000:1010], rtol=1e-12, atol=1e-12))
+
+
+if __name__ == '__main__':
+	testResultStore()
@@ -0,0 +1,272 @@
+"""
+STREAM
+
+Chunked, bounded-memory evaluation of (nInc, nSub, thetaInc) triples.
+Function summary:
+	chunk readers: arrays, iterators of triples, CSV files, memory-mapped binary files, binary streams
+	StreamEvaluate: generator of per-chunk results from FresnelArray.FresnelAll
+	incremental CSV and binary writers
+	StreamFile: file-to-file evaluation
+	test cases
+
+A chunk is a tuple of 1-D arrays (nInc, nSub, thetaInc) with at most chunkSize entries; results
+are dicts {quantity: 1-D array} for the fields of FresnelArray.FresnelCoefficients. Peak memory
+is set by chunkSize (roughly 0.5 kB per point for all quantities), not by the dataset size.
+
+File formats:
+	CSV input: columns nInc, nSubReal, nSubImag, thetaInc [radians]; an optional header line
+	binary input: packed records of INPUT_DTYPE (little-endian float64 nInc, complex128 nSub, float64 thetaInc)
+	CSV output: one column per quantity (complex quantities as Real and Imag columns), header line
+	binary output: packed records with one field per quantity (complex128 or float64)
+
+Test cases can be evaluated with following command:
+python3 Stream.py
+"""
+
+import csv
+from contextlib import nullcontext
+from itertools import islice
+
+import numpy as np
+
+import FresnelArray
+
+
+INPUT_DTYPE = np.dtype([('nInc', '<f8'), ('nSub', '<c16'), ('thetaInc', '<f8')])
+COMPLEX_QUANTITIES = ('rs', 'rp', 'ts', 'tp')
+DEFAULT_CHUNK = 1 << 16
+
+
+# chunk readers
+def iterArrayChunks(nInc, nSub, thetaInc, chunkSize=DEFAULT_CHUNK):
+	""" chunks of broadcast arrays (views, no copy of the full arrays)"""
+	nInc, nSub, thetaInc = (np.ravel(x) for x in np.broadcast_arrays(nInc, nSub, thetaInc))
+	for start in range(0, nInc.size, chunkSize):
+		yield nInc[start:start+chunkSize], nSub[start:start+chunkSize], thetaInc[start:start+chunkSize]
+
+def iterTriples(triples, chunkSize=DEFAULT_CHUNK):
+	""" chunks from any iterable of (nInc, nSub, thetaInc) tuples, consumed lazily"""
+	triples = iter(triples)
+	while True:
+		block = list(islice(triples, chunkSize))
+		if not block:
+			return
+		nInc, nSub, thetaInc = zip(*block)
+		yield np.array(nInc, dtype=float), np.array(nSub, dtype=complex), np.array(thetaInc, dtype=float)
+
+def _openText(file, mode):
+	""" context manager for a path or an already open text file (left open, e.g. sys.stdin)"""
+	if hasattr(file, 'read') or hasattr(file, 'write'):
+		return nullcontext(file)
+	return open(file, mode, newline='')
+
+def iterCsvChunks(path, chunkSize=DEFAULT_CHUNK):
+	""" chunks of a CSV file (path or open text file) with columns nInc, nSubReal, nSubImag, thetaInc"""
+	with _openText(path, 'r') as f:
+		name = getattr(f, 'name', path)
+		reader = csv.reader(f)
+		rows = ((reader.line_num, row) for row in reader if row and not row[0].lstrip().startswith('#'))
+
+		def parse(lineNumber, row):
+			if len(row) != 4:
+				raise ValueError('%s: expected columns nInc, nSubReal, nSubImag, thetaInc (line %d has %d)' % (name, lineNumber, len(row)))
+			try:
+				return [float(x) for x in row]
+			except ValueError:
+				raise ValueError('%s: expected columns nInc, nSubReal, nSubImag, thetaInc (line %d is not numeric: %s)' % (name, lineNumber, ','.join(row))) from None
+
+		first = next(rows, None)
+		if first is None:
+			return
+		try:
+			[float(x) for x in first[1]]
+		except ValueError:
+			pending = []		# header line
+		else:
+			pending = [parse(*first)]
+		while True:
+			block = pending + [parse(*row) for row in islice(rows, chunkSize - len(pending))]
+			pending = []
+			if not block:
+				return
+			data = np.array(block, dtype=float)
+			yield data[:, 0], data[:, 1] + 1j*data[:, 2], data[:, 3]
+
+def iterBinaryChunks(path, chunkSize=DEFAULT_CHUNK):
+	""" chunks of a memory-mapped file of INPUT_DTYPE records; pages are read only as each chunk is used"""
+	records = np.memmap(path, dtype=INPUT_DTYPE, mode='r')
+	for start in range(0, records.size, chunkSize):
+		chunk = records[start:start+chunkSize]
+		yield chunk['nInc'], chunk['nSub'], chunk['thetaInc']
+
+def iterBinaryStream(f, chunkSize=DEFAULT_CHUNK):
+	""" chunks of INPUT_DTYPE records read sequentially from a binary file object (e.g. sys.stdin.buffer)"""
+	while True:
+		data = f.read(chunkSize*INPUT_DTYPE.itemsize)
+		if not data:
+			return
+		while len(data) % INPUT_DTYPE.itemsize:
+			more = f.read(INPUT_DTYPE.itemsize - len(data) % INPUT_DTYPE.itemsize)
+			if not more:
+				raise ValueError('truncated input record')
+			data += more
+		chunk = np.frombuffer(data, dtype=INPUT_DTYPE)
+		yield chunk['nInc'], chunk['nSub'], chunk['thetaInc']
+
+def writeBinaryInputs(path, nInc, nSub, thetaInc):
+	""" write (nInc, nSub, thetaInc) arrays as INPUT_DTYPE records (append to build large files piecewise)"""
+	nInc, nSub, thetaInc = (np.ravel(x) for x in np.broadcast_arrays(nInc, nSub, thetaInc))
+	records = np.empty(nInc.size, dtype=INPUT_DTYPE)
+	records['nInc'], records['nSub'], records['thetaInc'] = nInc, nSub, thetaInc
+	with open(path, 'ab') as f:
+		records.tofile(f)
+
+
+# evaluation
+def StreamEvaluate(chunks, quantities=('Rs', 'Rp', 'Ts', 'Tp'), includeInputs=False):
+	""" generator of {quantity: array} per input chunk (with nInc, nSub, thetaInc when includeInputs)"""
+	for name in quantities:
+		if name not in FresnelArray.FresnelCoefficients._fields:
+			raise ValueError('unknown quantity %r; choose from %s' % (name, FresnelArray.FresnelCoefficients._fields))
+	for nInc, nSub, thetaInc in chunks:
+		with np.errstate(all='ignore'):
+			coef = FresnelArray.FresnelAll(nInc, nSub, thetaInc)
+		result = {name: getattr(coef, name) for name in quantities}
+		if includeInputs:
+			result = dict(nInc=np.asarray(nInc), nSub=np.asarray(nSub), thetaInc=np.asarray(thetaInc), **result)
+		yield result
+
+
+# writers
+def _csvColumns(names):
+	columns = []
+	for name in names:
+		columns += [name+'Real', name+'Imag'] if name in COMPLEX_QUANTITIES + ('nSub',) else [name]
+	return columns
+
+def writeCsv(results, path):
+	""" write result chunks to a CSV file (path or open text file) as they arrive; returns the number of rows"""
+	count = 0
+	with _openText(path, 'w') as f:
+		writer = None
+		for result in results:
+			if writer is None:
+				writer = csv.writer(f)
+				writer.writerow(_csvColumns(result))
+			columns = []
+			for name, values in result.items():
+				columns += [values.real, values.imag] if np.iscomplexobj(values) else [values]
+			writer.writerows(np.column_stack(columns).tolist())
+			count += len(columns[0])
+	return count
+
+def outputDtype(names):
+	""" record dtype of binary output for the given result names"""
+	return np.dtype([(name, '<c16' if name in COMPLEX_QUANTITIES + ('nSub',) else '<f8') for name in names])
+
+def writeBinary(results, path):
+	""" write result chunks as packed records (see outputDtype) to a path or binary file object; returns the number of records"""
+	count = 0
+	with (nullcontext(path) if hasattr(path, 'write') else open(path, 'wb')) as f:
+		for result in results:
+			records = np.empty(len(next(iter(result.values()))), dtype=outputDtype(result))
+			for name, values in result.items():
+				records[name] = values
+			f.write(records.tobytes())
+			count += records.size
+	return count
+
+
+def iterFileChunks(path, chunkSize=DEFAULT_CHUNK):
+	""" chunk reader chosen by extension: .csv/.txt as CSV, anything else as INPUT_DTYPE records"""
+	if path.lower().endswith(('.csv', '.txt')):
+		return iterCsvChunks(path, chunkSize)
+	return iterBinaryChunks(path, chunkSize)
+
+def StreamFile(inputPath, outputPath, quantities=('Rs', 'Rp', 'Ts', 'Tp'), chunkSize=DEFAULT_CHUNK, includeInputs=False):
+	""" evaluate an input file chunk by chunk into an output file (CSV for .csv/.txt, records otherwise); returns the row count"""
+	results = StreamEvaluate(iterFileChunks(inputPath, chunkSize), quantities, includeInputs)
+	if outputPath.lower().endswith(('.csv', '.txt')):
+		return writeCsv(results, outputPath)
+	return writeBinary(results, outputPath)
+
+
+
+
+
+# test cases
+def testStream():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testChunking, testCsvFiles, testMalformedCsv, testBinaryFiles):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all STREAM TESTS passed? '+str(combinedTest))
+
+def randomTriples(nTrials, seed=2022):
+	"""helper function: random metal triples, as in the former time test of Fresnel.py"""
+	rng = np.random.default_rng(seed)
+	return rng.random(nTrials)*2.0 + 0.1, rng.random(nTrials)*2.0 + 1j*rng.random(nTrials)*10.0, rng.random(nTrials)*1.5
+
+# chunk boundaries must not change results; iterators are consumed lazily
+def testChunking():
+	import itertools
+	nInc, nSub, thetaInc = randomTriples(1000)
+	expected = FresnelArray.FresnelAll(nInc, nSub, thetaInc)
+	chunks = list(StreamEvaluate(iterArrayChunks(nInc, nSub, thetaInc, 300), ('Ts', 'rp')))
+	endless = itertools.cycle(zip(nInc.tolist(), nSub.tolist(), thetaInc.tolist()))
+	first = next(StreamEvaluate(iterTriples(endless, 250), ('Ts',)))
+	return(
+		[len(c['Ts']) for c in chunks] == [300, 300, 300, 100] and \
+		np.array_equal(np.concatenate([c['Ts'] for c in chunks]), expected.Ts) and \
+		np.array_equal(np.concatenate([c['rp'] for c in chunks]), expected.rp) and \
+		np.allclose(first['Ts'], expected.Ts[:250]))
+
+def testCsvFiles():
+	import os, tempfile
+	nInc, nSub, thetaInc = randomTriples(500)
+	with tempfile.TemporaryDirectory() as directory:
+		inputPath = os.path.join(directory, 'in.csv')
+		np.savetxt(inputPath, np.column_stack((nInc, nSub.real, nSub.imag, thetaInc)), delimiter=',', header='nInc,nSubReal,nSubImag,thetaInc', comments='')
+		outputPath = os.path.join(directory, 'out.csv')
+		count = StreamFile(inputPath, outputPath, ('Rs', 'rs'), chunkSize=64)
+		with open(outputPath) as f:
+			header = f.readline().strip()
+		data = np.loadtxt(outputPath, delimiter=',', skiprows=1)
+	expected = FresnelArray.FresnelAll(nInc, nSub, thetaInc)
+	return(
+		count == 500 and header == 'Rs,rsReal,rsImag' and \
+		np.allclose(data[:, 0], expected.Rs) and np.allclose(data[:, 1] + 1j*data[:, 2], expected.rs))
+
+# ragged and non-numeric rows are reported with their line number
+def testMalformedCsv():
+	import io
+	messages = []
+	for text in ('nInc,nSubReal,nSubImag,thetaInc\n1.0,1.5,0.0,0.1\n1.0,1.5\n', '1.0,1.5,0.0,0.1\n# comment\n1.0,abc,0.0,0.2\n'):
+		try:
+			list(iterCsvChunks(io.StringIO(text)))
+		except ValueError as error:
+			messages.append(str(error))
+	return(
+		len(messages) == 2 and all('expected columns nInc, nSubReal, nSubImag, thetaInc' in message for message in messages) and \
+		'line 3 has 2' in messages[0] and 'line 3 is not numeric' in messages[1])
+
+def testBinaryFiles():
+	import os, tempfile
+	nInc, nSub, thetaInc = randomTriples(1000)
+	with tempfile.TemporaryDirectory() as directory:
+		inputPath = os.path.join(directory, 'in.bin')
+		writeBinaryInputs(inputPath, nInc[:600], nSub[:600], thetaInc[:600])
+		writeBinaryInputs(inputPath, nInc[600:], nSub[600:], thetaInc[600:])
+		outputPath = os.path.join(directory, 'out.bin')
+		count = StreamFile(inputPath, outputPath, ('Tp', 'ts'), chunkSize=128, includeInputs=True)
+		records = np.fromfile(outputPath, dtype=outputDtype(('nInc', 'nSub', 'thetaInc', 'Tp', 'ts')))
+	expected = FresnelArray.FresnelAll(nInc, nSub, thetaInc)
+	return(
+		count == 1000 and np.array_equal(records['nSub'], nSub) and \
+		np.array_equal(records['Tp'], expected.Tp) and np.array_equal(records['ts'], expected.ts))
+
+
+if __name__ == '__main__':
+	testStream()
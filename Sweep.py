@@ -0,0 +1,203 @@
+"""
+SWEEP
+
+Multi-core evaluation of large (nInc, nSub, thetaInc) sweeps with FresnelArray.FresnelAll.
+Function summary:
+	SweepGrid: outer product of 1-D grids of nInc, nSub and thetaInc
+	SweepPoints: equal-length arrays of (nInc, nSub, thetaInc) triples
+	process-pool backend with inputs and results in shared memory
+	thread backend (NumPy releases the GIL inside its array operations)
+	test cases against a single-process evaluation
+
+Work is split into contiguous chunks of the flattened sweep. Every worker writes its chunk
+straight into preallocated shared result arrays, one per quantity in its own dtype (float64 or
+complex128), so nothing but the chunk bounds is pickled per task. Results are returned as a dict
+{quantity: ndarray}; the process backend copies them out of shared memory one quantity at a
+time, releasing each block before the next, so the peak is one quantity above the sweep itself.
+
+Quantities are the fields of FresnelArray.FresnelCoefficients:
+	real: Rs, Rp, Ts, Tp, DiattenuationR, DiattenuationT, RetardanceR, RetardanceT
+	complex: rs, rp, ts, tp
+
+Test cases can be evaluated with following command:
+python3 Sweep.py
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+import FresnelArray
+
+
+COMPLEX_QUANTITIES = ('rs', 'rp', 'ts', 'tp')
+REAL_QUANTITIES = ('Rs', 'Rp', 'Ts', 'Tp', 'DiattenuationR', 'DiattenuationT', 'RetardanceR', 'RetardanceT')
+DEFAULT_CHUNK = 1 << 16
+
+
+def _checkQuantities(quantities):
+	unknown = [q for q in quantities if q not in COMPLEX_QUANTITIES + REAL_QUANTITIES]
+	if unknown:
+		raise ValueError('unknown quantities %s; choose from %s' % (unknown, COMPLEX_QUANTITIES + REAL_QUANTITIES))
+	return [np.dtype(complex if q in COMPLEX_QUANTITIES else float) for q in quantities]
+
+
+def _evaluateChunk(state, start, stop):
+	""" evaluate flattened sweep points [start, stop) and store them in the arrays of state['out']"""
+	nInc, nSub, thetaInc = state['inputs']
+	if state['grid'] is not None:
+		i, j, k = np.unravel_index(np.arange(start, stop), state['grid'])
+		nInc, nSub, thetaInc = nInc[i], nSub[j], thetaInc[k]
+	else:
+		nInc, nSub, thetaInc = nInc[start:stop], nSub[start:stop], thetaInc[start:stop]
+	with np.errstate(all='ignore'):
+		coef = FresnelArray.FresnelAll(nInc, nSub, thetaInc)
+	for name, out in zip(state['quantities'], state['out']):
+		out[start:stop] = getattr(coef, name)
+
+
+# process backend: each worker attaches to the shared blocks once, in the pool initializer
+_workerState = None
+_workerBlocks = None
+
+def _attach(spec):
+	""" (ndarray view, SharedMemory) for a (name, shape, dtype) block description"""
+	name, shape, dtype = spec
+	block = shared_memory.SharedMemory(name=name)
+	return np.ndarray(shape, dtype=dtype, buffer=block.buf), block
+
+def _initWorker(inputSpecs, outSpecs, grid, quantities):
+	global _workerState, _workerBlocks
+	views = [_attach(spec) for spec in inputSpecs + outSpecs]
+	_workerBlocks = [block for _, block in views]
+	_workerState = dict(inputs=[view for view, _ in views[:3]], out=[view for view, _ in views[3:]], grid=grid, quantities=quantities)
+
+def _workChunk(bounds):
+	_evaluateChunk(_workerState, *bounds)
+
+
+def _release(block):
+	""" close and unlink a shared memory block of this process; repeated calls do nothing"""
+	if block.buf is not None:
+		block.close()
+		block.unlink()
+
+def _share(array, blocks):
+	""" copy of array in a new shared memory block (appended to blocks) and its description"""
+	block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+	blocks.append(block)
+	view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+	view[...] = array
+	return view, (block.name, array.shape, array.dtype.str)
+
+def _run(inputs, grid, size, quantities, workers, chunkSize, backend):
+	if backend not in ('process', 'thread'):
+		raise ValueError("backend must be 'process' or 'thread'")
+	dtypes = _checkQuantities(quantities)
+	workers = workers or os.cpu_count() or 1
+	chunks = [(start, min(start + chunkSize, size)) for start in range(0, size, chunkSize)]
+	workers = min(workers, len(chunks)) or 1
+
+	if workers == 1 or backend == 'thread':
+		state = dict(inputs=inputs, out=[np.empty(size, dtype=dtype) for dtype in dtypes], grid=grid, quantities=quantities)
+		if workers == 1:
+			for bounds in chunks:
+				_evaluateChunk(state, *bounds)
+		else:
+			with ThreadPoolExecutor(workers) as pool:
+				for _ in pool.map(lambda bounds: _evaluateChunk(state, *bounds), chunks):
+					pass
+		out = state['out']
+	else:
+		blocks = []
+		try:
+			inputSpecs = [_share(x, blocks)[1] for x in inputs]
+			outSpecs = []
+			for dtype in dtypes:
+				block = shared_memory.SharedMemory(create=True, size=max(size*dtype.itemsize, 1))
+				blocks.append(block)
+				outSpecs.append((block.name, (size,), dtype.str))
+			with get_context().Pool(workers, _initWorker, (inputSpecs, outSpecs, grid, tuple(quantities))) as pool:
+				for _ in pool.imap_unordered(_workChunk, chunks):
+					pass
+			for block in blocks[:3]:
+				_release(block)
+			# copy each result out and release its block before the next one
+			out = []
+			for block, dtype in zip(blocks[3:], dtypes):
+				out.append(np.array(np.ndarray((size,), dtype=dtype, buffer=block.buf)))
+				_release(block)
+		finally:
+			for block in blocks:
+				_release(block)
+	shape = grid if grid is not None else (size,)
+	return {name: values.reshape(shape) for name, values in zip(quantities, out)}
+
+
+def SweepGrid(nInc, nSub, thetaInc, quantities=('Rs', 'Rp', 'Ts', 'Tp'), workers=None, chunkSize=DEFAULT_CHUNK, backend='process'):
+	""" quantities on the outer product of 1-D grids: {quantity: array of shape (len(nInc), len(nSub), len(thetaInc))}"""
+	inputs = [np.ravel(np.asarray(nInc, dtype=float)), np.ravel(np.asarray(nSub, dtype=complex)), np.ravel(np.asarray(thetaInc, dtype=float))]
+	grid = tuple(x.size for x in inputs)
+	return _run(inputs, grid, int(np.prod(grid)), list(quantities), workers, chunkSize, backend)
+
+def SweepPoints(nInc, nSub, thetaInc, quantities=('Rs', 'Rp', 'Ts', 'Tp'), workers=None, chunkSize=DEFAULT_CHUNK, backend='process'):
+	""" quantities for (nInc, nSub, thetaInc) triples broadcast to a common 1-D length: {quantity: array}"""
+	inputs = [np.ravel(x) for x in np.broadcast_arrays(np.asarray(nInc, dtype=float), np.asarray(nSub, dtype=complex), np.asarray(thetaInc, dtype=float))]
+	inputs = [np.ascontiguousarray(x) for x in inputs]
+	return _run(inputs, None, inputs[0].size, list(quantities), workers, chunkSize, backend)
+
+
+
+
+
+# test cases
+def testSweep():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testSweepGrid, testSweepPoints):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all SWEEP TESTS passed? '+str(combinedTest))
+
+def compareSerial(result, nInc, nSub, thetaInc):
+	"""helper function comparing sweep results with a single FresnelAll call"""
+	with np.errstate(all='ignore'):
+		coef = FresnelArray.FresnelAll(nInc, nSub, thetaInc)
+	return all(np.array_equal(values, getattr(coef, name), equal_nan=True) for name, values in result.items())
+
+def testSweepGrid():
+	nInc = np.linspace(1.0, 1.8, 7)
+	nSub = np.array([1.0, 1.5, complex(0.29006, 2.8628), complex(2.007, 3.781)])
+	thetaInc = np.linspace(0.0, 1.5, 301)
+	quantities = ('Rs', 'Tp', 'RetardanceR', 'DiattenuationT', 'rp')
+	process = SweepGrid(nInc, nSub, thetaInc, quantities, workers=3, chunkSize=1000)
+	thread = SweepGrid(nInc, nSub, thetaInc, quantities, workers=3, chunkSize=1000, backend='thread')
+	grid = np.ix_(nInc, nSub, thetaInc)
+	return(
+		process['Rs'].shape == (7, 4, 301) and process['rp'].dtype == complex and process['Rs'].dtype == float and \
+		thread['Tp'].dtype == float and process['RetardanceR'].dtype == float and \
+		compareSerial(process, *grid) and compareSerial(thread, *grid))
+
+# the workload of the former time test in Fresnel.py: random triples
+def testSweepPoints():
+	rng = np.random.default_rng(2022)
+	nTrials = 10000
+	nInc = rng.random(nTrials)*2.0
+	nSub = rng.random(nTrials)*2.0 + 1j*rng.random(nTrials)*10.0
+	thetaInc = rng.random(nTrials)*1.570796326
+	result = SweepPoints(nInc, nSub, thetaInc, ('Ts',), workers=2, chunkSize=1024)
+	serial = SweepPoints(nInc, nSub, thetaInc, ('Ts',), workers=1)
+	try:
+		SweepPoints(1.0, 1.5, [0.1, 0.2], workers=1, backend='bogus')
+		badBackend = False
+	except ValueError:
+		badBackend = True
+	return compareSerial(result, nInc, nSub, thetaInc) and compareSerial(serial, nInc, nSub, thetaInc) and \
+		SweepPoints([], [], [], ('Rs',))['Rs'].shape == (0,) and badBackend
+
+
+if __name__ == '__main__':
+	testSweep()
@@ -0,0 +1,279 @@
+"""
+THIN-FILM MULTILAYER (TRANSFER MATRIX)
+
+Characteristic-matrix calculation for a stack of thin films between an incident and a
+substrate medium, built on the single-interface conventions of Fresnel.py.
+Function summary:
+	characteristic matrices of single layers (s and p polarized)
+	amplitude and irradiance coefficients of a whole stack, batched over wavelength and angle
+	incremental stack (ThinFilmStack) that re-evaluates only O(log L) sub-stack products when one layer changes
+	test cases against the single-interface equations
+
+Decreasing phase convention assumed (n + i k), as in Fresnel.py.
+Incident material assumed real-valued refractive index.
+Transmitted irradiance defined immediately after the last interface.
+Angles have units of radians. Thicknesses and wavelengths share whatever length unit the caller uses.
+
+"nLayers" is a sequence (first layer faces the incident medium) whose entries are scalars or arrays
+broadcastable against "wavelength" and "thetaInc", so dispersive indices may be given per wavelength.
+A typical angle x wavelength sweep passes wavelength[:, None] and thetaInc[None, :].
+
+With no layers the results are identical to rs, rp, ts, tp, Rs, Rp, Ts, Tp of the interface
+between the incident and substrate media, including the sign conventions of Fresnel.py.
+
+Test cases can be evaluated with following command:
+python3 ThinFilm.py
+"""
+
+from collections import namedtuple
+import numpy as np
+
+
+StackCoefficients = namedtuple('StackCoefficients', ('rs', 'rp', 'ts', 'tp', 'Rs', 'Rp', 'Ts', 'Tp'))
+
+
+def _normalSlowness(n, kxSq):
+	""" n*cos(theta) inside a medium of index n, from the invariant (nInc*sin(thetaInc))**2. Complex-valued."""
+	n = np.asarray(n, dtype=complex)
+	return np.sqrt(n*n - kxSq)
+
+def _admittances(n, q):
+	""" tilted optical admittances (s, p) of a medium with normal slowness q = n*cos(theta)"""
+	n = np.asarray(n, dtype=complex)
+	return q, n*n/q
+
+def _polarizations(s, p, shape):
+	""" s and p values stacked along a leading polarization axis of the grid shape"""
+	return np.stack((np.broadcast_to(s, shape), np.broadcast_to(p, shape)))
+
+def _matmul2(A, B):
+	""" product of 2x2 matrices stored along the first two axes (broadcast over the rest)"""
+	return np.array((
+		(A[0,0]*B[0,0] + A[0,1]*B[1,0], A[0,0]*B[0,1] + A[0,1]*B[1,1]),
+		(A[1,0]*B[0,0] + A[1,1]*B[1,0], A[1,0]*B[0,1] + A[1,1]*B[1,1])))
+
+def _identity2(shape):
+	""" stack of 2x2 identity matrices with the layout used by _matmul2"""
+	eye = np.zeros((2, 2) + shape, dtype=complex)
+	eye[0,0] = 1.0
+	eye[1,1] = 1.0
+	return eye
+
+
+def LayerMatrix(nInc, nLayer, dLayer, wavelength, thetaInc):
+	""" characteristic matrices of one layer, shape (2, 2, 2, ...): matrix row, matrix column, polarization (s, p), broadcast grid"""
+	sinThetaInc = np.sin(thetaInc)
+	kxSq = (np.real(nInc)*sinThetaInc)**2
+	q = _normalSlowness(nLayer, kxSq)
+	etaS, etaP = _admittances(nLayer, q)
+	delta = 2.0*np.pi*q*dLayer/np.asarray(wavelength)
+	shape = np.broadcast_shapes(np.shape(etaS), np.shape(delta))
+	cosDelta = _polarizations(np.cos(delta), np.cos(delta), shape)
+	sinDelta = -1j*np.sin(delta)		# -i for the n + i k convention (Macleod uses n - i k and +i)
+	eta = _polarizations(etaS, etaP, shape)
+	return np.array((
+		(cosDelta, sinDelta/eta),
+		(sinDelta*eta, cosDelta)))
+
+
+def _coefficients(nInc, nSub, thetaInc, B, C, shape):
+	""" stack coefficients from the normalized fields (B, C) = M [1, etaSub] for both polarizations"""
+	sinThetaInc = np.sin(thetaInc)
+	kxSq = (np.real(nInc)*sinThetaInc)**2
+	qInc = _normalSlowness(nInc, kxSq)
+	qSub = _normalSlowness(nSub, kxSq)
+	eta0 = _polarizations(*_admittances(nInc, qInc), shape)
+	etaSub = _polarizations(*_admittances(nSub, qSub), shape)
+	denom = eta0*B + C
+	r = (eta0*B - C)/denom
+	tTangential = 2.0*eta0/denom
+	with np.errstate(divide='ignore', invalid='ignore'):
+		T = 4.0*eta0.real*etaSub.real/(denom.real**2 + denom.imag**2)
+		# Fresnel.py tp is the ratio of total (not tangential) fields: scale by cos(thetaInc)/cos(thetaSub)
+		tp = tTangential[1]*(qInc/np.real(nInc))/(qSub/np.asarray(nSub, dtype=complex))
+	R = r.real**2 + r.imag**2
+	tp = np.broadcast_to(tp, shape)
+	# Fresnel.py rp has the opposite sign to the admittance form (rp = +0.2 for glass at normal incidence)
+	return StackCoefficients(*(np.broadcast_to(x, shape) for x in (r[0], -r[1], tTangential[0], tp, R[0], R[1], T[0], T[1])))
+
+
+def _gridShape(nInc, nLayers, dLayers, nSub, wavelength, thetaInc):
+	return np.broadcast_shapes(np.shape(nInc), np.shape(nSub), np.shape(wavelength), np.shape(thetaInc),
+		*(np.shape(n) for n in nLayers), *(np.shape(d) for d in dLayers))
+
+def Stack(nInc, nLayers, dLayers, nSub, wavelength, thetaInc):
+	""" amplitude and irradiance coefficients of a multilayer stack (StackCoefficients of arrays)
+
+	Each layer is applied to the normalized field vector [B, C] from the substrate side, so the
+	working memory is a few arrays of the grid size whatever the number of layers.
+	"""
+	if len(nLayers) != len(dLayers):
+		raise ValueError('nLayers and dLayers must have the same length')
+	shape = _gridShape(nInc, nLayers, dLayers, nSub, wavelength, thetaInc)
+	sinThetaInc = np.sin(thetaInc)
+	kxSq = (np.real(nInc)*sinThetaInc)**2
+	B = np.ones((2,) + shape, dtype=complex)
+	C = _polarizations(*_admittances(nSub, _normalSlowness(nSub, kxSq)), shape)
+	for nLayer, dLayer in zip(reversed(nLayers), reversed(dLayers)):
+		M = LayerMatrix(nInc, nLayer, dLayer, wavelength, thetaInc)
+		B, C = M[0,0]*B + M[0,1]*C, M[1,0]*B + M[1,1]*C
+	return _coefficients(nInc, nSub, thetaInc, B, C, shape)
+
+
+class ThinFilmStack:
+	""" multilayer stack that keeps every sub-stack product in a segment tree
+
+	Changing one layer with setLayer recomputes its characteristic matrices and the log2(L)
+	products above it, so an optimizer that perturbs one layer at a time pays O(log L) matrix
+	products per step instead of O(L). The tree holds about 2L matrices of the grid size for
+	each polarization; use Stack for one-off evaluations of large grids.
+	"""
+
+	def __init__(self, nInc, nLayers, dLayers, nSub, wavelength, thetaInc):
+		if len(nLayers) != len(dLayers):
+			raise ValueError('nLayers and dLayers must have the same length')
+		self.nInc = nInc
+		self.nSub = nSub
+		self.wavelength = wavelength
+		self.thetaInc = thetaInc
+		self.nLayers = list(nLayers)
+		self.dLayers = list(dLayers)
+		self.shape = _gridShape(nInc, nLayers, dLayers, nSub, wavelength, thetaInc)
+
+		self.size = 1
+		while self.size < max(len(self.nLayers), 1):
+			self.size *= 2
+		self.tree = np.empty((2*self.size, 2, 2, 2) + self.shape, dtype=complex)
+		self.tree[self.size:] = _identity2((2,) + self.shape)
+		for index in range(len(self.nLayers)):
+			self.tree[self.size + index] = self._layerMatrix(index)
+		for node in range(self.size - 1, 0, -1):
+			self.tree[node] = _matmul2(self.tree[2*node], self.tree[2*node + 1])
+
+	def __len__(self):
+		return len(self.nLayers)
+
+	def _layerMatrix(self, index):
+		M = LayerMatrix(self.nInc, self.nLayers[index], self.dLayers[index], self.wavelength, self.thetaInc)
+		return np.broadcast_to(M, (2, 2, 2) + self.shape)
+
+	def setLayer(self, index, nLayer=None, dLayer=None):
+		""" replace the index and/or thickness of one layer and update the sub-stack products above it"""
+		if nLayer is not None:
+			self.nLayers[index] = nLayer
+		if dLayer is not None:
+			self.dLayers[index] = dLayer
+		node = self.size + range(len(self.nLayers))[index]
+		self.tree[node] = self._layerMatrix(index)
+		node //= 2
+		while node:
+			self.tree[node] = _matmul2(self.tree[2*node], self.tree[2*node + 1])
+			node //= 2
+
+	def matrix(self):
+		""" characteristic matrix of the whole stack, shape (2, 2, 2, ...) as returned by LayerMatrix"""
+		return self.tree[1]
+
+	def coefficients(self):
+		""" amplitude and irradiance coefficients of the current stack (StackCoefficients of arrays)"""
+		M = self.tree[1]
+		sinThetaInc = np.sin(self.thetaInc)
+		kxSq = (np.real(self.nInc)*sinThetaInc)**2
+		etaSub = _polarizations(*_admittances(self.nSub, _normalSlowness(self.nSub, kxSq)), self.shape)
+		B = M[0,0] + M[0,1]*etaSub
+		C = M[1,0] + M[1,1]*etaSub
+		return _coefficients(self.nInc, self.nSub, self.thetaInc, B, C, self.shape)
+
+
+
+
+
+# test cases
+testPrecision = 1e-9
+def testThinFilm():
+	""" compute all test results and display to screen """
+	combinedTest = True
+	for test in (testBareInterface, testMatchedLayer, testQuarterWave, testAbsorbingLayer, testEnergy, testIncrementalStack):
+		if not test():
+			print(test.__name__+': failed')
+			combinedTest = False
+	print('all THIN FILM TESTS passed? '+str(combinedTest))
+
+def compareInterface(coef, nInc, nSub, thetaInc, names=StackCoefficients._fields):
+	"""helper function comparing stack coefficients with the single-interface equations of FresnelArray"""
+	import FresnelArray
+	return all(np.allclose(getattr(coef, name), getattr(FresnelArray, name)(nInc, nSub, thetaInc), rtol=testPrecision, atol=testPrecision)
+		for name in names)
+
+# no layers: dielectric, metals (testFresnelMetal1/2 of Fresnel.py) and total internal reflection
+def testBareInterface():
+	thetaInc = np.linspace(0.0, 1.5, 31)
+	cases = ((1.0, 1.5), (1.0, complex(0.29006, 2.8628)), (1.0, complex(2.007, 3.781)), (1.72, 1.15), (1.51, 1.0))
+	return all(compareInterface(Stack(nInc, [], [], nSub, 0.55, thetaInc), nInc, nSub, thetaInc) for nInc, nSub in cases)
+
+# zero-thickness layers must not change the interface, nor reflection by a layer of the substrate material
+# (transmission is then referred to the far side of the layer: attenuated in a metal, phase-shifted in a dielectric)
+def testMatchedLayer():
+	thetaInc = np.linspace(0.0, 1.5, 31)
+	nSub = complex(2.007, 3.781)
+	return(
+		compareInterface(Stack(1.0, [1.5, 2.2], [0.0, 0.0], nSub, 0.6328, thetaInc), 1.0, nSub, thetaInc) and \
+		compareInterface(Stack(1.0, [nSub], [0.123], nSub, 0.6328, thetaInc), 1.0, nSub, thetaInc, ('rs', 'rp', 'Rs', 'Rp')) and \
+		compareInterface(Stack(1.0, [1.5], [0.123], 1.5, 0.5, thetaInc), 1.0, 1.5, thetaInc, ('rs', 'rp', 'Rs', 'Rp', 'Ts', 'Tp')))
+
+# quarter-wave single-layer antireflection coating, n = sqrt(n0*nSub), zero reflectance at design wavelength
+# see "Thin-Film Optical Filters", Macleod, 4th ed., sec. 3.2
+def testQuarterWave():
+	nSub = 1.52
+	nLayer = np.sqrt(nSub)
+	wavelength = np.array([0.55, 0.45, 0.65])
+	coef = Stack(1.0, [nLayer], [0.55/(4.0*nLayer)], nSub, wavelength, 0.0)
+	# half-wave (absentee) layer leaves the bare substrate reflectance
+	absentee = Stack(1.0, [2.1], [0.55/(2.0*2.1)], nSub, 0.55, 0.0)
+	return(
+		abs(coef.Rs[0]) < testPrecision and \
+		abs(coef.Rp[0]) < testPrecision and \
+		coef.Rs[1] > 1e-4 and coef.Rs[2] > 1e-4 and \
+		compareInterface(absentee, 1.0, nSub, 0.0, ('rs', 'rp', 'Rs', 'Rp', 'Ts', 'Tp')))
+
+# thick absorbing layer: the substrate is never reached, reflectance is that of the absorber interface
+def testAbsorbingLayer():
+	nMetal = complex(0.29006, 2.8628)
+	thetaInc = np.linspace(0.0, 1.4, 15)
+	coef = Stack(1.0, [nMetal], [5.0], 1.5, 0.582, thetaInc)
+	import FresnelArray
+	return(
+		np.allclose(coef.Rs, FresnelArray.Rs(1.0, nMetal, thetaInc), atol=1e-6) and \
+		np.allclose(coef.Rp, FresnelArray.Rp(1.0, nMetal, thetaInc), atol=1e-6) and \
+		np.all(coef.Ts < 1e-6) and np.all(coef.Tp < 1e-6))
+
+# lossless dielectric stack: R + T = 1 over a wavelength x angle grid
+def testEnergy():
+	wavelength = np.linspace(0.4, 0.8, 41)[:, None]
+	thetaInc = np.linspace(0.0, 1.5, 16)[None, :]
+	nLayers = [2.35, 1.38]*10
+	dLayers = [0.6/(4.0*2.35), 0.6/(4.0*1.38)]*10
+	coef = Stack(1.0, nLayers, dLayers, 1.52, wavelength, thetaInc)
+	return(
+		coef.Rs.shape == (41, 16) and \
+		np.allclose(coef.Rs + coef.Ts, 1.0, atol=testPrecision) and \
+		np.allclose(coef.Rp + coef.Tp, 1.0, atol=testPrecision) and \
+		coef.Rs[20, 0] > 0.99)		# quarter-wave mirror at its design wavelength
+
+# segment tree updates against a full re-evaluation
+def testIncrementalStack():
+	wavelength = np.linspace(0.4, 0.8, 9)[:, None]
+	thetaInc = np.linspace(0.0, 1.2, 5)[None, :]
+	nLayers = [2.35, 1.38, complex(0.2, 3.0), 1.9, 1.45]
+	dLayers = [0.06, 0.11, 0.01, 0.07, 0.1]
+	stack = ThinFilmStack(1.0, nLayers, dLayers, 1.52, wavelength, thetaInc)
+	sameInitial = all(np.allclose(a, b, rtol=testPrecision, atol=testPrecision) for a, b in zip(stack.coefficients(), Stack(1.0, nLayers, dLayers, 1.52, wavelength, thetaInc)))
+	stack.setLayer(2, nLayer=complex(0.5, 2.0), dLayer=0.02)
+	stack.setLayer(-1, dLayer=0.2)
+	nLayers[2], dLayers[2], dLayers[-1] = complex(0.5, 2.0), 0.02, 0.2
+	expected = Stack(1.0, nLayers, dLayers, 1.52, wavelength, thetaInc)
+	return sameInitial and all(np.allclose(a, b, rtol=testPrecision, atol=testPrecision) for a, b in zip(stack.coefficients(), expected))
+
+
+if __name__ == '__main__':
+	testThinFilm()